@@ -1,13 +1,6 @@
-import os
-import atexit
 import pandas as pd
-from langchain_community.utilities import SQLDatabase
-from langchain_community.chat_models import ChatOllama
-from local_ollama_management import start_ollama, is_ollama_running, terminate_ollama_processes
-from dotenv import load_dotenv
 import config as cfg
-import functions as fn
-import azure_functions as azf
+from pipeline_client import PipelineClient, PipelineError, ServerBusy
 
 
 # UI imports
@@ -15,38 +8,33 @@ import streamlit as st
 
 # --- Constants --- #
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Connect to DB
-db = SQLDatabase.from_uri(f"sqlite:///{cfg.DB_PATH}")
-
-# Initialize the model
-base_url = os.getenv("OLLAMA_LOCAL_SERVER") if cfg.RUN_LOCALLY else os.getenv("OLLAMA_SERVER")
-
-sql_llm = ChatOllama(base_url=base_url, model=cfg.SQL_LLM_MODEL, temperature=cfg.SQL_LLM_TEMPERATURE, top_p=cfg.SQL_LLM_TOP_P)
-answer_llm = ChatOllama(base_url=base_url, model=cfg.ANSWER_LLM_MODEL, temperature=cfg.ANSWER_LLM_TEMPERATURE, top_p=cfg.ANSWER_LLM_TOP_P)
-
-# print("Temperature:", llm.temperature)
+# The DB, vector collection and models live in the pipeline server (python pipeline_server.py),
+# started once for every session
+client = PipelineClient()
 
 # --- Functions --- #
 
+def answer_chunks(first_event: dict, events):
+    """Text of the first answer event and of the answer events that follow it."""
+    yield first_event["chunk"]
+    for event in events:
+        if event["type"] != "answer":
+            break
+        yield event["chunk"]
 
 
 # --- Streamlit UI --- #
 
 if __name__ == '__main__':
-    if cfg.RUN_LOCALLY:
-        atexit.register(terminate_ollama_processes)
-        if not is_ollama_running():
-            start_ollama()
-
     st.set_page_config(page_title="RAG SQL App", page_icon="🤖", layout="wide")
     st.title("🤖 RAG SQL App Interface")
     llm_provider = st.radio(
     "Choose LLM Provider:",
     ("Ollama (Local)", "Azure OpenAI"),
-    index=0)
+    index=0,
+    help="With hedging enabled (cfg.LLM_HEDGE_ENABLED) the other provider takes over when this one is slow or down")
+    llm_answer = st.toggle("Always write the answer with the LLM", value=not cfg.FAST_ANSWER_ENABLED,
+                           help="Small results are otherwise answered right away with a template")
     st.write("You can ask questions about the database and get answers in natural language.")
     #st.header("🔍 Question Answering")
 
@@ -62,79 +50,39 @@ if __name__ == '__main__':
             
             info.info("Processing your question...")
 
-            if llm_provider == "Ollama (Local)":
-                state = fn.State()
-                state["question"] = prompt
-                state["query"] = ""
-                state["result"] = ""
-                state["total_count"] = 0
-
-                info.status("Retrieving relevant tables...")
-                tables = fn.query_collection(prompt=state["question"])
-                context = tables["documents"]
-                state["tables_info"] = "\n---\n".join(context)
-
-                if tables['ids'] != []:
-                    with col1.popover("📅 Retrieved Tables", use_container_width=100):
-                        for i in range(len(tables["ids"])):
-                            st.write(f"\n-----------\nID: {tables['ids'][i]}, Distance: {tables['distances'][i]}, \n\nDocument: \n{tables['documents'][i]}\n")
-
-                info.status("Generating SQL query...")
-                state["query"] = fn.write_query(question=state["question"], llm=sql_llm, context_tables=state["tables_info"])['query']
-                if state["query"] != "Error generating query":
-                    with col2.popover("📝 Generated SQL Query", use_container_width=100):
-                        st.write(state["query"])
-
-                info.status("Executing SQL query...")
-                if state["query"] == "Error generating query":
-                    state["result"] = "Empty"
-                else:
-                    results, total_count = fn.create_view(query=state["query"], db=db)
-                    if type(results) == list:
+            provider = "azure" if llm_provider == "Azure OpenAI" else "ollama"
+            events = client.run(prompt, provider=provider, fast_answer=not llm_answer)
+            try:
+                for event in events:
+                    if event["type"] == "status":
+                        info.status(event["message"])
+                    elif event["type"] == "tables" and event["tables"]["ids"]:
+                        tables = event["tables"]
+                        with col1.popover("📅 Retrieved Tables", use_container_width=100):
+                            for i in range(len(tables["ids"])):
+                                st.write(f"\n-----------\nID: {tables['ids'][i]}, Distance: {tables['distances'][i] if tables['distances'][i] is not None else 'join path'}, \n\nDocument: \n{tables['documents'][i]}\n")
+                    elif event["type"] == "query" and event["query"] != "Error generating query":
+                        query = event["query"]
+                        with col2.popover("📝 Generated SQL Query", use_container_width=100):
+                            st.write(query)
+                    elif event["type"] == "result":
                         with col3.popover("📊 Query Results", use_container_width=100):
-                            df = pd.DataFrame(results)
+                            df = pd.DataFrame.from_records(event["rows"], columns=event["columns"])
                             csv = df.to_csv().encode("utf-8")
                             st.download_button(
                                 label="Download CSV",
                                 data=csv,
                                 on_click='ignore',
-                                file_name=f"{state['query']}.csv"
+                                file_name=f"{query}.csv"
                             )
-                            st.write(f"Total Results: {total_count}")
-                            st.write("Results: ", results)
-                        state["total_count"] = total_count
-                        state["result"] = fn.reduce_rows(results=results, max_results=cfg.MAX_RESULTS_LLM)
-                    else:
-                        state["result"] = results
-
-                info.status("Generating answer...")
-                state["answer"] = fn.generate_answer(state=state, llm=answer_llm)
-                output = state["answer"]
-                messages.chat_message("AI").write_stream(state["answer"])
-                info.empty()
-            elif llm_provider == "Azure OpenAI":
-                state = azf.question_and_answer_azure(question=prompt, database=db)
-                # Show the same popovers as Ollama, if the keys exist in state
-                if 'tables' in state and state['tables'] and 'ids' in state['tables'] and state['tables']['ids']:
-                    with col1.popover("📅 Retrieved Tables", use_container_width=100):
-                        for i in range(len(state['tables']['ids'])):
-                            st.write(f"\n-----------\nID: {state['tables']['ids'][i]}, Distance: {state['tables']['distances'][i]}, \n\nDocument: \n{state['tables']['documents'][i]}\n")
-                if 'query' in state and state['query']:
-                    with col2.popover("📝 Generated SQL Query", use_container_width=100):
-                        st.write(state['query'])
-                if 'result' in state and isinstance(state['result'], list):
-                    with col3.popover("📊 Query Results", use_container_width=100):
-                        df = pd.DataFrame(state['result'])
-                        csv = df.to_csv().encode("utf-8")
-                        st.download_button(
-                            label="Download CSV",
-                            data=csv,
-                            on_click='ignore',
-                            file_name=f"{state['query']}.csv"
-                        )
-                        st.write(f"Total Results: {state.get('total_count', 0)}")
-                        st.write("Results: ", state['result'])
-                # Always show the answer
-                messages.chat_message("AI").write(state["answer"])
-                info.empty()
+                            st.write(f"Total Results: {'unknown' if event['total_count'] is None else event['total_count']}")
+                            st.write("Results: ", df)
+                    elif event["type"] == "answer":
+                        # Stream the answer as it is generated
+                        messages.chat_message("AI").write_stream(answer_chunks(event, events))
+                        info.empty()
+            except ServerBusy as e:
+                info.warning(f"The server is busy, please retry in {e.retry_after:g} seconds.")
+            except (PipelineError, ConnectionError) as e:
+                info.error(f"The pipeline server could not answer: {e}")
 
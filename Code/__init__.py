@@ -1,7 +1,27 @@
 from . import functions
 from . import config
+from . import vector_store
+from . import collection_registry
+from . import embedding_cache
+from . import sql_cache
+from . import ingestion
+from . import sql_execution
+from . import sql_guard
+from . import join_graph
+from . import lexical_index
+from . import column_index
+from . import prompt_builder
+from . import result_format
+from . import intent_router
+from . import json_stream
+from . import scheduler
+from . import llm_providers
+from . import telemetry
+from . import pipeline
+from . import pipeline_server
+from . import pipeline_client
 from . import llm_test
 from . import local_ollama_management
 from . import main
 from . import UI
-from . import vectorize_database
\ No newline at end of file
+from . import vectorize_database
@@ -0,0 +1,101 @@
+import threading
+from typing import Callable
+
+import chromadb
+from chromadb.api.client import SharedSystemClient
+
+import config as cfg
+from vector_store import VectorStore
+
+# --- Collection Registry --- #
+
+# A factory receives the shared client and returns the collection to cache
+CollectionFactory = Callable[[chromadb.ClientAPI], chromadb.Collection]
+
+# A store factory receives the vector DB path and returns a store that needs no Chroma client
+StoreFactory = Callable[[str], VectorStore]
+
+
+class CollectionRegistry:
+    """Process-wide, thread-safe cache of ChromaDB clients and collections (or other vector stores).
+
+    Lifecycle:
+    - open: build the collection on first use, return the warm one afterwards
+    - open_store: same for a store built from the path alone, no Chroma client is started
+    - refresh: rebuild one collection, or drop the cached clients and rebuild every collection
+      (e.g. after re-vectorization)
+    - close: release every client and collection held by the registry
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: dict[str, chromadb.ClientAPI] = {}
+        self._collections: dict[str, chromadb.Collection] = {}
+        self._factories: dict[str, tuple[CollectionFactory | StoreFactory, str, bool]] = {}
+
+    def client(self, path: str = cfg.VECTOR_DB_PATH) -> chromadb.ClientAPI:
+        """Return the shared persistent client for a vector DB path."""
+        with self._lock:
+            if path not in self._clients:
+                self._clients[path] = chromadb.PersistentClient(path=path) # chroma uses sqlite3 to store data
+            return self._clients[path]
+
+    def open(self, key: str, factory: CollectionFactory, path: str = cfg.VECTOR_DB_PATH) -> chromadb.Collection:
+        """Return the cached collection for key, creating it with factory on first use."""
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection # warm path, no lock needed
+
+        with self._lock:
+            if key not in self._collections:
+                self._collections[key] = factory(self.client(path))
+                self._factories[key] = (factory, path, True)
+            return self._collections[key]
+
+    def open_store(self, key: str, factory: StoreFactory, path: str = cfg.VECTOR_DB_PATH) -> VectorStore:
+        """Return the cached store for key, creating it with factory(path) on first use."""
+        store = self._collections.get(key)
+        if store is not None:
+            return store
+
+        with self._lock:
+            if key not in self._collections:
+                self._collections[key] = factory(path)
+                self._factories[key] = (factory, path, False)
+            return self._collections[key]
+
+    def refresh(self, key: str = None) -> None:
+        """Reopen one collection on the shared client, or all of them from a fresh client."""
+        with self._lock:
+            if key is not None:
+                if key not in self._factories:
+                    return
+                # The other collections stay open, only this one is rebuilt
+                factory, path, uses_client = self._factories.pop(key)
+                self._collections.pop(key, None)
+                if uses_client:
+                    self.open(key, factory, path)
+                else:
+                    self.open_store(key, factory, path)
+                return
+
+            factories = dict(self._factories)
+            self.close()
+            for k, (factory, path, uses_client) in factories.items():
+                if uses_client:
+                    self.open(k, factory, path)
+                else:
+                    self.open_store(k, factory, path)
+
+    def close(self) -> None:
+        """Release all clients and collections."""
+        with self._lock:
+            self._collections.clear()
+            self._factories.clear()
+            self._clients.clear()
+            # Chroma keeps one system per path in a class-level cache, clearing it closes the store
+            SharedSystemClient.clear_system_cache()
+
+
+# Registry shared by every module in the process
+registry = CollectionRegistry()
@@ -0,0 +1,103 @@
+import re
+from typing import TypedDict
+
+# --- Column-Level Documents --- #
+# Table documents from db_extract split into one document per column (for a second vector
+# collection), and pruned back to the retrieved columns plus keys when the prompt is built.
+
+CONSTRAINT_RE = re.compile(r"(PRIMARY|FOREIGN|UNIQUE|CHECK|CONSTRAINT)\b", re.IGNORECASE)
+
+
+class ParsedTable(TypedDict):
+    table: str
+    name_sql: str  # table name as written in the statement, quotes included
+    columns: list[tuple[str, str]]  # (name, definition line)
+    constraints: list[str]
+    keys: set[str]  # primary and foreign key columns
+    references: dict[str, str]  # column -> "table (column)"
+    sample_header: str  # "3 rows from actor table:"
+    samples: list[list[str]]  # first row holds the column names
+    suffix: str  # anything after the sample rows
+
+
+def _identifier(text: str) -> str:
+    match = re.match(r'"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|([^\s(,]+)', text.strip())
+    return next(group for group in match.groups() if group)
+
+
+def _column_list(text: str) -> list[str]:
+    return [_identifier(part) for part in text.split(",") if part.strip()]
+
+
+def parse_table(doc: str) -> ParsedTable | None:
+    """Split a CREATE TABLE document into columns, constraints and sample rows."""
+    match = re.search(r"CREATE TABLE\s+(.+?)\s*\((.*?)\n\)(.*)", doc, re.DOTALL)
+    if not match:
+        return None
+    parsed = ParsedTable(table=_identifier(match.group(1)), name_sql=match.group(1), columns=[], constraints=[], keys=set(), references={},
+                         sample_header="", samples=[], suffix="")
+    for line in match.group(2).split("\n"):
+        line = line.strip().rstrip(",").strip()
+        if not line:
+            continue
+        if CONSTRAINT_RE.match(line):
+            parsed["constraints"].append(line)
+            primary = re.match(r"PRIMARY KEY\s*\((.*?)\)", line, re.IGNORECASE)
+            foreign = re.match(r"FOREIGN KEY\s*\((.*?)\)\s*REFERENCES\s+(.*)", line, re.IGNORECASE)
+            if primary:
+                parsed["keys"].update(_column_list(primary.group(1)))
+            if foreign:
+                columns = _column_list(foreign.group(1))
+                parsed["keys"].update(columns)
+                for column in columns:
+                    parsed["references"][column] = foreign.group(2).strip()
+        else:
+            parsed["columns"].append((_identifier(line), line))
+            if re.search(r"PRIMARY KEY", line, re.IGNORECASE):
+                parsed["keys"].add(_identifier(line))
+
+    samples = re.search(r"/\*\n(.*?)\n(.*?)\*/(.*)", match.group(3), re.DOTALL)
+    if samples:
+        parsed["sample_header"] = samples.group(1)
+        parsed["samples"] = [row.split("\t") for row in samples.group(2).strip("\n").split("\n") if row]
+        parsed["suffix"] = samples.group(3)
+    return parsed
+
+
+def column_documents(doc: str) -> dict[str, str]:
+    """One document per column, keyed by "table.column": type, keys and sample values."""
+    parsed = parse_table(doc)
+    if parsed is None:
+        return {}
+    header = parsed["samples"][0] if parsed["samples"] else []
+    documents = {}
+    for name, line in parsed["columns"]:
+        parts = [f"Column {parsed['table']}.{name}: {line[len(name):].strip() or 'untyped'}"]
+        if name in parsed["references"]:
+            parts.append(f"foreign key to {parsed['references'][name]}")
+        elif name in parsed["keys"]:
+            parts.append("primary key")
+        if name in header:
+            index = header.index(name)
+            values = [row[index] for row in parsed["samples"][1:] if index < len(row)]
+            if values:
+                parts.append(f"examples: {', '.join(values)}")
+        documents[f"{parsed['table']}.{name}"] = ", ".join(parts)
+    return documents
+
+
+def prune_table(doc: str, keep: set[str]) -> str:
+    """The table document with only the `keep` columns, its keys and their sample values."""
+    parsed = parse_table(doc)
+    if parsed is None:
+        return doc
+    keep = set(keep) | parsed["keys"]
+    lines = [line for name, line in parsed["columns"] if name in keep] + parsed["constraints"]
+    pruned = f"\nCREATE TABLE {parsed['name_sql']} (\n\t" + ", \n\t".join(lines) + "\n)"
+
+    if parsed["samples"]:
+        header = parsed["samples"][0]
+        indexes = [i for i, name in enumerate(header) if name in keep]
+        rows = ["\t".join(row[i] for i in indexes if i < len(row)) for row in parsed["samples"]]
+        pruned += f"\n\n/*\n{parsed['sample_header']}\n" + "\n".join(rows) + f"\n*/{parsed['suffix']}"
+    return pruned
@@ -1,6 +1,11 @@
 # --- OLLAMA Server Configuration --- #
 
 RUN_LOCALLY = True # Set to True if running the OLLAMA server locally
+OLLAMA_HEALTH_TIMEOUT_SECONDS = 2  # Timeout of one health check (GET /api/version)
+OLLAMA_READY_TIMEOUT_SECONDS = 30  # Longest wait for a starting server to answer its health check
+OLLAMA_READY_POLL_SECONDS = 0.25  # Interval between two health checks while waiting
+OLLAMA_LOAD_TIMEOUT_SECONDS = 300  # Longest wait for a model to load into memory
+OLLAMA_PRELOAD_MODELS = True  # Load the SQL, answer and embedding models when the pipeline server starts
 
 # --- Vector Database and Embedding Configuration --- #
 
@@ -10,15 +15,53 @@ DB_PATH = "DB//sakila.db"
 # Path to the vector database (ChromaDB)
 VECTOR_DB_PATH = "Vector_DB/vectorized_db"
 
+# Name of the collection holding the table documents
+VECTOR_COLLECTION_NAME = "rag-sql-app"
+
+# Vector store backend: "chroma" (PersistentClient with HNSW) or "numpy" (memory-mapped
+# embeddings with exact search, near-zero startup for schemas up to a few thousand tables)
+VECTOR_STORE_BACKEND = "chroma"
+
 # Extract database tables and their information
 REMOVE_EXAMPLES = False # Set to True to remove examples from the table information
 
 # Embedding model to use for vectorization
 EMBEDDING_MODEL = "nomic-embed-text:latest"
 
+# Cache of question embeddings (in-memory LRU size and on-disk store)
+EMBEDDING_CACHE_SIZE = 1024
+EMBEDDING_CACHE_PATH = "Vector_DB/embedding_cache.sqlite3"
+
+# Batched ingestion when vectorizing the database
+INGEST_BATCH_SIZE = 32  # Documents per embedding request
+INGEST_MAX_WORKERS = 4  # Concurrent embedding requests
+INGEST_RETRIES = 2  # Retries of a failed batch
+INGEST_RETRY_BACKOFF = 0.5  # seconds, doubled on each retry
+
 # Number of top results (tables) to retrieve from the vector database
 EMBEDDING_TOP_K = 10
 
+# Foreign-key join graph, built at vectorization time and used to add the bridge tables
+# between a few semantic hits instead of retrieving EMBEDDING_TOP_K tables
+JOIN_GRAPH_ENABLED = True
+JOIN_GRAPH_PATH = "Vector_DB/join_graph.json"
+JOIN_GRAPH_TOP_K = 4  # Semantic hits retrieved when the join graph is available
+JOIN_GRAPH_MAX_HOPS = 3  # Longest join path (in foreign keys) added between two hits
+
+# Lexical (BM25) index over table names, column names and sample values, fused with the vector distances
+LEXICAL_INDEX_ENABLED = True
+LEXICAL_INDEX_PATH = "Vector_DB/lexical_index.json"
+LEXICAL_WEIGHT = 0.3  # Fraction of the vector distance removed for the best lexical match (scaled by its BM25 score)
+LEXICAL_MIN_SCORE = 0.5  # Normalized BM25 score for a table missed by the vector search to be added
+LEXICAL_DECISIVE_MENTIONS = 2  # Tables named in the question that make the embedding call unnecessary
+
+# Column-level index for very wide schemas: the prompt only keeps the retrieved columns (plus keys) of wide tables
+COLUMN_INDEX_ENABLED = False
+COLUMN_COLLECTION_NAME = "rag-sql-app-columns"
+COLUMN_TOP_K = 30  # Columns retrieved across the selected tables
+COLUMN_DISTANCE_CUTOFF = 0.6  # Maximum distance of a retrieved column
+COLUMN_PRUNE_MIN_COLUMNS = 15  # Tables with more columns than this are pruned
+
 # Threshold for filtering results based on best distance
 DISTANCE_THRESHOLD = 0.3 # percentage
 
@@ -40,12 +83,17 @@ DISTANCE_CUTOFF = 0.55
 # --- LLM model to use for natural language responses Locally --- #
 
 OLLAMA_PATH = r"C:\Users\becke\AppData\Local\Programs\Ollama\ollama.exe"
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps a model loaded after its last request
 
 # LLM model to use for generating SQL queries and answers
 # SQL_LLM_MODEL = "gemma3:27b"
 SQL_LLM_MODEL = "llama3.1:8b"  # Model for SQL query generation
 SQL_LLM_TEMPERATURE = 0.2  # Temperature for the SQL query generation
 SQL_LLM_TOP_P = 0.9  # Top-p sampling for the SQL query generation
+SQL_LLM_JSON_MODE = True  # Constrain the SQL model to JSON output (Ollama format="json")
+SQL_CANDIDATES = 1  # Above 1, SQL generations raced per question: the first query passing the guard and EXPLAIN runs
+SQL_CANDIDATE_TEMPERATURES = [0.2, 0.6, 0.9]  # Temperature of each candidate slot
+SQL_CANDIDATE_OTHER_PROVIDER = False  # Also race the other provider (Ollama and Azure at once)
 
 # Options: "llama3.2:3b", "gemma3:27b", "llama3.3:70b"
 ANSWER_LLM_MODEL = "llama3.1:8b"
@@ -66,6 +114,7 @@ SQL_LLM_MODEL_AZURE = 'gpt-4.1'  # Model for SQL query generation
 SQL_LLM_TEMPERATURE_AZURE = 0.2  # Temperature for the SQL query generation
 SQL_LLM_TOP_P_AZURE = 0.9  # Top-p sampling for the SQL query generation
 SQL_LLM_MAX_TOKENS_AZURE = 1024 # Maximum tokens for the SQL query generation
+SQL_LLM_JSON_MODE_AZURE = False  # response_format json_object, needs API_VERSION_AZURE 2023-12-01-preview or later
 
 # Options: "gpt-4.1"
 ANSWER_LLM_MODEL_AZURE = 'gpt-4.1'
@@ -74,11 +123,83 @@ ANSWER_LLM_TOP_P_AZURE = 0.9  # Top-p sampling for the LLM response
 ANSWER_LLM_MAX_TOKENS_AZURE = 1024  # Maximum tokens for the LLM response
 
 
+# --- LLM Providers --- #
+
+LLM_TIMEOUT_SECONDS = 120  # Longest wait for the first token of a call (and between tokens), model loading included
+LLM_RETRIES = 1  # Retries of a call failing before its first token
+LLM_RETRY_BACKOFF = 0.5  # seconds, doubled on each retry
+LLM_HEDGE_ENABLED = False  # Also send a request to the other provider (Ollama / Azure) when the chosen one is slow to start
+LLM_HEDGE_DELAY_SECONDS = 3.0  # Time to first token after which the request is hedged
+
+
+# --- Pipeline Server --- #
+
+PIPELINE_SERVER_HOST = "127.0.0.1"
+PIPELINE_SERVER_PORT = 8765
+PIPELINE_SERVER_CONCURRENCY = 4  # Questions answered at the same time, the others wait in the queue
+PIPELINE_SERVER_QUEUE_SIZE = 16  # Questions waiting for a slot, more are refused with 503
+PIPELINE_SERVER_RETRY_AFTER = 5  # seconds, Retry-After of a refused question
+PIPELINE_SERVER_URL = f"http://{PIPELINE_SERVER_HOST}:{PIPELINE_SERVER_PORT}"  # used by pipeline_client
+PIPELINE_CLIENT_TIMEOUT_SECONDS = 300  # Longest wait of the client for the next event
+
+
+# --- Scheduler --- #
+
+EMBED_BATCHING_ENABLED = True  # Send the question embeddings of concurrent requests as one embed call
+EMBED_BATCH_WINDOW_SECONDS = 0.005  # Wait for more questions after the first one (those arriving during a call are batched anyway)
+EMBED_BATCH_MAX_SIZE = 32  # Texts per embed call
+EMBED_BATCH_TIMEOUT_SECONDS = 60  # Longest wait of a caller for its embeddings, queueing included
+LLM_GATE_ENABLED = True  # Limit the Ollama generations in flight, per model and across models
+LLM_MAX_IN_FLIGHT = {}  # Generations in flight per model, e.g. {"llama3.1:8b": 4} (match OLLAMA_NUM_PARALLEL)
+LLM_MAX_IN_FLIGHT_DEFAULT = 2
+LLM_MAX_ACTIVE_MODELS = 1  # Models generating at the same time, more make Ollama swap models in and out of memory
+LLM_MAX_OVERTAKES = 8  # Requests for the model generating admitted ahead of one waiting for another model
+
+
+# --- SQL Generation Cache --- #
+
+SQL_CACHE_ENABLED = True  # Reuse SQL generated for the same question, tables, dialect, model and schema
+SQL_CACHE_PATH = "Vector_DB/sql_cache.sqlite3"
+SQL_CACHE_SEMANTIC = False  # Also reuse SQL of semantically close questions
+SQL_CACHE_SEMANTIC_DISTANCE = 0.05  # Maximum cosine distance between questions in semantic mode
+
+
+# --- Prompt Budget --- #
+
+# Prompt tokens per model (the rest of the context window is left to the response). Retrieved
+# tables are trimmed to fit: sample rows first, then long column lists, then the lowest-ranked tables
+PROMPT_TOKEN_BUDGETS = {"llama3.1:8b": 3072, "gpt-4.1": 16000}
+PROMPT_TOKEN_BUDGET_DEFAULT = 4096  # Models missing from PROMPT_TOKEN_BUDGETS
+PROMPT_CHARS_PER_TOKEN = 3.5  # Token estimate without a tokenizer, calibrated on the counts the models report
+PROMPT_CALIBRATION_WEIGHT = 0.2  # Weight of each reported count in the calibrated estimate
+PROMPT_MAX_COLUMNS = 20  # Columns (keys excluded) kept when a long column list is shortened
+PROMPT_RESULT_SHARE = 0.6  # Share of the answer prompt budget the query result may take
+
+
+# --- Telemetry --- #
+
+LOG_LEVEL = None  # e.g. "INFO" or "DEBUG" to print the pipeline logs, silent when None
+TRACE_PATH = None  # JSON lines file receiving every timed span, e.g. "Logs/traces.jsonl"
+
+
 # System message to generate SQL queries
 
 DB_DIALECT_BASE = "sqlite"  # Base dialect for the database
-MAX_RESULTS_QUERY = 3000  # Maximum number of results to return in the SQL query
+MAX_RESULTS_QUERY = 3000  # Maximum number of results to return in the SQL query (LIMIT of the guard, row budget of the fetch)
 MAX_RESULTS_LLM = 20  # Maximum number of results to return in the LLM response
+RESULT_TOKEN_BUDGET = 800  # Tokens of the result shown to the answer model (sampled rows and column summary)
+RESULT_SAMPLE_WINDOW = 200  # Leading rows read from the stream to sample from
+RESULT_FLOAT_DIGITS = 3  # Decimals of floats (significant digits below 1)
+RESULT_MAX_STRING_CHARS = 60  # Longer strings are shortened
+FAST_ANSWER_ENABLED = True  # Template the answer of small results instead of calling the answer model (per request in Pipeline.run)
+FAST_ANSWER_MAX_ROWS = 10  # Largest result answered with a template
+FAST_ANSWER_MAX_COLUMNS = 6
+INTENT_ROUTER_ENABLED = True  # Answer schema and off-topic questions without generating SQL
+OFF_TOPIC_ANSWER = "I can only answer questions about the database: its tables, their relationships and the data they hold."
+FETCH_BATCH_SIZE = 500  # Rows read from the cursor per fetchmany call
+QUERY_TIMEOUT_SECONDS = 10  # Time budget of a generated query (execution, fetch and count)
+SQLITE_PROGRESS_STEPS = 10000  # SQLite VM steps between two checks of the time budget
+DB_EXECUTOR_WORKERS = 4  # Threads running SQL for the async pipeline
 
 SQL_GEN_SYSTEM_MESSAGE = """
 Given an input question, create a syntactically correct {dialect} query to
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Sequence
+
+import config as cfg
+
+# --- Embedding Cache --- #
+
+# Receives a list of texts and returns one embedding per text (same contract as Chroma embedding functions)
+EmbedFunction = Callable[[list[str]], Sequence[Sequence[float]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a question so trivially different spellings share one embedding."""
+    return " ".join(text.casefold().split()).rstrip("?!. ")
+
+
+class EmbeddingCache:
+    """Bounded in-memory LRU in front of a persistent SQLite store of float32 embeddings.
+
+    Entries are keyed by the normalized text and the embedding model name, so changing
+    cfg.EMBEDDING_MODEL never returns vectors from another model.
+    """
+
+    def __init__(self, path: str = cfg.EMBEDDING_CACHE_PATH, max_size: int = cfg.EMBEDDING_CACHE_SIZE, model: str = cfg.EMBEDDING_MODEL):
+        self.model = model
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, embedding BLOB)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> list[float] | None:
+        """Return the cached embedding for text, or None on a miss."""
+        key = self._key(text)
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            row = self._conn.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            embedding = array("f", row[0]).tolist()
+            self._remember(key, embedding)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: Sequence[float]) -> None:
+        """Store an embedding in memory and on disk."""
+        key = self._key(text)
+        embedding = [float(value) for value in embedding]
+        with self._lock:
+            self._remember(key, embedding)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, embedding) VALUES (?, ?, ?)",
+                (key, self.model, array("f", embedding).tobytes())
+            )
+            self._conn.commit()
+
+    def get_or_embed(self, text: str, embed_function: EmbedFunction) -> list[float]:
+        """Return the cached embedding for text, calling embed_function only on a miss."""
+        embedding = self.get(text)
+        if embedding is None:
+            embedding = [float(value) for value in embed_function([text])[0]]
+            self.put(text, embedding)
+        return embedding
+
+    def close(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._conn.close()
+
+    def _remember(self, key: str, embedding: list[float]) -> None:
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
@@ -5,23 +5,47 @@ import os
 # get or create vector collection and query it
 import chromadb
 from chromadb.utils.embedding_functions.ollama_embedding_function import OllamaEmbeddingFunction
+from collection_registry import registry
+from vector_store import NumpyStore, VectorStore
+from embedding_cache import EmbeddingCache
+from scheduler import EmbeddingBatcher
+from sql_cache import SQLCache, schema_fingerprint
+from ingestion import ingest
+from join_graph import JoinGraph
+from lexical_index import LexicalIndex
+from column_index import column_documents, prune_table
+from functools import lru_cache
 
 # generate SQL queries
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.chat_models import ChatOllama
-import json
+from json_stream import JSONStreamParser, first_object
+from llm_providers import PROVIDER_TYPES
+from contextlib import aclosing, closing
 
 # Execute SQL queries
-import ast # transform string to python literal
+from sql_execution import QueryBudget, QueryCancelled, ResultStream, cancelled_result, execute_stream, count_rows, explain, summarize_columns
+import result_format
+from sql_guard import SQLGuardError, check_query, schema_from_docs
 
 # Generate Answer
 from typing import TypedDict
 
+# Incremental indexing
+import hashlib
+import re
+
+# Instrumentation
+import telemetry
+import prompt_builder
+
 # Config
 import config as cfg
 # Extract environment variables from .env file
 load_dotenv()
 
+log = telemetry.get_logger(__name__)
+
 # --- Functions --- #
 
 # Database Extraction
@@ -34,60 +58,351 @@ def db_extract(db) -> list[str]:
         docs = [doc.split("\n\n")[0] for doc in docs]
     return docs
 
+@lru_cache(maxsize=1)
+def get_schema_docs(db) -> list[str]:
+    """Table documents of db, extracted once per process."""
+    return db_extract(db)
+
+
+@lru_cache(maxsize=1)
+def get_schema(db) -> dict[str, set[str]]:
+    """Table -> columns of db, used to check generated SQL."""
+    return schema_from_docs(get_schema_docs(db))
+
 # Vector collection management
 
-def get_vector_collection() -> chromadb.Collection:
-    """Retrieve or create a ChromaDB vector collection."""
+@lru_cache(maxsize=1)
+def get_embedding_function() -> OllamaEmbeddingFunction:
+    """Return the shared Ollama embedding function."""
     url = os.getenv("OLLAMA_LOCAL_SERVER") if cfg.RUN_LOCALLY else os.getenv("OLLAMA_SERVER")
     # print(f"Connecting to OLLAMA server at {url}...")
-    embedding_function = OllamaEmbeddingFunction(url=url, model_name=cfg.EMBEDDING_MODEL)
-    chroma_client = chromadb.PersistentClient(path=cfg.VECTOR_DB_PATH) # chroma uses sqlite3 to store data
-    return chroma_client.get_or_create_collection(name="rag-sql-app", embedding_function=embedding_function, metadata={"hnsw:space": "cosine"})
-    # hnsw is a nearest neighbor search algorithm, cosine is a similarity measure.
+    return OllamaEmbeddingFunction(url=url, model_name=cfg.EMBEDDING_MODEL)
 
 
-def add_to_vector_collection(all_splits) -> bool:
-    """Add document chunks to the vector database."""
-    collection = get_vector_collection()
-    print("Adding tables to the collection...")
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the shared question embedding cache."""
+    return EmbeddingCache()
 
-    ids = []
 
-    for idx, split in enumerate(all_splits):
-        ids.append(f"{idx}") # Create unique IDs for each chunk
-    
-    # create or update data in the collection
-    collection.upsert(documents=all_splits, ids=ids)
-    print(f"Added {len(all_splits)} tables to the collection")
-    return True
+@lru_cache(maxsize=1)
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Return the shared batcher of question embeddings."""
+    return EmbeddingBatcher(get_embedding_function())
 
 
-def query_collection(prompt: str, top_k: int = cfg.EMBEDDING_TOP_K) -> dict:
-    """Query the vector database based on a user prompt."""
+def embed_query(prompt: str) -> list[float]:
+    """Embed a question, reusing the cached vector for normalized-identical questions.
+
+    Cache misses of concurrent questions are embedded together when cfg.EMBED_BATCHING_ENABLED.
+    """
+    embed_function = get_embedding_batcher() if cfg.EMBED_BATCHING_ENABLED else get_embedding_function()
+    return get_embedding_cache().get_or_embed(prompt, embed_function)
+
+
+def _open_vector_collection(chroma_client: chromadb.ClientAPI) -> chromadb.Collection:
+    """Create the Ollama-embedded collection on the shared client."""
+    return chroma_client.get_or_create_collection(name=cfg.VECTOR_COLLECTION_NAME, embedding_function=get_embedding_function(), metadata={"hnsw:space": "cosine"})
+    # hnsw is a nearest neighbor search algorithm, cosine is a similarity measure.
+
+
+def get_vector_collection() -> chromadb.Collection | VectorStore:
+    """Retrieve or create the vector collection of the configured backend (kept warm in the registry)."""
+    if cfg.VECTOR_STORE_BACKEND == "numpy":
+        return registry.open_store("ollama", lambda path: NumpyStore(os.path.join(path, cfg.VECTOR_COLLECTION_NAME)))
+    return registry.open("ollama", _open_vector_collection)
+
+
+def _open_column_collection(chroma_client: chromadb.ClientAPI) -> chromadb.Collection:
+    """Create the column-level collection on the shared client."""
+    return chroma_client.get_or_create_collection(name=cfg.COLUMN_COLLECTION_NAME, embedding_function=get_embedding_function(), metadata={"hnsw:space": "cosine"})
+
+
+def get_column_collection() -> chromadb.Collection | VectorStore:
+    """Retrieve or create the collection of column documents (kept warm in the registry)."""
+    if cfg.VECTOR_STORE_BACKEND == "numpy":
+        return registry.open_store("ollama-columns", lambda path: NumpyStore(os.path.join(path, cfg.COLUMN_COLLECTION_NAME)))
+    return registry.open("ollama-columns", _open_column_collection)
+
+
+def refresh_vector_collections() -> None:
+    """Reopen the cached collections, e.g. after the vector DB was rebuilt by another process."""
+    registry.refresh()
+
+
+def close_vector_collections() -> None:
+    """Release the cached ChromaDB clients and collections."""
+    registry.close()
+
+
+def table_name(doc: str) -> str:
+    """Stable id of a table document: the table name from its CREATE TABLE statement."""
+    match = re.search(r'CREATE TABLE\s+(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|([^\s(]+))', doc)
+    if match:
+        return next(group for group in match.groups() if group)
+    return f"doc-{content_hash(doc)[:16]}" # fallback for documents without a CREATE TABLE
+
+
+def content_hash(doc: str) -> str:
+    return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+
+def add_to_vector_collection(all_splits) -> dict:
+    """Incrementally index table documents, only new or changed tables are embedded."""
+    log.info("Indexing tables in the collection...")
+    docs = {table_name(split): split for split in all_splits}
+    report = _index_documents(get_vector_collection(), docs, {name: {"table": name} for name in docs})
+    if cfg.COLUMN_INDEX_ENABLED:
+        add_to_column_collection(all_splits)
+    return report
+
+
+def add_to_column_collection(all_splits) -> dict:
+    """Incrementally index one document per column of every table."""
+    log.info("Indexing columns in the column collection...")
+    docs, metadatas = {}, {}
+    for split in all_splits:
+        for id, doc in column_documents(split).items():
+            docs[id] = doc
+            table, column = id.split(".", 1)
+            metadatas[id] = {"table": table, "column": column}
+    return _index_documents(get_column_collection(), docs, metadatas)
+
+
+def _index_documents(collection: chromadb.Collection | VectorStore, docs: dict[str, str], metadatas: dict[str, dict]) -> dict:
+    """Embed new or changed documents, delete the ones that disappeared and report what changed."""
+    hashes = {name: content_hash(doc) for name, doc in docs.items()}
+
+    # Content hashes stored with the vectors tell which tables changed since the last run
+    existing = collection.get(include=["metadatas"])
+    stored = {id: (metadata or {}).get("content_hash") for id, metadata in zip(existing["ids"], existing["metadatas"])}
+
+    report = {"added": [], "updated": [], "skipped": [], "deleted": [], "failed": []}
+    for name in docs:
+        if name not in stored:
+            report["added"].append(name)
+        elif stored[name] != hashes[name]:
+            report["updated"].append(name)
+        else:
+            report["skipped"].append(name)
+    report["deleted"] = [id for id in stored if id not in docs] # dropped tables and legacy positional ids
+
+    changed = report["added"] + report["updated"]
+    if changed:
+        stats = ingest(
+            collection,
+            ids=changed,
+            documents=[docs[name] for name in changed],
+            metadatas=[{**metadatas[name], "content_hash": hashes[name]} for name in changed],
+            embedding_function=get_embedding_function()
+        )
+        # Tables whose batch kept failing are not indexed, they are retried on the next run
+        report["failed"] = stats["failed"]
+        report["added"] = [name for name in report["added"] if name not in stats["failed"]]
+        report["updated"] = [name for name in report["updated"] if name not in stats["failed"]]
+        log.info("Embedded %d documents at %.1f docs/s", len(stats["ingested"]), stats["docs_per_second"])
+    if report["deleted"]:
+        collection.delete(ids=report["deleted"])
+
+    log.info("Indexed documents: %d added, %d updated, %d skipped, %d deleted, %d failed", len(report["added"]),
+             len(report["updated"]), len(report["skipped"]), len(report["deleted"]), len(report["failed"]))
+    return report
+
+
+def query_collection(prompt: str, top_k: int = None) -> dict:
+    """Query the vector database based on a user prompt.
+
+    Vector distances are fused with the lexical index scores, and questions naming enough
+    tables outright skip the embedding call. With a join graph only a few tables are
+    retrieved, plus the tables joining them."""
+    graph = get_join_graph()
+    lexical = get_lexical_index()
+    if top_k is None:
+        top_k = cfg.JOIN_GRAPH_TOP_K if graph is not None else cfg.EMBEDDING_TOP_K
+    with telemetry.span("query_collection", prompt_chars=len(prompt), top_k=top_k) as span:
+        mentioned = lexical.mentions(prompt) if lexical is not None else []
+        if len(mentioned) >= cfg.LEXICAL_DECISIVE_MENTIONS:
+            # The question names its tables, no need for the embedding model
+            log.info("Tables named in the question: %s", ", ".join(mentioned))
+            span.set(lexical_only=True)
+            tables = {"ids": mentioned, "documents": [lexical.docs[table] for table in mentioned], "distances": [0.0] * len(mentioned)}
+        else:
+            tables = _vector_search(prompt, top_k, lexical)
+        if tables and graph is not None:
+            tables = _add_join_tables(tables, graph, lexical)
+            span.set(join_tables=sum(distance is None for distance in tables["distances"]))
+        if tables and cfg.COLUMN_INDEX_ENABLED:
+            tables = _prune_columns(prompt, tables)
+        span.set(tables=len(tables["ids"]) if tables else 0)
+        return tables
+
+
+def _vector_search(prompt: str, top_k: int, lexical: LexicalIndex | None) -> dict | None:
     collection = get_vector_collection()
-    print("Querying the collection...")
-    results = collection.query(query_texts=[prompt], n_results=top_k) if collection.count() > 0 else None
-
-    if results:
-        distances = results["distances"][0]
-        # print(distances)
-
-        best_distance = min(distances)
-        threshold = best_distance * (1 + cfg.DISTANCE_THRESHOLD)
-        
-        # Criar uma máscara de índices que atendem ao critério
-        filtered_indices = [i for i, distance in enumerate(distances) if distance <= threshold and distance <= cfg.DISTANCE_CUTOFF]
-        
-        # Aplicar a filtragem de uma vez só
-        return {
-            "ids": [results["ids"][0][i] for i in filtered_indices],
-            "documents": [results["documents"][0][i] for i in filtered_indices],
-            "distances": [results["distances"][0][i] for i in filtered_indices]
-        }
+    log.info("Querying the collection...")
+    if collection.count() == 0:
+        return None
+    # Embeddings come from the cache, so repeated questions skip the Ollama round trip
+    with telemetry.span("embed_query"):
+        embedding = embed_query(prompt)
+    results = collection.query(query_embeddings=[embedding], n_results=top_k)
+    if lexical is not None:
+        ids, documents, distances = lexical.fuse(prompt, results["ids"][0], results["documents"][0], results["distances"][0])
+        results = {"ids": [ids], "documents": [documents], "distances": [distances]}
+    return _filter_tables(results)
+
+
+def _filter_tables(results: dict) -> dict:
+    """Keep the tables close enough to the best match."""
+    distances = results["distances"][0]
+    # print(distances)
+
+    best_distance = min(distances)
+    threshold = best_distance * (1 + cfg.DISTANCE_THRESHOLD)
+
+    # Criar uma máscara de índices que atendem ao critério
+    filtered_indices = [i for i, distance in enumerate(distances) if distance <= threshold and distance <= cfg.DISTANCE_CUTOFF]
+
+    # Aplicar a filtragem de uma vez só
+    return {
+        "ids": [results["ids"][0][i] for i in filtered_indices],
+        "documents": [results["documents"][0][i] for i in filtered_indices],
+        "distances": [results["distances"][0][i] for i in filtered_indices]
+    }
+
+
+def _add_join_tables(tables: dict, graph: JoinGraph, lexical: LexicalIndex | None) -> dict:
+    """Append the tables on the join paths between the retrieved ones (distance None)."""
+    added = graph.expand(tables["ids"])
+    if not added:
+        return tables
+    if lexical is not None:
+        documents = {table: lexical.docs[table] for table in added if table in lexical.docs}
     else:
+        found = get_vector_collection().get(ids=added, include=["documents"])
+        documents = dict(zip(found["ids"], found["documents"]))
+    added = [table for table in added if table in documents]
+    return {
+        "ids": tables["ids"] + added,
+        "documents": tables["documents"] + [documents[table] for table in added],
+        "distances": tables["distances"] + [None] * len(added)
+    }
+
+
+def query_columns(prompt: str, tables: list[str], top_k: int = cfg.COLUMN_TOP_K) -> dict[str, set[str]]:
+    """Columns of the given tables closest to the prompt, as table -> column names."""
+    collection = get_column_collection()
+    if not tables or collection.count() == 0:
+        return {}
+    where = {"table": {"$in": tables}} if len(tables) > 1 else {"table": tables[0]}
+    results = collection.query(query_embeddings=[embed_query(prompt)], n_results=min(top_k, collection.count()),
+                               where=where, include=["metadatas", "distances"])
+    columns = {}
+    for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+        if distance <= cfg.COLUMN_DISTANCE_CUTOFF:
+            columns.setdefault(metadata["table"], set()).add(metadata["column"])
+    return columns
+
+
+def _prune_columns(prompt: str, tables: dict) -> dict:
+    """Keep only the retrieved columns (plus keys) of the wide tables in the documents."""
+    wide = [table for table, doc in zip(tables["ids"], tables["documents"])
+            if len(column_documents(doc)) > cfg.COLUMN_PRUNE_MIN_COLUMNS]
+    if not wide:
+        return tables
+    with telemetry.span("query_columns", tables=len(wide)) as span:
+        columns = query_columns(prompt, wide)
+        documents = [prune_table(doc, columns.get(table, set())) if table in wide else doc
+                     for table, doc in zip(tables["ids"], tables["documents"])]
+        # Measured prompt reduction, ~4 characters per token
+        before, after = sum(map(len, tables["documents"])), sum(map(len, documents))
+        span.set(chars_before=before, chars_after=after, tokens_saved=(before - after) // 4)
+    return {**tables, "documents": documents}
+
+
+# Join graph and lexical index
+
+@lru_cache(maxsize=1)
+def get_join_graph() -> JoinGraph | None:
+    """Foreign-key graph saved by the last vectorization, None when disabled or missing."""
+    if not cfg.JOIN_GRAPH_ENABLED:
         return None
+    return JoinGraph.load()
+
+
+@lru_cache(maxsize=1)
+def get_lexical_index() -> LexicalIndex | None:
+    """Lexical index saved by the last vectorization, None when disabled or missing."""
+    if not cfg.LEXICAL_INDEX_ENABLED:
+        return None
+    return LexicalIndex.load()
+
+
+def build_lexical_index(all_splits) -> LexicalIndex:
+    """Rebuild and save the lexical index of the table documents."""
+    index = LexicalIndex({table_name(split): split for split in all_splits})
+    index.save()
+    get_lexical_index.cache_clear()
+    return index
+
+
+def build_join_graph(db) -> JoinGraph:
+    """Rebuild and save the foreign-key graph of db."""
+    graph = JoinGraph.from_db(db)
+    graph.save()
+    get_join_graph.cache_clear()
+    log.info("Join graph: %d tables, %d foreign keys", len(graph.tables), len(graph.edges))
+    return graph
+
     
-    
+# SQL generation cache
+
+_sql_cache: SQLCache | None = None  # instance returned by get_sql_cache, closed when replaced
+
+
+@lru_cache(maxsize=1)
+def get_sql_cache(db) -> SQLCache | None:
+    """Return the SQL cache bound to the current schema fingerprint of db."""
+    global _sql_cache
+    if not cfg.SQL_CACHE_ENABLED:
+        return None
+    close_sql_cache()  # the cache of another db or of the schema before a refresh
+    _sql_cache = SQLCache(fingerprint=schema_fingerprint(get_schema_docs(db)), embed_function=embed_query)
+    return _sql_cache
+
+
+def close_sql_cache() -> None:
+    """Close the connection of the SQL cache opened last."""
+    global _sql_cache
+    if _sql_cache is not None:
+        _sql_cache.close()
+        _sql_cache = None
+
+
+def remember_query(cache: SQLCache | None, question: str, table_ids: list[str], model: str, query: str, cached: bool,
+                   succeeded: bool, db_dialect: str = cfg.DB_DIALECT_BASE) -> None:
+    """Cache SQL that passed the guard and ran, forget cached SQL that failed."""
+    if cache is None or query == "Error generating query":
+        return
+    if succeeded and not cached:
+        cache.put(question, table_ids, db_dialect, model, query)
+    elif not succeeded and cached:
+        log.info("Cached SQL failed, discarding it: %s", query)
+        cache.discard(question, table_ids, db_dialect, model)
+
+
+def schema_version() -> tuple:
+    """Modification times of the files every vectorization rewrites (also by another process)."""
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in (cfg.JOIN_GRAPH_PATH, cfg.LEXICAL_INDEX_PATH))
+
+
+def refresh_schema() -> None:
+    """Forget the schema read so far: table documents, SQL cache fingerprint, join graph and lexical index."""
+    for cached in (get_schema_docs, get_schema, get_sql_cache, get_join_graph, get_lexical_index):
+        cached.cache_clear()
+    close_sql_cache()
+
+
 # LLM test
 
 def test_model(llm: ChatOllama) -> None:    
@@ -96,68 +411,200 @@ def test_model(llm: ChatOllama) -> None:
 
 # Write SQL query
 
-def write_query(question: str, llm: ChatOllama, context_tables: str, db_dialect: str = cfg.DB_DIALECT_BASE) -> dict:
-    """Generate SQL query to fetch information."""
-
+def sql_prompt(question: str, context_tables: str, db_dialect: str = cfg.DB_DIALECT_BASE, model: str = None):
+    """Build the SQL generation prompt, tables trimmed to the token budget of model."""
     user_prompt = "Question: {input}"
 
     query_prompt_template = ChatPromptTemplate(
     [("system", cfg.SQL_GEN_SYSTEM_MESSAGE), ("user", user_prompt)]
     )   
 
-    prompt = query_prompt_template.invoke(
+    return query_prompt_template.invoke(
         {
             "dialect": db_dialect,
-            "tables_info": context_tables,
+            "tables_info": prompt_builder.sql_context(question, context_tables, model),
             "input": question
         }
     )
 
-    print(f"Prompt: {prompt}")
 
-    # Get the response from the LLM
-    response = llm.invoke(prompt)
+def parse_query(content: str) -> dict:
+    """Extract the {"query": ...} JSON from an LLM response."""
+    result = first_object(content, required="query")
+    if result is None or not isinstance(result["query"], str):
+        log.warning("Error parsing JSON, raw response: %s", content)
+        return {"query": "Error generating query"}
+    log.debug("Raw response: %s", content)
+    return {"query": result["query"]}
+
+
+def _json_mode(llm: ChatOllama) -> dict:
+    """Call options constraining an Ollama model (or an LLM provider) to JSON output."""
+    return {"format": "json"} if cfg.SQL_LLM_JSON_MODE and isinstance(llm, (ChatOllama, *PROVIDER_TYPES)) else {}
+
+
+def _cached_query(question: str, table_ids: list[str] | None, db_dialect: str, model: str, cache: SQLCache | None, span) -> dict | None:
+    """SQL already generated for this question, tables, dialect and model, None on a miss."""
+    if cache is None or table_ids is None:
+        return None
+    cached_query = cache.get(question, table_ids, db_dialect, model)
+    span.set(cache_hit=cached_query is not None)
+    if cached_query is None:
+        return None
+    log.info("SQL cache hit: %s", cached_query)
+    return {"query": cached_query, "cached": True}
+
+
+def _query_prompt(question: str, context_tables: str, db_dialect: str, model: str, span):
+    prompt = sql_prompt(question, context_tables, db_dialect, model)
+    log.debug("Prompt: %s", prompt)
+    span.set(prompt_chars=len(prompt.to_string()))
+    return prompt
+
+
+def _feed(parser: JSONStreamParser, chunk, span) -> bool:
+    """Add a streamed chunk, True once the {"query": ...} object is complete."""
+    span.set(**telemetry.token_usage(chunk))
+    if parser.feed(chunk.content) is None:
+        return False
+    span.set(stopped_early=True)
+    return True
+
 
-     # Parse the content to get the JSON
+def _parsed_query(parser: JSONStreamParser, model: str, span) -> dict:
+    span.set(response_chars=len(parser.text))
+    prompt_builder.estimator.calibrate(model, span.attributes["prompt_chars"], span.attributes.get("prompt_tokens"))
+    return parse_query(parser.text)
+
+
+def write_query(question: str, llm: ChatOllama, context_tables: str, db_dialect: str = cfg.DB_DIALECT_BASE,
+                table_ids: list[str] = None, cache: SQLCache = None) -> dict:
+    """Generate SQL query to fetch information.
+
+    The completion is streamed and stopped as soon as the {"query": ...} object is complete.
+    With a cache the SQL is looked up first ("cached" is set on a hit); storing it is left to the
+    caller, once the query passed the guard and ran (see remember_query)."""
+    model = getattr(llm, "model", type(llm).__name__)
+    with telemetry.span("write_query", model=model) as span:
+        cached = _cached_query(question, table_ids, db_dialect, model, cache, span)
+        if cached is not None:
+            return cached
+
+        prompt = _query_prompt(question, context_tables, db_dialect, model, span)
+        # Stream the response from the LLM, closing the stream stops the generation
+        parser = JSONStreamParser(required="query")
+        with closing(llm.stream(prompt, **_json_mode(llm))) as stream:
+            for chunk in stream:
+                if _feed(parser, chunk, span):
+                    break
+        return _parsed_query(parser, model, span)
+
+
+async def awrite_query(question: str, llm: ChatOllama, context_tables: str, db_dialect: str = cfg.DB_DIALECT_BASE,
+                       table_ids: list[str] = None, cache: SQLCache = None) -> dict:
+    """Async version of write_query."""
+    model = getattr(llm, "model", type(llm).__name__)
+    with telemetry.span("write_query", model=model) as span:
+        cached = _cached_query(question, table_ids, db_dialect, model, cache, span)
+        if cached is not None:
+            return cached
+
+        prompt = _query_prompt(question, context_tables, db_dialect, model, span)
+        parser = JSONStreamParser(required="query")
+        async with aclosing(llm.astream(prompt, **_json_mode(llm))) as stream:
+            async for chunk in stream:
+                if _feed(parser, chunk, span):
+                    break
+        return _parsed_query(parser, model, span)
+
+
+# Check SQL query before execution
+def guard_query(query: str, db, max_results: int = cfg.MAX_RESULTS_QUERY) -> dict:
+    """Reject invalid or writing queries and bound the number of rows, without a database round trip."""
     try:
-        # Extract the JSON part from the response
-        content = response.content
-        # Find the first JSON in the response (in case there's more than one)
-        json_start = content.find('{')
-        json_end = content.find('}', json_start) + 1
-        json_str = content[json_start:json_end]
-        result = json.loads(json_str)
-        print(f"Raw response: {response.content}")
-        print(result)
-        return {"query": result["query"]}
-    except Exception as e:
-        print(f"Error parsing JSON: {e}")
-        print(f"Raw response: {response.content}")
-        return {"query": "Error generating query"}
-    
+        guarded = check_query(query, get_schema(db), max_rows=max_results)
+    except SQLGuardError as e:
+        log.warning("Query rejected: %s", e)
+        return {"query": query, "count_query": query, "error": f"Error: query rejected, {e}"}
+    return {"query": guarded["query"], "count_query": guarded["count_query"], "error": None}
+
+
+def validate_query(query: str, db) -> dict:
+    """guard_query, then an EXPLAIN of the guarded query in the database (no rows are read)."""
+    guarded = guard_query(query, db)
+    if guarded["error"] is None:
+        try:
+            explain(db, guarded["query"])
+        except Exception as e:
+            guarded["error"] = f"Error: {e}"
+    return guarded
+
 
 # Execute SQL query (Create view)
-def create_view(query: str, db):
-    '''Uses and SQL query to retrieve a table from the DB and calls an llm to generate a 
-    text answer to the user input based on that table'''
-    temp_table =  db.run_no_throw(query, include_columns=True)
-    try:
-        results = ast.literal_eval(temp_table)
-    except Exception as e:
-        results = temp_table
-    total_count = len(results)
-    # print(type(results))
-    # print(results)
-    return results, total_count
+def create_view(query: str, db, count_query: str = None) -> tuple[ResultStream | dict | str, int | None]:
+    '''Runs an SQL query and returns a stream of its rows and the total row count,
+    an error message and 0 when the query fails, or a "query cancelled" result and 0
+    when it exceeds cfg.QUERY_TIMEOUT_SECONDS.
+    count_query (the query without the injected LIMIT) is counted instead of query when given.
+    The rows sampled for the answer are read before counting: when the count runs out of time
+    they are kept and the total is None (unknown)'''
+    budget = QueryBudget()
+    with telemetry.span("create_view") as span:
+        try:
+            results = execute_stream(db, query, budget=budget)
+        except QueryCancelled:
+            # The answer stage still runs and explains that the query was stopped
+            log.warning("Query cancelled after %.1fs: %s", budget.elapsed(), query)
+            span.set(cancelled=True)
+            return cancelled_result(budget), 0
+        except Exception as e:
+            span.set(error=str(e))
+            return f"Error: {e}", 0
+        try:
+            results.head(cfg.RESULT_SAMPLE_WINDOW)
+            total_count = count_rows(db, count_query or query, budget=budget)
+        except QueryCancelled:
+            log.warning("Row count cancelled after %.1fs, keeping the rows read: %s", budget.elapsed(), query)
+            span.set(count_cancelled=True)
+            total_count = None
+        except Exception as e:
+            results.close()
+            span.set(error=str(e))
+            return f"Error: {e}", 0
+        span.set(rows=total_count)
+        return results, total_count
 
 
 # Reduce the number of rows in the result
-def reduce_rows(results: list, max_results: int = cfg.MAX_RESULTS_LLM) -> str:
-    if len(results) > max_results:
-        limited_results = results[:max_results]
-        return f"Showing only the first {max_results}:\n{str(limited_results)}"
-    else:
-        return str(results)
+def reduce_rows(results: ResultStream | list, max_results: int = cfg.MAX_RESULTS_LLM, db=None) -> str:
+    """Compact result text for the answer model (see result_format.serialize).
+
+    Only the first cfg.RESULT_SAMPLE_WINDOW rows are read from the stream, the rest stays in the
+    database; when db is given the column statistics of larger results are computed there."""
+    with telemetry.span("reduce_rows") as span:
+        stats = scope = None
+        if isinstance(results, ResultStream):
+            columns = results.columns
+            rows = results.head(cfg.RESULT_SAMPLE_WINDOW)
+            # A stream stopped by its budget ends early without being complete
+            complete = len(rows) < cfg.RESULT_SAMPLE_WINDOW and not (results.cancelled or results.truncated)
+            # The statistics share the query's time budget, skipped once it is spent
+            if not complete and db is not None and not results.cancelled and not results.budget.expired():
+                try:
+                    stats, scope = summarize_columns(db, results.query, columns, budget=results.budget), "all returned rows"
+                except Exception as e:
+                    log.warning("Column summary failed, using the first rows: %s", e)
+        else:
+            columns = list(results[0]) if results else []
+            rows = [tuple(record.get(column) for column in columns) for record in results]
+            complete = True
+        text = result_format.serialize(columns, rows, complete=complete, stats=stats, stats_scope=scope, max_rows=max_results)
+        if isinstance(results, ResultStream) and results.cancelled:
+            text += f"\n\nNote: the query ran out of its time budget, only the first {len(rows)} rows were read."
+        elif isinstance(results, ResultStream) and results.truncated:
+            text += f"\n\nNote: the result is larger than the row budget, only its first {results.budget.max_rows} rows were read."
+        span.set(rows=len(rows), chars=len(text))
+        return text
 
 
 # Answer generation
@@ -166,28 +613,49 @@ class State(TypedDict):
     question: str
     query: str
     result: str
-    total_count: int
+    total_count: int | None  # None when the count ran out of time
     answer: str
     tables_info: str
 
-def generate_answer(state: State, llm: ChatOllama):
-    """Answer question using retrieved information as context."""
-    prompt = cfg.ANSWER_GEN_SYSTEM_MESSAGE.format(
+def answer_prompt(state: State, model: str = None) -> str:
+    """Build the answer generation prompt, result and tables trimmed to the token budget of model."""
+    state = prompt_builder.answer_context(state, model)
+    return cfg.ANSWER_GEN_SYSTEM_MESSAGE.format(
         question=state["question"],
         tables_info=state["tables_info"],
         sql_query=state["query"],
-        result_row_count=state["total_count"],
+        result_row_count="unknown (the count ran out of time)" if state["total_count"] is None else state["total_count"],
         result_data=state["result"]
     )
-    
-    response = llm.stream(prompt)
 
-    for chunk in response:
-        yield chunk.content
+
+def generate_answer(state: State, llm: ChatOllama):
+    """Answer question using retrieved information as context."""
+    model = getattr(llm, "model", None)
+    prompt = answer_prompt(state, model)
+    with telemetry.span("generate_answer", model=model, prompt_chars=len(prompt)) as span:
+        response = llm.stream(prompt)
+
+        for chunk in response:
+            # Ollama reports the token counts on the last chunk
+            span.set(**telemetry.token_usage(chunk))
+            yield chunk.content
+        prompt_builder.estimator.calibrate(model, len(prompt), span.attributes.get("prompt_tokens"))
 
     # return {"answer": response.content}
 
 
+async def agenerate_answer(state: State, llm: ChatOllama):
+    """Async version of generate_answer."""
+    model = getattr(llm, "model", None)
+    prompt = answer_prompt(state, model)
+    with telemetry.span("generate_answer", model=model, prompt_chars=len(prompt)) as span:
+        async for chunk in llm.astream(prompt):
+            span.set(**telemetry.token_usage(chunk))
+            yield chunk.content
+        prompt_builder.estimator.calibrate(model, len(prompt), span.attributes.get("prompt_tokens"))
+
+
 if __name__ == "__main__":
     # Example usage
     load_dotenv()
@@ -203,7 +671,7 @@ if __name__ == "__main__":
     results, total_count = create_view(query_result["query"], db)
     print(results, total_count)
     
-    state = State(question=question, query=query_result["query"], result=str(results), total_count=total_count, answer="", tables_info=context_tables)
+    state = State(question=question, query=query_result["query"], result=reduce_rows(results) if isinstance(results, ResultStream) else results, total_count=total_count, answer="", tables_info=context_tables)
     answer = generate_answer(state, llm)
     
     for chunk in answer:
@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Sequence
+
+import chromadb
+
+import config as cfg
+from vector_store import VectorStore
+import telemetry
+
+log = telemetry.get_logger(__name__)
+
+# --- Batched Embedding Ingestion --- #
+
+EmbedFunction = Callable[[list[str]], Sequence[Sequence[float]]]
+
+
+def _batches(size: int, batch_size: int) -> list[range]:
+    return [range(start, min(start + batch_size, size)) for start in range(0, size, batch_size)]
+
+
+def _embed_with_retry(embedding_function: EmbedFunction, documents: list[str], retries: int) -> Sequence[Sequence[float]]:
+    """Embed one batch, retrying with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return embedding_function(documents)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            log.warning("Embedding batch failed (%s), retrying...", e)
+            time.sleep(cfg.INGEST_RETRY_BACKOFF * 2 ** attempt)
+
+
+def ingest(collection: chromadb.Collection | VectorStore, ids: list[str], documents: list[str], metadatas: list[dict],
+           embedding_function: EmbedFunction, batch_size: int = cfg.INGEST_BATCH_SIZE,
+           max_workers: int = cfg.INGEST_MAX_WORKERS, retries: int = cfg.INGEST_RETRIES) -> dict:
+    """Embed documents in parallel batches and upsert the vectors into the collection.
+
+    Returns ingestion stats: ingested/failed ids, number of batches, elapsed seconds and docs/s.
+    """
+    start = time.perf_counter()
+    stats = {"ingested": [], "failed": [], "batches": 0, "seconds": 0.0, "docs_per_second": 0.0}
+    batches = _batches(len(documents), batch_size)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_embed_with_retry, embedding_function, [documents[i] for i in batch], retries): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            batch_ids = [ids[i] for i in batch]
+            try:
+                embeddings = future.result()
+            except Exception as e:
+                log.error("Embedding batch failed after %d retries: %s", retries, e)
+                stats["failed"].extend(batch_ids)
+                continue
+
+            # Vectors are precomputed, so Chroma only writes them
+            collection.upsert(
+                ids=batch_ids,
+                documents=[documents[i] for i in batch],
+                embeddings=list(embeddings),
+                metadatas=[metadatas[i] for i in batch]
+            )
+            stats["ingested"].extend(batch_ids)
+            stats["batches"] += 1
+            log.info("Ingested %d/%d documents", len(stats["ingested"]), len(documents))
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["docs_per_second"] = len(stats["ingested"]) / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
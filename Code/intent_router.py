@@ -0,0 +1,94 @@
+import re
+from typing import TypedDict
+
+import config as cfg
+import telemetry
+from join_graph import JoinGraph
+
+# --- Intent Router --- #
+# Rules over the question and the retrieved tables, run before SQL generation:
+# - schema: questions about tables, columns, keys and relationships, answered from the table
+#   documents (one LLM call) or, for the join path between two tables, from the join graph (none)
+# - off_topic: small talk, or nothing in the database matches (no retrieved table, or no word of
+#   the question in the lexical index and no data wording), answered with cfg.OFF_TOPIC_ANSWER (none)
+# - data: everything else goes through SQL generation
+
+SCHEMA = "schema"
+DATA = "data"
+OFF_TOPIC = "off_topic"
+
+TABLE_WORDS = re.compile(r"\b(tables?|tabelas?|schema|esquema)\b", re.IGNORECASE)
+RELATION_WORDS = re.compile(r"\b(relat\w*|relação|relacao|relaç\w*|relacion\w*|connected|linked|ligad\w*)\b", re.IGNORECASE)
+SCHEMA_NOUNS = r"(tables?|tabelas?|columns?|colunas?|fields?|campos?|schema|esquema|database|banco de dados)"
+# Keys, types and "describe" are about the schema only next to a schema noun: "the primary key of the
+# rental table", not "list the films with their primary key" or "describe the most rented film"
+SCHEMA_TERMS = (r"((primary|foreign)\s+keys?|chaves?\s+(primária|primaria|estrangeira)s?|data\s*types?|tipos?\s+de\s+dados?"
+                r"|describe|structure|estrutura)")
+STRUCTURE_PATTERNS = re.compile(
+    r"\b(what|which|list|show|how many|quais|quantas|quantos)\s+(\w+\s+)?(columns?|fields?|colunas?|campos?|tables?|tabelas?)\b"
+    r"|\b(columns?|fields?|colunas?|campos?)\s+(of|in|does|do|da|de)\b"
+    rf"|\b{SCHEMA_TERMS}\W+(\w+\W+){{0,4}}?{SCHEMA_NOUNS}\b|\b{SCHEMA_NOUNS}\W+(\w+\W+){{0,4}}?{SCHEMA_TERMS}\b",
+    re.IGNORECASE
+)
+# Wording of data questions, e.g. "list the customers related to store 1"
+DATA_WORDS = re.compile(r"\b(list|show|count|total|average|sum|top|who|how many|how much|most|least|number|liste|mostre|média|media|soma|quantos|quantas)\b|\d",
+                        re.IGNORECASE)
+SMALL_TALK = re.compile(r"^\s*(hi|hello|hey|olá|ola|oi|thanks|thank you|obrigad[oa]|good (morning|afternoon|evening)|bom dia|boa tarde|boa noite)\W*$",
+                        re.IGNORECASE)
+
+
+class Route(TypedDict):
+    intent: str  # SCHEMA, DATA or OFF_TOPIC
+    reason: str
+    answer: str | None  # templated answer, when the route needs no LLM call
+
+
+def describe_join(graph: JoinGraph, start: str, end: str) -> str | None:
+    """Markdown description of the foreign keys joining two tables, None when they are not connected."""
+    path = graph.shortest_path(start, end)
+    if not path:
+        return None
+    lines = []
+    for left, right in zip(path, path[1:]):
+        for edge in graph.edges:
+            if {edge["table"], edge["ref_table"]} == {left, right}:
+                columns = ", ".join(f"{edge['table']}.{column} → {edge['ref_table']}.{ref}"
+                                    for column, ref in zip(edge["columns"], edge["ref_columns"]))
+                lines.append(f"- {columns}")
+    if len(path) == 2:
+        intro = f"**{start}** and **{end}** are joined directly by a foreign key:"
+    else:
+        bridges = ", ".join(f"**{table}**" for table in path[1:-1])
+        intro = f"**{start}** and **{end}** are related through {bridges}:"
+    return "\n".join([intro] + lines)
+
+
+def route(question: str, tables: dict, mentions: list[str] = (), graph: JoinGraph = None, matched: bool = True) -> Route:
+    """Intent of a question from its wording, the retrieved tables, the tables it names and whether
+    any of its words matches a table, column or sample value (matched)."""
+    with telemetry.span("route") as span:
+        result = _route(question, tables, list(mentions), graph, matched)
+        span.set(intent=result["intent"])
+        telemetry.metrics.increment(f"route.{result['intent']}")
+        return result
+
+
+def _route(question: str, tables: dict, mentions: list[str], graph: JoinGraph | None, matched: bool) -> Route:
+    if SMALL_TALK.match(question):
+        return Route(intent=OFF_TOPIC, reason="small talk", answer=cfg.OFF_TOPIC_ANSWER)
+
+    relation = RELATION_WORDS.search(question)
+    if relation and (TABLE_WORDS.search(question) or (len(mentions) >= 2 and not DATA_WORDS.search(question))):
+        answer = None
+        if graph is not None and len(mentions) == 2:
+            answer = describe_join(graph, *mentions)
+        return Route(intent=SCHEMA, reason="relationship between tables", answer=answer)
+    if STRUCTURE_PATTERNS.search(question):
+        return Route(intent=SCHEMA, reason="tables, columns or keys", answer=None)
+
+    if not tables["ids"]:
+        return Route(intent=OFF_TOPIC, reason="no matching table", answer=cfg.OFF_TOPIC_ANSWER)
+    # The vector search always finds a nearest table, "what is the weather today?" included
+    if not matched and not mentions and not DATA_WORDS.search(question):
+        return Route(intent=OFF_TOPIC, reason="nothing in the database matches", answer=cfg.OFF_TOPIC_ANSWER)
+    return Route(intent=DATA, reason="data question", answer=None)
@@ -0,0 +1,85 @@
+import json
+import os
+from collections import deque
+from itertools import combinations
+
+from sqlalchemy import inspect
+
+import config as cfg
+
+# --- Foreign-Key Join Graph --- #
+# Tables are nodes and foreign keys are undirected edges. Retrieval adds the tables on the
+# shortest join paths between the semantic hits, e.g. film_actor between film and actor.
+
+
+class JoinGraph:
+    """Foreign keys of a database, persisted as JSON next to the vector DB."""
+
+    def __init__(self, tables: list[str], edges: list[dict]):
+        self.tables = tables
+        self.edges = edges  # {"table", "columns", "ref_table", "ref_columns"}
+        self._neighbors: dict[str, set[str]] = {table: set() for table in tables}
+        for edge in edges:
+            self._neighbors.setdefault(edge["table"], set()).add(edge["ref_table"])
+            self._neighbors.setdefault(edge["ref_table"], set()).add(edge["table"])
+
+    @classmethod
+    def from_db(cls, db) -> "JoinGraph":
+        """Read the foreign keys of every table of db."""
+        inspector = inspect(db._engine)
+        tables = sorted(inspector.get_table_names())
+        edges = []
+        for table in tables:
+            for foreign_key in inspector.get_foreign_keys(table):
+                edges.append({
+                    "table": table,
+                    "columns": foreign_key["constrained_columns"],
+                    "ref_table": foreign_key["referred_table"],
+                    "ref_columns": foreign_key["referred_columns"],
+                })
+        return cls(tables, edges)
+
+    @classmethod
+    def load(cls, path: str = cfg.JOIN_GRAPH_PATH) -> "JoinGraph | None":
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(data["tables"], data["edges"])
+
+    def save(self, path: str = cfg.JOIN_GRAPH_PATH) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"tables": self.tables, "edges": self.edges}, file, indent=2)
+
+    def shortest_path(self, start: str, end: str, max_hops: int = cfg.JOIN_GRAPH_MAX_HOPS) -> list[str] | None:
+        """Tables from start to end along foreign keys (breadth-first), None if farther than max_hops."""
+        if start not in self._neighbors or end not in self._neighbors:
+            return None
+        previous = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table, hops = queue.popleft()
+            if table == end:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path[::-1]
+            if hops == max_hops:
+                continue
+            for neighbor in sorted(self._neighbors[table]):
+                if neighbor not in previous:
+                    previous[neighbor] = table
+                    queue.append((neighbor, hops + 1))
+        return None
+
+    def expand(self, tables: list[str], max_hops: int = cfg.JOIN_GRAPH_MAX_HOPS) -> list[str]:
+        """Tables missing from `tables` that lie on the shortest join path of a pair of them."""
+        added = []
+        for start, end in combinations(tables, 2):
+            for table in self.shortest_path(start, end, max_hops) or []:
+                if table not in tables and table not in added:
+                    added.append(table)
+        return added
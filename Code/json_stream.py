@@ -0,0 +1,64 @@
+import json
+
+# --- Incremental JSON Extraction --- #
+# Finds the first complete JSON object of an LLM response while it streams, so generation can
+# stop as soon as the object is closed. Braces inside JSON strings ("{" in a SQL literal) and
+# text around the object (chatter, ```json fences) are handled.
+
+
+class JSONStreamParser:
+    """Feed streamed text, get the first complete top-level JSON object holding the `required` key."""
+
+    def __init__(self, required: str = None):
+        self.required = required
+        self.text = ""
+        self._scanned = 0
+        self._start = None  # position of the "{" opening the current object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> dict | None:
+        """Add a chunk of text, returns the object once it is complete."""
+        self.text += chunk
+        for position in range(self._scanned, len(self.text)):
+            found = self._scan(self.text[position], position)
+            if found is not None:
+                self._scanned = position + 1
+                return found
+        self._scanned = len(self.text)
+        return None
+
+    def _scan(self, char: str, position: int) -> dict | None:
+        if self._depth == 0:
+            # Outside an object only "{" matters, quotes in the chatter are not JSON strings
+            if char == "{":
+                self._start, self._depth = position, 1
+            return None
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return None
+        if char == '"':
+            self._in_string = True
+        elif char == "{":
+            self._depth += 1
+        elif char == "}":
+            self._depth -= 1
+            if self._depth == 0:
+                try:
+                    found = json.loads(self.text[self._start:position + 1])
+                except json.JSONDecodeError:
+                    return None  # not JSON after all, look for the next object
+                if isinstance(found, dict) and (self.required is None or self.required in found):
+                    return found
+        return None
+
+
+def first_object(text: str, required: str = None) -> dict | None:
+    """The first complete JSON object of a whole text (holding the `required` key)."""
+    return JSONStreamParser(required).feed(text)
@@ -0,0 +1,148 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import config as cfg
+from sql_guard import schema_from_docs
+
+# --- Lexical Table Index --- #
+# BM25 over table names, column names and sample values of the table documents, plus exact
+# detection of the tables a question names outright ("the customer table", "rentals").
+
+K1 = 1.2
+B = 0.75
+
+# Table name parts weigh more than column names, which weigh more than sample values
+TABLE_WEIGHT = 3
+COLUMN_WEIGHT = 2
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "and", "or", "is", "are", "was", "were", "be", "with",
+    "what", "which", "who", "how", "many", "much", "all", "list", "show", "give", "me", "there", "their", "from",
+    "table", "tables", "database", "between", "related", "do", "does", "i", "it", "this", "that", "any", "each",
+    "qual", "quais", "o", "as", "os", "de", "da", "das", "dos", "e", "em", "entre", "tabela", "tabelas",
+    "relação", "relacao", "quantos", "quantas", "no", "na", "um", "uma", "para", "por", "com",
+}
+
+
+def stem(word: str) -> str:
+    """Crude English plural stripping, enough to match "cities" with city and "actors" with actor."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def words(text: str, stopwords: set[str] = frozenset()) -> list[str]:
+    """Stemmed lower-case words of a text, identifiers split on underscores."""
+    return [stem(word) for word in re.findall(r"[^\W_]+", text.lower()) if word not in stopwords]
+
+
+def _identifier_words(identifier: str) -> list[str]:
+    # film_actor -> film_actor, film, actor
+    parts = words(identifier)
+    return [identifier.lower()] + parts if len(parts) > 1 else parts
+
+
+class LexicalIndex:
+    """In-process inverted index of the table documents returned by db_extract."""
+
+    def __init__(self, docs: dict[str, str]):
+        self.docs = docs  # table -> document
+        schema = schema_from_docs(list(docs.values()))
+        self.columns = {table: schema.get(table.lower(), set()) for table in docs}
+
+        self._terms: dict[str, Counter] = {}
+        for table, doc in docs.items():
+            terms = Counter()
+            for word in _identifier_words(table):
+                terms[word] += TABLE_WEIGHT
+            for column in self.columns[table]:
+                for word in _identifier_words(column):
+                    terms[word] += COLUMN_WEIGHT
+            # Sample values, in the /* ... */ block after the CREATE TABLE statement
+            samples = re.search(r"/\*.*?\n(.*?)\*/", doc, re.DOTALL)
+            for word in words(samples.group(1) if samples else "", STOPWORDS):
+                if not word.isdigit():  # ids and dates match every table
+                    terms[word] += 1
+            self._terms[table] = terms
+
+        self._lengths = {table: sum(terms.values()) for table, terms in self._terms.items()}
+        self._average_length = sum(self._lengths.values()) / len(self._lengths) if self._lengths else 0.0
+        self._postings: dict[str, dict[str, int]] = {}
+        for table, terms in self._terms.items():
+            for word, frequency in terms.items():
+                self._postings.setdefault(word, {})[table] = frequency
+
+        # Column names read as phrases ("rental rate"), so their words do not count as table mentions.
+        # Keys are left out: "customer id" does refer to the customer table
+        self._column_phrases = sorted(
+            {" ".join(words(column)) for columns in self.columns.values() for column in columns
+             if "_" in column and not column.endswith("_id")},
+            key=len, reverse=True
+        )
+        self._table_names = {" ".join(words(table)): table for table in docs}
+
+    @classmethod
+    def load(cls, path: str = cfg.LEXICAL_INDEX_PATH) -> "LexicalIndex | None":
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    def save(self, path: str = cfg.LEXICAL_INDEX_PATH) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.docs, file)
+
+    def scores(self, question: str) -> dict[str, float]:
+        """BM25 score of every matching table, normalized by the best one (0-1]."""
+        scores: dict[str, float] = {}
+        for word in set(words(question, STOPWORDS)):
+            postings = self._postings.get(word)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for table, frequency in postings.items():
+                norm = K1 * (1 - B + B * self._lengths[table] / self._average_length)
+                scores[table] = scores.get(table, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        best = max(scores.values(), default=0.0)
+        return {table: score / best for table, score in scores.items()} if best else {}
+
+    def mentions(self, question: str) -> list[str]:
+        """Tables named in the question, in order of appearance."""
+        text = " " + " ".join(words(question)) + " "
+        for phrase in self._column_phrases:
+            text = text.replace(f" {phrase} ", " | ")
+        found = []
+        for name, table in self._table_names.items():
+            position = text.find(f" {name} ")
+            if position >= 0:
+                found.append((position, table))
+        # "film actor" also contains "film" and "actor", keep the longest name at each position
+        found.sort(key=lambda item: (item[0], -len(item[1])))
+        tables, covered = [], -1
+        for position, table in found:
+            if position > covered:
+                tables.append(table)
+                covered = position + len(" ".join(words(table)))
+        return tables
+
+    def fuse(self, question: str, ids: list[str], documents: list[str], distances: list[float]) -> tuple[list[str], list[str], list[float]]:
+        """Shrink the vector distances by the lexical scores, adding strong lexical matches the vector search missed."""
+        scores = self.scores(question)
+        ids, documents, distances = list(ids), list(documents), list(distances)
+        for table, score in sorted(scores.items(), key=lambda item: -item[1]):
+            if score >= cfg.LEXICAL_MIN_SCORE and table not in ids:
+                # Unseen by the vector search: assume it sits at the cutoff
+                ids.append(table)
+                documents.append(self.docs[table])
+                distances.append(cfg.DISTANCE_CUTOFF)
+        distances = [distance * (1 - cfg.LEXICAL_WEIGHT * scores.get(id, 0.0)) for id, distance in zip(ids, distances)]
+        return ids, documents, distances
@@ -0,0 +1,227 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Protocol
+
+from langchain_community.chat_models import ChatOllama
+from langchain_core.messages import AIMessageChunk
+from langchain_core.prompt_values import PromptValue
+
+import config as cfg
+import scheduler
+import telemetry
+
+# --- LLM Providers --- #
+# Ollama and Azure OpenAI behind one streaming interface, the astream(prompt) of a LangChain chat
+# model, so functions.awrite_query and agenerate_answer take either. Policies wrap providers:
+# ResilientProvider adds a time-to-first-token timeout and retries, HedgedProvider sends the
+# request to a secondary provider when the primary is slow to start and keeps the first to answer,
+# GatedProvider waits for a generation slot of the scheduler. The gate wraps the timeout of its own
+# provider only: waiting for a slot is not a slow first token, but it is hedged like one.
+
+log = telemetry.get_logger(__name__)
+
+
+class LLMProvider(Protocol):
+    name: str  # "ollama", "azure", ...
+    model: str
+
+    def astream(self, prompt, **kwargs) -> AsyncIterator: ...
+
+
+class OllamaProvider:
+    """A ChatOllama model (or any LangChain chat model)."""
+
+    name = "ollama"
+
+    def __init__(self, llm: ChatOllama):
+        self.llm = llm
+        self.model = getattr(llm, "model", type(llm).__name__)
+
+    async def astream(self, prompt, **kwargs) -> AsyncIterator:
+        async with aclosing(self.llm.astream(prompt, **kwargs)) as stream:
+            async for chunk in stream:
+                yield chunk
+
+
+def _messages(prompt) -> list[dict]:
+    """OpenAI chat messages of a LangChain prompt value or a plain string prompt."""
+    if isinstance(prompt, PromptValue):
+        roles = {"system": "system", "human": "user", "ai": "assistant"}
+        return [{"role": roles.get(message.type, "user"), "content": message.content} for message in prompt.to_messages()]
+    return [{"role": "user", "content": str(prompt)}]
+
+
+class AzureProvider:
+    """A deployment of an AsyncAzureOpenAI client, streamed."""
+
+    name = "azure"
+
+    def __init__(self, client, model: str, temperature: float, max_tokens: int):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    async def astream(self, prompt, format: str = None, **kwargs) -> AsyncIterator:
+        options = {"response_format": {"type": "json_object"}} if format == "json" and cfg.SQL_LLM_JSON_MODE_AZURE else {}
+        async with await self.client.chat.completions.create(
+            model=self.model,
+            messages=_messages(prompt),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+            **options,
+        ) as response:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield AIMessageChunk(content=chunk.choices[0].delta.content)
+
+
+class ResilientProvider:
+    """Timeout on the first token (and between tokens), retries of calls failing before their first token."""
+
+    def __init__(self, provider: LLMProvider, timeout: float = cfg.LLM_TIMEOUT_SECONDS, retries: int = cfg.LLM_RETRIES,
+                 backoff: float = cfg.LLM_RETRY_BACKOFF):
+        self.provider = provider
+        self.name = provider.name
+        self.model = provider.model
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _next(self, stream: AsyncIterator):
+        try:
+            return await asyncio.wait_for(anext(stream), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{self.name} sent no token for {self.timeout:g}s") from None
+
+    async def astream(self, prompt, **kwargs) -> AsyncIterator:
+        for attempt in range(self.retries + 1):
+            stream = self.provider.astream(prompt, **kwargs)
+            try:
+                first = await self._next(stream)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                if attempt == self.retries:
+                    raise
+                log.warning("%s call failed (%s), retrying", self.name, e)
+                telemetry.metrics.increment(f"llm.{self.name}.retries")
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                continue
+            # Once tokens were sent, failures are not retried
+            async with aclosing(stream):
+                yield first
+                while True:
+                    try:
+                        chunk = await self._next(stream)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+
+
+class GatedProvider:
+    """Generations admitted by a scheduler.LLMGate, the slot is held until the stream ends."""
+
+    def __init__(self, provider: LLMProvider, gate: scheduler.LLMGate = None):
+        self.provider = provider
+        self.name = provider.name
+        self.model = provider.model
+        self.gate = gate or scheduler.gate
+
+    async def astream(self, prompt, **kwargs) -> AsyncIterator:
+        async with self.gate.slot(self.model):
+            async with aclosing(self.provider.astream(prompt, **kwargs)) as stream:
+                async for chunk in stream:
+                    yield chunk
+
+
+_DONE = object()
+
+
+class HedgedProvider:
+    """The primary provider, with the same request sent to the secondary when the primary's first
+    token takes longer than `delay` (or the primary fails). The first to send a token is streamed,
+    the other call is cancelled."""
+
+    def __init__(self, primary: LLMProvider, secondary: LLMProvider, delay: float = cfg.LLM_HEDGE_DELAY_SECONDS):
+        self.providers = [primary, secondary]
+        self.name = primary.name
+        self.model = primary.model
+        self.delay = delay
+
+    @staticmethod
+    async def _pump(provider: LLMProvider, index: int, prompt, kwargs: dict, queue: asyncio.Queue) -> None:
+        try:
+            async for chunk in provider.astream(prompt, **kwargs):
+                await queue.put((index, chunk, None))
+            await queue.put((index, _DONE, None))
+        except Exception as e:
+            await queue.put((index, None, e))
+
+    async def astream(self, prompt, **kwargs) -> AsyncIterator:
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        tasks: list[asyncio.Task] = []
+        failed: dict[int, Exception] = {}
+        winner = None
+
+        def start(index: int) -> None:
+            tasks.append(asyncio.create_task(self._pump(self.providers[index], index, prompt, kwargs, queue)))
+
+        start(0)
+        hedge_at = loop.time() + self.delay
+        try:
+            while True:
+                waiting = winner is None and len(tasks) == 1
+                try:
+                    index, chunk, error = await asyncio.wait_for(queue.get(), max(hedge_at - loop.time(), 0) if waiting else None)
+                except asyncio.TimeoutError:
+                    log.info("No token from %s after %.1fs, hedging with %s", self.providers[0].name, self.delay, self.providers[1].name)
+                    telemetry.metrics.increment("llm.hedged")
+                    start(1)
+                    continue
+
+                if winner is None:
+                    if error is not None:
+                        failed[index] = error
+                        if len(failed) == len(self.providers):
+                            raise error
+                        if len(tasks) == 1:
+                            log.warning("%s failed (%s), failing over to %s", self.providers[0].name, error, self.providers[1].name)
+                            telemetry.metrics.increment("llm.failover")
+                            start(1)
+                        continue
+                    winner = index
+                    telemetry.metrics.increment(f"llm.wins.{self.providers[index].name}")
+                    for other, task in enumerate(tasks):
+                        if other != winner:
+                            task.cancel()
+
+                if index != winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# Providers and policies, all accepting format="json"
+PROVIDER_TYPES = (OllamaProvider, AzureProvider, ResilientProvider, GatedProvider, HedgedProvider)
+
+
+def with_policies(primary: LLMProvider, secondary: LLMProvider = None, gated: tuple[str, ...] = ()) -> LLMProvider:
+    """primary with timeouts and retries, hedged with secondary when cfg.LLM_HEDGE_ENABLED, the
+    providers named in gated waiting for a scheduler slot before their timeout starts."""
+    def leg(provider: LLMProvider) -> LLMProvider:
+        resilient = ResilientProvider(provider)
+        return GatedProvider(resilient) if provider.name in gated else resilient
+
+    if secondary is None or not cfg.LLM_HEDGE_ENABLED:
+        return leg(primary)
+    return HedgedProvider(leg(primary), leg(secondary))
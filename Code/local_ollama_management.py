@@ -1,34 +1,150 @@
+import json
 import os
+import shutil
 import subprocess
+import time
+import urllib.error
+import urllib.request
 import psutil
-from config import OLLAMA_PATH
+import ollama
+import telemetry
+from config import (OLLAMA_PATH, OLLAMA_KEEP_ALIVE, RUN_LOCALLY, OLLAMA_HEALTH_TIMEOUT_SECONDS, OLLAMA_READY_TIMEOUT_SECONDS,
+                    OLLAMA_READY_POLL_SECONDS, OLLAMA_LOAD_TIMEOUT_SECONDS, SQL_LLM_MODEL, ANSWER_LLM_MODEL, EMBEDDING_MODEL)
+
+log = telemetry.get_logger(__name__)
 
 # Ollama server management
+# The server is checked over HTTP at its URL (OLLAMA_LOCAL_SERVER or OLLAMA_SERVER), a started
+# server is waited for until it answers, and the models are loaded before the first question
+# with preload_models, which reports how long each took cold and warm.
+
+def ollama_url() -> str:
+    """URL of the configured Ollama server."""
+    url = os.getenv("OLLAMA_LOCAL_SERVER") if RUN_LOCALLY else os.getenv("OLLAMA_SERVER")
+    return (url or "http://127.0.0.1:11434").rstrip("/")
+
+
+def _request(base_url: str, path: str, payload: dict = None, timeout: float = OLLAMA_HEALTH_TIMEOUT_SECONDS) -> dict:
+    """JSON response of an Ollama API call, a POST when there is a payload."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(f"{base_url.rstrip('/')}{path}", data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
 
-def start_ollama():
-    """Start the Ollama server if it's not already running."""
-    print("\nStarting Ollama server...")
+
+def is_ollama_healthy(base_url: str = None, timeout: float = OLLAMA_HEALTH_TIMEOUT_SECONDS) -> bool:
+    """Whether the Ollama server answers its version endpoint."""
+    try:
+        _request(base_url or ollama_url(), "/api/version", timeout=timeout)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def wait_until_ready(base_url: str = None, timeout: float = OLLAMA_READY_TIMEOUT_SECONDS, poll: float = OLLAMA_READY_POLL_SECONDS) -> float:
+    """Wait for the server to answer its health check, returns the seconds waited."""
+    base_url = base_url or ollama_url()
+    start = time.perf_counter()
+    deadline = start + timeout
+    while not is_ollama_healthy(base_url, timeout=min(OLLAMA_HEALTH_TIMEOUT_SECONDS, max(deadline - time.perf_counter(), 0.01))):
+        if time.perf_counter() + poll > deadline:
+            raise TimeoutError(f"Ollama at {base_url} not ready after {timeout:g}s")
+        time.sleep(poll)
+    waited = time.perf_counter() - start
+    telemetry.metrics.observe("ollama.ready_seconds", waited)
+    return waited
+
+
+def start_ollama(base_url: str = None, timeout: float = OLLAMA_READY_TIMEOUT_SECONDS) -> bool:
+    """Start the Ollama server and wait until it answers, returns whether it is ready."""
+    log.info("Starting Ollama server...")
+    # The configured path, else the ollama executable on the PATH
+    path = OLLAMA_PATH if os.path.exists(OLLAMA_PATH) else shutil.which("ollama")
     try:
         with open(os.devnull, 'w') as devnull:
-            subprocess.Popen([OLLAMA_PATH, 'serve'], stdout=devnull, stderr=devnull)
-        print("Ollama server started.")
+            subprocess.Popen([path or OLLAMA_PATH, 'serve'], stdout=devnull, stderr=devnull)
+        waited = wait_until_ready(base_url, timeout)
+        log.info("Ollama server ready in %.1fs", waited)
+        return True
     except Exception as e:
-        print(f"Failed to initiate Ollama: {e}")
+        log.error("Failed to initiate Ollama: %s", e)
+        return False
 
 
-def is_ollama_running() -> bool:
-    """Check if the Ollama server is running."""
-    print("Checking if Ollama server is running...")
-    isRunning = any('ollama' in proc.info['name'].lower() for proc in psutil.process_iter(['name']))
-    print(isRunning)
+def is_ollama_running(base_url: str = None) -> bool:
+    """Check if the Ollama server is running (answering at its URL)."""
+    isRunning = is_ollama_healthy(base_url)
+    log.info("Ollama server running: %s", isRunning)
     return isRunning
 
 
+def ensure_ollama(base_url: str = None, timeout: float = OLLAMA_READY_TIMEOUT_SECONDS) -> bool:
+    """Start the local server when it is not answering, returns whether it is ready."""
+    if is_ollama_running(base_url):
+        return True
+    if not RUN_LOCALLY:
+        log.error("Ollama server at %s is not answering", base_url or ollama_url())
+        return False
+    return start_ollama(base_url, timeout)
+
+
 def terminate_ollama_processes():
     """Terminate all running Ollama processes."""
-    print("\n\nTerminating Ollama process...")
+    log.info("Terminating Ollama processes...")
     for proc in psutil.process_iter(['pid', 'name']):
-        if 'ollama' in proc.info['name'].lower():  
-            proc.terminate() 
-            proc.wait() 
-            print(f"Ollama Process (PID {proc.info['pid']}) terminated")
\ No newline at end of file
+        if 'ollama' in proc.info['name'].lower():
+            proc.terminate()
+            proc.wait()
+            log.info("Ollama process (PID %s) terminated", proc.info['pid'])
+
+
+# Model preloading
+
+def loaded_models(base_url: str = None) -> set[str]:
+    """Models currently in the server's memory."""
+    return {model["name"] for model in _request(base_url or ollama_url(), "/api/ps").get("models", [])}
+
+
+def load_model(model: str, base_url: str = None, keep_alive: str = OLLAMA_KEEP_ALIVE, embedding: bool = False) -> float:
+    """Load a model into memory for keep_alive without generating anything, returns the seconds taken."""
+    payload = {"model": model, "keep_alive": keep_alive}
+    if embedding:
+        payload["input"] = "warm up"  # embedding models are loaded by an embed call
+    start = time.perf_counter()
+    _request(base_url or ollama_url(), "/api/embed" if embedding else "/api/generate", payload, timeout=OLLAMA_LOAD_TIMEOUT_SECONDS)
+    return time.perf_counter() - start
+
+
+def preload_models(base_url: str = None, keep_alive: str = OLLAMA_KEEP_ALIVE, models: list[str] = None,
+                   embedding_models: list[str] = None) -> dict[str, dict]:
+    """Load the SQL, answer and embedding models, returns per model whether it was already loaded
+    and the latency of its first (cold) and second (warm) call."""
+    base_url = base_url or ollama_url()
+    models = list(dict.fromkeys(models or [SQL_LLM_MODEL, ANSWER_LLM_MODEL]))
+    embedding_models = embedding_models or [EMBEDDING_MODEL]
+    try:
+        loaded = loaded_models(base_url)
+    except (OSError, ValueError):
+        loaded = set()
+
+    report = {}
+    for model, embedding in [(model, False) for model in models] + [(model, True) for model in embedding_models]:
+        try:
+            cold = load_model(model, base_url, keep_alive, embedding)
+            warm = load_model(model, base_url, keep_alive, embedding)
+        except (OSError, ValueError) as e:
+            log.warning("Failed to load %s: %s", model, e)
+            report[model] = {"error": str(e)}
+            continue
+        report[model] = {"was_loaded": model in loaded, "cold_seconds": cold, "warm_seconds": warm}
+        telemetry.metrics.observe("ollama.load_seconds.cold", cold)
+        telemetry.metrics.observe("ollama.load_seconds.warm", warm)
+    return report
+
+
+async def warm_model(model: str, base_url: str, keep_alive: str = OLLAMA_KEEP_ALIVE) -> None:
+    """Load a model into Ollama's memory without generating anything."""
+    try:
+        await ollama.AsyncClient(host=base_url).generate(model=model, keep_alive=keep_alive)
+    except Exception as e:
+        log.warning("Failed to warm %s: %s", model, e)
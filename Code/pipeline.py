@@ -0,0 +1,351 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, Iterator
+
+from dotenv import load_dotenv
+from langchain_community.chat_models import ChatOllama
+from langchain_community.utilities import SQLDatabase
+
+import config as cfg
+import functions as fn
+import intent_router
+import llm_providers
+import telemetry
+from local_ollama_management import warm_model
+from result_format import template_answer
+from sql_execution import ResultStream
+
+load_dotenv()
+
+log = telemetry.get_logger(__name__)
+
+# --- Async RAG-SQL Pipeline --- #
+
+# Events yielded by the pipeline, the "type" key is one of:
+# status (message), tables (tables), route (route), query (query),
+# result (results, total_count, preview), answer (chunk) and done (state)
+Event = dict
+
+EMPTY_TABLES = {"ids": [], "documents": [], "distances": []}
+
+
+class Pipeline:
+    """Retrieval, SQL generation, execution and answer generation over one database.
+
+    answer_question is the async API: it yields events as each stage finishes and serves many
+    questions concurrently on one event loop. Blocking work (embeddings and Chroma, SQL execution)
+    is offloaded to threads, the LLMs are called through the streaming interface of llm_providers.
+    run is the blocking wrapper used by scripts and the UI.
+    """
+
+    def __init__(self, db, sql_llm: ChatOllama, answer_llm: ChatOllama, base_url: str = None, db_workers: int = cfg.DB_EXECUTOR_WORKERS):
+        self.db = db
+        self.sql_llm = sql_llm
+        self.answer_llm = answer_llm
+        self.base_url = base_url
+        self._db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="pipeline-db")
+        self._schema_version = fn.schema_version()
+
+    async def _in_db_thread(self, function, *args):
+        # Copy the context so spans opened in the thread belong to the current trace
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, context.run, function, *args)
+
+    # Stages
+
+    def _check_schema(self) -> None:
+        # A vectorization (here or in another process) may have changed the schema: the table
+        # documents, guard schema and SQL cache fingerprint are read again
+        version = fn.schema_version()
+        if version != self._schema_version:
+            log.info("Vector DB rebuilt, reloading the schema")
+            fn.refresh_schema()
+            self._schema_version = version
+
+    def _retrieve(self, question: str) -> dict:
+        tables = fn.query_collection(prompt=question)
+        if tables is None:
+            # Empty vector collection, index the database first
+            docs = fn.db_extract(self.db)
+            fn.add_to_vector_collection(docs)
+            fn.build_join_graph(self.db)
+            fn.build_lexical_index(docs)
+            tables = fn.query_collection(prompt=question)
+        return tables or EMPTY_TABLES
+
+    def _route(self, question: str, tables: dict) -> intent_router.Route:
+        if not cfg.INTENT_ROUTER_ENABLED:
+            return intent_router.Route(intent=intent_router.DATA, reason="router disabled", answer=None)
+        lexical = fn.get_lexical_index()
+        mentions = lexical.mentions(question) if lexical is not None else []
+        matched = lexical is None or bool(mentions or lexical.scores(question))
+        return intent_router.route(question, tables, mentions, fn.get_join_graph(), matched)
+
+    def _schema_overview(self) -> str:
+        # Schema questions about no table in particular ("how many tables are there?")
+        graph = fn.get_join_graph()
+        tables = graph.tables if graph is not None else sorted(self.db.get_usable_table_names())
+        return f"The database has {len(tables)} tables: {', '.join(tables)}"
+
+    def _sql_model(self, provider: str) -> str:
+        """Model name of the SQL cache keys."""
+        return cfg.SQL_LLM_MODEL_AZURE if provider == "azure" else getattr(self.sql_llm, "model", type(self.sql_llm).__name__)
+
+    async def _write_query(self, state: fn.State, provider: str, cache) -> dict:
+        if cfg.SQL_CANDIDATES > 1:
+            return await self._race_candidates(state, provider, cache)
+        return await self._write_candidate(state, provider, cache=cache)
+
+    def _provider(self, role: str, provider: str, temperature: float = None) -> llm_providers.LLMProvider:
+        """SQL or answer model of a provider, through the LLM provider interface."""
+        if provider == "azure":
+            import azure_functions as azf
+            if role == "sql":
+                return llm_providers.AzureProvider(azf.async_client, cfg.SQL_LLM_MODEL_AZURE,
+                                                   cfg.SQL_LLM_TEMPERATURE_AZURE if temperature is None else temperature, cfg.SQL_LLM_MAX_TOKENS_AZURE)
+            return llm_providers.AzureProvider(azf.async_client, cfg.ANSWER_LLM_MODEL_AZURE, cfg.ANSWER_LLM_TEMPERATURE_AZURE, cfg.ANSWER_LLM_MAX_TOKENS_AZURE)
+        llm = self.sql_llm if role == "sql" else self.answer_llm
+        if temperature is not None:
+            llm = llm.model_copy(update={"temperature": temperature})
+        return llm_providers.OllamaProvider(llm)
+
+    def _llm(self, role: str, provider: str, temperature: float = None) -> llm_providers.LLMProvider:
+        # The other provider is only built (Azure client included) when hedging is on
+        secondary = None
+        if cfg.LLM_HEDGE_ENABLED:
+            secondary = self._provider(role, "azure" if provider == "ollama" else "ollama", temperature)
+        # One Ollama instance serves every question, its generations wait for a slot
+        gated = ("ollama",) if cfg.LLM_GATE_ENABLED else ()
+        return llm_providers.with_policies(self._provider(role, provider, temperature), secondary, gated)
+
+    async def _write_candidate(self, state: fn.State, provider: str, temperature: float = None, cache=None) -> dict:
+        return await fn.awrite_query(
+            question=state["question"], llm=self._llm("sql", provider, temperature), context_tables=state["tables_info"],
+            table_ids=state["tables"]["ids"], cache=cache
+        )
+
+    def _candidate_slots(self, provider: str) -> list[tuple[str, str, float]]:
+        """(slot, provider, temperature) of every SQL candidate."""
+        temperatures = cfg.SQL_CANDIDATE_TEMPERATURES
+        slots = [(provider, temperatures[i % len(temperatures)]) for i in range(cfg.SQL_CANDIDATES)]
+        if cfg.SQL_CANDIDATE_OTHER_PROVIDER:
+            slots.append(("azure" if provider == "ollama" else "ollama", temperatures[0]))
+        return [(f"{i}-{name}@{temperature:g}", name, temperature) for i, (name, temperature) in enumerate(slots)]
+
+    async def _race_candidates(self, state: fn.State, provider: str, cache) -> dict:
+        """Generate the candidates concurrently and keep the first one passing validate_query, cancelling the rest."""
+        if cache is not None:
+            cached_query = await self._in_db_thread(cache.get, state["question"], state["tables"]["ids"], cfg.DB_DIALECT_BASE,
+                                                    self._sql_model(provider))
+            if cached_query is not None:
+                return {"query": cached_query, "cached": True}
+
+        async def attempt(slot: str, candidate_provider: str, temperature: float) -> tuple[str, str, str | None]:
+            query = (await self._write_candidate(state, candidate_provider, temperature))["query"]
+            if query == "Error generating query":
+                return slot, query, query
+            return slot, query, (await self._in_db_thread(fn.validate_query, query, self.db))["error"]
+
+        tasks = [asyncio.create_task(attempt(*slot)) for slot in self._candidate_slots(provider)]
+        first_query = None
+        with telemetry.span("sql_candidates", candidates=len(tasks)) as span:
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        slot, query, error = await next_done
+                    except Exception as e:
+                        log.warning("SQL candidate failed: %s", e)
+                        continue
+                    first_query = first_query or query
+                    if error is None:
+                        span.set(winner=slot)
+                        telemetry.metrics.increment(f"sql.candidates.wins.{slot}")
+                        return {"query": query}
+                    log.info("SQL candidate %s rejected: %s", slot, error)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            # No valid candidate, the first one goes on to report its error
+            telemetry.metrics.increment("sql.candidates.none_valid")
+            return {"query": first_query or "Error generating query"}
+
+    def _execute(self, query: str) -> tuple:
+        guarded = fn.guard_query(query, self.db)
+        if guarded["error"]:
+            return guarded["error"], 0
+        return fn.create_view(query=guarded["query"], db=self.db, count_query=guarded["count_query"])
+
+    def _reduce(self, results: ResultStream, total_count: int | None, fast_answer: bool) -> tuple[str, str | None]:
+        # The answer model sees a sample of the rows; small, complete results also get a templated answer
+        result = fn.reduce_rows(results, cfg.MAX_RESULTS_LLM, self.db)
+        if not fast_answer or results.cancelled or results.truncated:
+            return result, None
+        return result, template_answer(results.columns, results.head(cfg.FAST_ANSWER_MAX_ROWS + 1), total_count)
+
+    async def _warm_answer_model(self, provider: str) -> None:
+        # Only useful when the answer model is not the one already loaded for SQL generation
+        if provider == "ollama" and self.base_url and self.answer_llm.model != self.sql_llm.model:
+            await warm_model(self.answer_llm.model, self.base_url)
+
+    async def _generate_answer(self, state: fn.State, provider: str) -> AsyncIterator[str]:
+        async for chunk in fn.agenerate_answer(state=state, llm=self._llm("answer", provider)):
+            yield chunk
+
+    # API
+
+    async def answer_question(self, question: str, provider: str = "ollama", fast_answer: bool = None) -> AsyncIterator[Event]:
+        """Answer a question, yielding an event as each stage completes.
+
+        With fast_answer (cfg.FAST_ANSWER_ENABLED by default) scalar, single-row and small results
+        are answered with a template instead of the answer model.
+        """
+        fast_answer = cfg.FAST_ANSWER_ENABLED if fast_answer is None else fast_answer
+        with telemetry.span("pipeline", provider=provider):
+            async for event in self._answer_question(question, provider, fast_answer):
+                yield event
+
+    async def _answer_question(self, question: str, provider: str, fast_answer: bool) -> AsyncIterator[Event]:
+        state = fn.State(question=question, query="", result="", total_count=0, answer="", tables_info="")
+        await self._in_db_thread(self._check_schema)
+
+        yield {"type": "status", "message": "Retrieving relevant tables..."}
+        state["tables"] = await asyncio.to_thread(self._retrieve, question)
+        state["tables_info"] = "\n---\n".join(state["tables"]["documents"])
+        yield {"type": "tables", "tables": state["tables"]}
+
+        route = await asyncio.to_thread(self._route, question, state["tables"])
+        yield {"type": "route", "route": route}
+
+        warm = None
+        try:
+            templated = None
+            if route["intent"] == intent_router.OFF_TOPIC:
+                templated = route["answer"]
+            elif route["intent"] == intent_router.SCHEMA:
+                # Answered from the table documents, without SQL
+                templated = route["answer"] if fast_answer else None
+                if not state["tables_info"]:
+                    state["tables_info"] = await self._in_db_thread(self._schema_overview)
+            else:
+                # Load the answer model while the SQL is generated and executed (off-topic and schema
+                # questions have nothing to overlap it with), cancelled when the result is templated
+                warm = asyncio.create_task(self._warm_answer_model(provider))
+                yield {"type": "status", "message": "Generating SQL query..."}
+                cache = await self._in_db_thread(fn.get_sql_cache, self.db)
+                written = await self._write_query(state, provider, cache)
+                state["query"] = written["query"]
+                yield {"type": "query", "query": state["query"]}
+
+                yield {"type": "status", "message": "Executing SQL query..."}
+                if state["query"] == "Error generating query":
+                    state["result"] = "Empty"
+                else:
+                    results, total_count = await self._in_db_thread(self._execute, state["query"])
+                    if isinstance(results, ResultStream):
+                        state["results"] = results
+                        state["total_count"] = total_count
+                        state["result"], templated = await self._in_db_thread(self._reduce, results, total_count, fast_answer)
+                        yield {"type": "result", "results": results, "total_count": total_count, "preview": state["result"]}
+                    else:
+                        state["result"] = results
+                    # Only SQL that passed the guard and ran is cached
+                    succeeded = isinstance(results, ResultStream) and not results.cancelled
+                    await self._in_db_thread(fn.remember_query, cache, question, state["tables"]["ids"], self._sql_model(provider),
+                                             state["query"], written.get("cached", False), succeeded)
+
+            if templated is not None:
+                # No answer model round trip for results that read as they are
+                telemetry.metrics.increment("answer.fast_path")
+                state["answer"] = templated
+                yield {"type": "answer", "chunk": templated}
+            else:
+                if warm is not None:
+                    await warm
+                yield {"type": "status", "message": "Generating answer..."}
+                answer = []
+                async for chunk in self._generate_answer(state, provider):
+                    answer.append(chunk)
+                    yield {"type": "answer", "chunk": chunk}
+                state["answer"] = "".join(answer)
+        finally:
+            if warm is not None:
+                warm.cancel()
+            if isinstance(state.get("results"), ResultStream):
+                state["results"].close()
+
+        yield {"type": "done", "state": state}
+
+    def run(self, question: str, provider: str = "ollama", fast_answer: bool = None) -> Iterator[Event]:
+        """Blocking iterator over the events of answer_question."""
+        loop = _background_loop()
+        events = self.answer_question(question, provider, fast_answer)
+        # Every step runs in the same context, so spans stay open across events
+        context = contextvars.copy_context()
+        try:
+            while True:
+                try:
+                    event = _run_in_loop(loop, events.__anext__(), context).result()
+                except StopAsyncIteration:
+                    return
+                yield event
+        finally:
+            _run_in_loop(loop, events.aclose(), context).result()
+
+
+# One event loop in a daemon thread serves every blocking caller, so async clients stay bound to it
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pipeline-loop", daemon=True).start()
+        return _loop
+
+
+def _run_in_loop(loop: asyncio.AbstractEventLoop, coroutine, context: contextvars.Context) -> Future:
+    """Like asyncio.run_coroutine_threadsafe, with the task running in the given context."""
+    future = Future()
+
+    def done(task: asyncio.Task) -> None:
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    loop.call_soon_threadsafe(lambda: loop.create_task(coroutine, context=context).add_done_callback(done))
+    return future
+
+
+def build_pipeline(db=None) -> Pipeline:
+    """Create a pipeline with the database and Ollama models from config."""
+    db = db or SQLDatabase.from_uri(f"sqlite:///{cfg.DB_PATH}")
+    base_url = os.getenv("OLLAMA_LOCAL_SERVER") if cfg.RUN_LOCALLY else os.getenv("OLLAMA_SERVER")
+    sql_llm = ChatOllama(base_url=base_url, model=cfg.SQL_LLM_MODEL, temperature=cfg.SQL_LLM_TEMPERATURE, top_p=cfg.SQL_LLM_TOP_P)
+    answer_llm = ChatOllama(base_url=base_url, model=cfg.ANSWER_LLM_MODEL, temperature=cfg.ANSWER_LLM_TEMPERATURE, top_p=cfg.ANSWER_LLM_TOP_P)
+    return Pipeline(db, sql_llm, answer_llm, base_url=base_url)
+
+
+@lru_cache(maxsize=None)
+def get_pipeline(db) -> Pipeline:
+    """Pipeline shared by every caller using the same database."""
+    return build_pipeline(db)
+
+
+def candidate_wins() -> dict[str, int]:
+    """How often each SQL candidate slot won a race, plus the races no candidate won ("none")."""
+    counters = telemetry.metrics.snapshot()["counters"]
+    wins = {name.removeprefix("sql.candidates.wins."): int(count) for name, count in counters.items()
+            if name.startswith("sql.candidates.wins.")}
+    if "sql.candidates.none_valid" in counters:
+        wins["none"] = int(counters["sql.candidates.none_valid"])
+    return wins
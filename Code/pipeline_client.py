@@ -0,0 +1,79 @@
+import http.client
+import json
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import config as cfg
+
+# --- Pipeline Client --- #
+# Thin client of pipeline_server: no database, vector collection or model is loaded here, the
+# events of Pipeline.run are read from the server as they are streamed. The result event has
+# columns and rows instead of a ResultStream.
+
+Event = dict
+
+
+class ServerBusy(Exception):
+    """Raised when the server queue is full, retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PipelineError(Exception):
+    """Raised when the server failed to answer a question."""
+
+
+class PipelineClient:
+    """Questions sent to a pipeline server, answered as a stream of events."""
+
+    def __init__(self, url: str = cfg.PIPELINE_SERVER_URL, timeout: float = cfg.PIPELINE_CLIENT_TIMEOUT_SECONDS):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, payload: dict = None) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(payload).encode() if payload is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            return connection, connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+
+    def _get(self, path: str) -> dict:
+        connection, response = self._request("GET", path)
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def health(self) -> dict:
+        """Slots in use and questions waiting on the server."""
+        return self._get("/health")
+
+    def metrics(self) -> dict:
+        """Metrics snapshot of the server process."""
+        return self._get("/metrics")
+
+    def run(self, question: str, provider: str = "ollama", fast_answer: bool = None) -> Iterator[Event]:
+        """Events of the question, like Pipeline.run. Stopping early cancels the question on the server."""
+        payload = {"question": question, "provider": provider}
+        if fast_answer is not None:
+            payload["fast_answer"] = fast_answer
+        connection, response = self._request("POST", "/ask", payload)
+        try:
+            if response.status == 503:
+                raise ServerBusy(json.loads(response.read())["error"], float(response.getheader("Retry-After", 0)))
+            if response.status != 200:
+                raise PipelineError(f"{response.status} {response.reason}: {response.read().decode(errors='replace')}")
+            for line in response:
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise PipelineError(event["message"])
+                yield event
+        finally:
+            connection.close()
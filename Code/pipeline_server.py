@@ -0,0 +1,189 @@
+import asyncio
+import atexit
+import json
+import time
+from contextlib import aclosing
+
+from dotenv import load_dotenv
+
+import config as cfg
+import functions as fn
+import scheduler
+import telemetry
+from local_ollama_management import ensure_ollama, preload_models, terminate_ollama_processes
+from pipeline import Event, Pipeline, build_pipeline
+from sql_execution import ResultStream
+
+log = telemetry.get_logger(__name__)
+
+# --- Pipeline Server --- #
+# One long-lived process holding the database, the vector collection and the LLM clients, so the
+# UI and scripts don't rebuild them for every session or Streamlit rerun. Plain HTTP on asyncio:
+#
+#   POST /ask     {"question": ..., "provider": "ollama" | "azure", "fast_answer": bool (optional)}
+#                 streams the pipeline events as JSON lines (application/x-ndjson)
+#   GET /health   slots in use, questions waiting and the LLM generations of the scheduler
+#   GET /metrics  telemetry.metrics.snapshot()
+#
+# At most cfg.PIPELINE_SERVER_CONCURRENCY questions are answered at a time, up to
+# cfg.PIPELINE_SERVER_QUEUE_SIZE more wait for a slot and the rest are refused with 503.
+# The result event carries its columns and rows instead of the ResultStream, the done event its
+# state without the stream, and a failing question ends with an error (message) event.
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class PipelineServer:
+    """Serves the questions of many clients with one warm pipeline."""
+
+    def __init__(self, pipeline: Pipeline, concurrency: int = cfg.PIPELINE_SERVER_CONCURRENCY,
+                 queue_size: int = cfg.PIPELINE_SERVER_QUEUE_SIZE):
+        self.pipeline = pipeline
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def health(self) -> dict:
+        return {"status": "ok", "active": self.active, "waiting": self.waiting,
+                "concurrency": self.concurrency, "queue_size": self.queue_size, "llm": scheduler.gate.snapshot()}
+
+    async def start(self, host: str = cfg.PIPELINE_SERVER_HOST, port: int = cfg.PIPELINE_SERVER_PORT) -> asyncio.Server:
+        server = await asyncio.start_server(self._handle, host, port)
+        log.info("Pipeline server listening on %s", ", ".join(str(s.getsockname()) for s in server.sockets))
+        return server
+
+    # HTTP
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, body = await _read_request(reader)
+            if path == "/health" and method == "GET":
+                await _respond(writer, 200, self.health())
+            elif path == "/metrics" and method == "GET":
+                await _respond(writer, 200, telemetry.metrics.snapshot())
+            elif path == "/ask":
+                if method != "POST":
+                    await _respond(writer, 405, {"error": "use POST"})
+                else:
+                    await self._ask(writer, body)
+            else:
+                await _respond(writer, 404, {"error": f"no route {path}"})
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await _respond(writer, 400, {"error": f"bad request: {e}"})
+        except ConnectionError:
+            log.info("Client disconnected")
+        finally:
+            writer.close()
+
+    async def _ask(self, writer: asyncio.StreamWriter, body: bytes) -> None:
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict) or not isinstance(request.get("question"), str):
+            raise ValueError('expected {"question": ...}')
+
+        if self._slots.locked() and self.waiting >= self.queue_size:
+            telemetry.metrics.increment("server.rejected")
+            await _respond(writer, 503, {"error": "too many questions, retry later"},
+                           {"Retry-After": str(cfg.PIPELINE_SERVER_RETRY_AFTER)})
+            return
+        telemetry.metrics.increment("server.requests")
+
+        await _write_head(writer, 200, "application/x-ndjson")
+        if self._slots.locked():
+            await _write_event(writer, {"type": "status", "message": f"Waiting for a free slot ({self.waiting} questions ahead)..."})
+
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        telemetry.metrics.observe("server.queue_seconds", time.perf_counter() - queued)
+
+        self.active += 1
+        try:
+            events = self.pipeline.answer_question(request["question"], request.get("provider", "ollama"), request.get("fast_answer"))
+            # Closing the events cancels the pipeline when the client goes away
+            async with aclosing(events):
+                async for event in events:
+                    await _write_event(writer, await _serializable(event))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            log.exception("Question failed")
+            telemetry.metrics.increment("server.errors")
+            await _write_event(writer, {"type": "error", "message": str(e)})
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Method, path and body of an HTTP/1.1 request."""
+    method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path.split("?", 1)[0], body
+
+
+async def _write_head(writer: asyncio.StreamWriter, status: int, content_type: str, headers: dict = None) -> None:
+    # No Content-Length: the body ends when the connection is closed
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: dict, headers: dict = None) -> None:
+    await _write_head(writer, status, "application/json", headers)
+    writer.write(json.dumps(payload, default=str).encode())
+    await writer.drain()
+
+
+async def _write_event(writer: asyncio.StreamWriter, event: Event) -> None:
+    writer.write(json.dumps(event, default=str).encode() + b"\n")
+    # Waits for slow clients instead of buffering their events
+    await writer.drain()
+
+
+async def _serializable(event: Event) -> Event:
+    """The event without its ResultStream, read into rows (the pipeline waits until it is sent)."""
+    if event["type"] == "result":
+        results: ResultStream = event["results"]
+        rows = await asyncio.to_thread(list, results)
+        return {"type": "result", "columns": results.columns, "rows": rows, "total_count": event["total_count"],
+                "preview": event["preview"], "truncated": results.truncated or results.cancelled}
+    if event["type"] == "done":
+        return {"type": "done", "state": {key: value for key, value in event["state"].items() if key != "results"}}
+    return event
+
+
+async def serve(pipeline: Pipeline = None, host: str = cfg.PIPELINE_SERVER_HOST, port: int = cfg.PIPELINE_SERVER_PORT) -> None:
+    """Load the pipeline once and answer questions until cancelled."""
+    pipeline = pipeline or build_pipeline()
+    # Open the vector collection and load the models before the first question
+    await asyncio.to_thread(fn.get_vector_collection)
+    if pipeline.base_url and cfg.OLLAMA_PRELOAD_MODELS:
+        report = await asyncio.to_thread(preload_models, pipeline.base_url, cfg.OLLAMA_KEEP_ALIVE,
+                                         [pipeline.sql_llm.model, pipeline.answer_llm.model])
+        log.info("Models preloaded: %s", report)
+    server = await PipelineServer(pipeline).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    telemetry.enable_logging(cfg.LOG_LEVEL or "INFO")
+    atexit.register(fn.close_vector_collections)
+    if cfg.RUN_LOCALLY:
+        atexit.register(terminate_ollama_processes)
+    ensure_ollama()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,179 @@
+import math
+import threading
+from functools import lru_cache
+
+import config as cfg
+import telemetry
+from column_index import parse_table, prune_table
+
+try:
+    import tiktoken  # exact counts for OpenAI models when installed
+except ImportError:
+    tiktoken = None
+
+# --- Prompt Token Budget --- #
+# Every prompt gets the token budget of its model. The retrieved table documents arrive ranked
+# (best first); when they do not fit, sample rows are dropped first, then long column lists are
+# shortened, then the lowest-ranked tables are left out. Section sizes are logged on a span.
+
+TABLE_SEPARATOR = "\n---\n"
+
+log = telemetry.get_logger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None or not model:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return None
+
+
+class TokenEstimator:
+    """Token counts from tiktoken for OpenAI models, a characters-per-token estimate otherwise.
+
+    The estimate starts at cfg.PROMPT_CHARS_PER_TOKEN and follows the prompt token counts the
+    models report back (moving average per model).
+    """
+
+    # Ollama reports fewer prompt tokens when it reuses a cached prefix, ignore implausible ratios
+    MIN_RATIO = 1.5
+    MAX_RATIO = 8.0
+
+    def __init__(self, chars_per_token: float = cfg.PROMPT_CHARS_PER_TOKEN, weight: float = cfg.PROMPT_CALIBRATION_WEIGHT):
+        self.chars_per_token = chars_per_token
+        self.weight = weight
+        self._ratios: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def ratio(self, model: str = None) -> float:
+        return self._ratios.get(model, self.chars_per_token)
+
+    def count(self, text: str, model: str = None) -> int:
+        encoding = _encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text))
+        return math.ceil(len(text) / self.ratio(model))
+
+    def calibrate(self, model: str, chars: int, tokens: int) -> None:
+        """Move the ratio of model toward chars / tokens, a prompt size the model reported."""
+        if not model or not chars or not tokens:
+            return
+        observed = chars / tokens
+        if not self.MIN_RATIO <= observed <= self.MAX_RATIO:
+            return
+        with self._lock:
+            current = self._ratios.get(model)
+            self._ratios[model] = observed if current is None else current + self.weight * (observed - current)
+
+
+estimator = TokenEstimator()
+
+
+def token_budget(model: str = None) -> int:
+    """Prompt tokens allowed for model."""
+    return cfg.PROMPT_TOKEN_BUDGETS.get(model, cfg.PROMPT_TOKEN_BUDGET_DEFAULT)
+
+
+# Trimming steps
+
+def drop_samples(doc: str) -> str:
+    """The table document without its sample rows."""
+    parsed = parse_table(doc)
+    if parsed is None or not parsed["samples"]:
+        return doc
+    start = doc.rindex("/*", 0, len(doc) - len(parsed["suffix"]))
+    return doc[:start].rstrip() + parsed["suffix"]
+
+
+def shorten_columns(doc: str, max_columns: int = cfg.PROMPT_MAX_COLUMNS) -> str:
+    """The first max_columns columns of a table document, keys and constraints kept."""
+    parsed = parse_table(doc)
+    if parsed is None:
+        return doc
+    columns = [name for name, _ in parsed["columns"] if name not in parsed["keys"]]
+    if len(columns) <= max_columns:
+        return doc
+    return prune_table(doc, set(columns[:max_columns])) + f"\n-- {len(columns) - max_columns} more columns not shown"
+
+
+def fit_tables(docs: list[str], max_tokens: int, model: str = None) -> tuple[list[str], dict]:
+    """Trim ranked table documents to max_tokens, lowest-ranked tables first at every step."""
+    docs = list(docs)
+    report = {"samples_dropped": 0, "columns_shortened": 0, "tables_dropped": 0}
+
+    def total() -> int:
+        return estimator.count(TABLE_SEPARATOR.join(docs), model)
+
+    for step, trim in (("samples_dropped", drop_samples), ("columns_shortened", shorten_columns)):
+        for i in reversed(range(len(docs))):
+            if total() <= max_tokens:
+                return docs, report
+            trimmed = trim(docs[i])
+            if trimmed != docs[i]:
+                docs[i] = trimmed
+                report[step] += 1
+    # The best table always stays, even alone over the budget
+    while len(docs) > 1 and total() > max_tokens:
+        docs.pop()
+        report["tables_dropped"] += 1
+    return docs, report
+
+
+def fit_text(text: str, max_tokens: int, model: str = None) -> str:
+    """text cut to max_tokens, at a line break when there is one."""
+    if estimator.count(text, model) <= max_tokens:
+        return text
+    marker = "\n... (truncated)"
+    cut = text[:max(0, int((max_tokens - estimator.count(marker, model)) * estimator.ratio(model)))]
+    if "\n" in cut:
+        cut = cut[:cut.rindex("\n")]
+    return cut + marker
+
+
+def _log_sections(kind: str, model: str, budget: int, tokens: dict[str, int], report: dict) -> None:
+    total = sum(tokens.values())
+    attributes = {f"{name}_tokens": count for name, count in tokens.items()}
+    with telemetry.span("build_prompt", kind=kind, model=model, budget=budget, total_tokens=total, **attributes, **report):
+        log.info("%s prompt for %s: %d/%d tokens (%s)", kind, model, total, budget,
+                 ", ".join(f"{name} {count}" for name, count in tokens.items()))
+
+
+# Prompts
+
+def sql_context(question: str, context_tables: str, model: str = None) -> str:
+    """The tables_info of the SQL generation prompt, trimmed to the budget of model."""
+    budget = token_budget(model)
+    tokens = {"system": estimator.count(cfg.SQL_GEN_SYSTEM_MESSAGE, model), "question": estimator.count(question, model)}
+    docs, report = fit_tables(context_tables.split(TABLE_SEPARATOR) if context_tables else [], budget - sum(tokens.values()), model)
+    tables_info = TABLE_SEPARATOR.join(docs)
+    tokens["tables"] = estimator.count(tables_info, model)
+    _log_sections("sql", model, budget, tokens, report)
+    return tables_info
+
+
+def answer_context(state: dict, model: str = None) -> dict:
+    """state with its result and tables_info trimmed to the answer prompt budget of model.
+
+    The result gets up to cfg.PROMPT_RESULT_SHARE of the room left by the instructions, question
+    and query; the tables get the rest.
+    """
+    budget = token_budget(model)
+    tokens = {
+        "system": estimator.count(cfg.ANSWER_GEN_SYSTEM_MESSAGE, model),
+        "question": 2 * estimator.count(state["question"], model),  # the template repeats it
+        "query": estimator.count(state["query"] or "", model),
+    }
+    available = max(0, budget - sum(tokens.values()))
+
+    result = fit_text(str(state["result"]), int(available * cfg.PROMPT_RESULT_SHARE), model)
+    tokens["result"] = estimator.count(result, model)
+    tables = state["tables_info"].split(TABLE_SEPARATOR) if state["tables_info"] else []
+    docs, report = fit_tables(tables, available - tokens["result"], model)
+    tables_info = TABLE_SEPARATOR.join(docs)
+    tokens["tables"] = estimator.count(tables_info, model)
+
+    _log_sections("answer", model, budget, tokens, report)
+    return {**state, "result": result, "tables_info": tables_info}
@@ -0,0 +1,155 @@
+import math
+import re
+
+import config as cfg
+from prompt_builder import estimator
+
+# --- Result Serialization --- #
+# Query results rendered for the answer model: a markdown table with the header written once,
+# rounded floats and shortened strings. Results too large for the token budget are sampled
+# (leading rows first, then rows spread over the rest) and described by per-column statistics.
+
+
+def format_value(value, max_chars: int = cfg.RESULT_MAX_STRING_CHARS) -> str:
+    """Compact cell text: NULL, rounded floats, shortened single-line strings."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, float):
+        if math.isfinite(value) and abs(value) < 1:
+            return f"{value:.{cfg.RESULT_FLOAT_DIGITS}g}"
+        return str(round(value, cfg.RESULT_FLOAT_DIGITS))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(bytes(value))} bytes>"
+    text = " ".join(str(value).split()).replace("|", "/")
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def render_table(columns: list[str], rows: list[tuple]) -> str:
+    """Markdown table, one line per row."""
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    lines += ["| " + " | ".join(format_value(value) for value in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def sample_indexes(total: int, size: int) -> list[int]:
+    """size row positions out of total: the first half leading rows (ORDER BY, top N), the rest evenly spread."""
+    if size >= total:
+        return list(range(total))
+    if size <= 0:
+        return []
+    lead = math.ceil(size / 2)
+    spread = size - lead
+    if spread == 0:
+        return list(range(lead))
+    step = (total - 1 - lead) / spread
+    return list(range(lead)) + [round(lead + step * (i + 1)) for i in range(spread)]
+
+
+def column_stats(columns: list[str], rows: list[tuple]) -> list[tuple]:
+    """(min, max, distinct) of every column, NULLs left out as in SQL."""
+    stats = []
+    for i in range(len(columns)):
+        values = [row[i] for row in rows if row[i] is not None]
+        try:
+            low, high = (min(values), max(values)) if values else (None, None)
+        except TypeError:  # mixed types
+            low, high = None, None
+        try:
+            distinct = len(set(values))
+        except TypeError:  # unhashable values
+            distinct = None
+        stats.append((low, high, distinct))
+    return stats
+
+
+def render_stats(columns: list[str], stats: list[tuple], scope: str) -> str:
+    lines = [f"Column summary ({scope}):"]
+    for column, (low, high, distinct) in zip(columns, stats):
+        parts = []
+        if low is not None:
+            parts.append(f"min {format_value(low)}, max {format_value(high)}" if low != high else f"always {format_value(low)}")
+        if distinct is not None:
+            parts.append(f"{distinct} distinct")
+        lines.append(f"- {column}: {', '.join(parts) or 'all NULL'}")
+    return "\n".join(lines)
+
+
+def serialize(columns: list[str], rows: list[tuple], complete: bool = True, stats: list[tuple] = None, stats_scope: str = None,
+              max_rows: int = cfg.MAX_RESULTS_LLM, max_tokens: int = cfg.RESULT_TOKEN_BUDGET, model: str = None) -> str:
+    """Result text for the answer prompt.
+
+    rows are all the rows of the result when complete, else a leading window of them. Small
+    results are rendered whole; larger ones as the biggest sample that fits max_tokens (at most
+    max_rows rows) followed by the column statistics (computed from rows when stats is None).
+    """
+    if not columns:
+        return "Empty"
+    if complete and len(rows) <= max_rows:
+        table = render_table(columns, rows)
+        if estimator.count(table, model) <= max_tokens:
+            return table
+
+    if stats is None:
+        stats, stats_scope = column_stats(columns, rows), (f"all {len(rows)} rows" if complete else f"first {len(rows)} rows")
+    summary = render_stats(columns, stats, stats_scope)
+
+    def render(size: int) -> str:
+        sampled = [rows[i] for i in sample_indexes(len(rows), size)]
+        header = f"Sample of {len(sampled)} rows (leading rows, then evenly spaced){'' if complete else ' from the first ' + str(len(rows))}:"
+        return f"{header}\n{render_table(columns, sampled)}\n\n{summary}"
+
+    # Largest sample under the budget (binary search, at least one row)
+    low, high = 1, min(max_rows, len(rows))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimator.count(render(middle), model) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return render(low)
+
+
+# Templated answers
+
+AGGREGATES = {"count": "Count", "sum": "Sum", "avg": "Average", "min": "Minimum", "max": "Maximum", "total": "Total"}
+_AGGREGATE_RE = re.compile(r"(\w+)\(\s*(distinct\s+)?(\*|[A-Za-z_][\w.]*)\s*\)", re.IGNORECASE)
+_NAME_RE = re.compile(r"(?:\w+\.)?([A-Za-z][A-Za-z0-9_ ]+)")
+
+
+def _label(column: str) -> str | None:
+    """Readable label of a result column, None when it doesn't read as one (the answer model names it).
+
+    total_actors -> Total actors, COUNT(*) -> Count, SUM(amount) -> Sum of amount,
+    COUNT(DISTINCT p.customer_id) -> Count of distinct customer id; n or ROUND(AVG(x), 2) -> None
+    """
+    column = column.strip()
+    aggregate = _AGGREGATE_RE.fullmatch(column)
+    if aggregate and aggregate.group(1).lower() in AGGREGATES:
+        function, distinct, argument = aggregate.groups()
+        label = AGGREGATES[function.lower()]
+        if argument != "*":
+            label += f" of {'distinct ' if distinct else ''}{argument.rsplit('.', 1)[-1].replace('_', ' ')}"
+        return label
+    name = _NAME_RE.fullmatch(column)
+    # One or two letter aliases (n, c, ct) say nothing about the value
+    if name is None or len(name.group(1).replace("_", "").replace(" ", "")) <= 2:
+        return None
+    words = " ".join(name.group(1).replace("_", " ").split())
+    return words[:1].upper() + words[1:]
+
+
+def template_answer(columns: list[str], rows: list[tuple], total_count: int,
+                    max_rows: int = cfg.FAST_ANSWER_MAX_ROWS, max_columns: int = cfg.FAST_ANSWER_MAX_COLUMNS) -> str | None:
+    """Deterministic answer for a scalar, single-row or small result, None when the result needs the answer model."""
+    if not columns or not rows or total_count != len(rows) or len(rows) > max_rows or len(columns) > max_columns:
+        return None
+    labels = [_label(column) for column in columns]
+    if None in labels:
+        return None
+    if len(rows) == 1 and len(columns) == 1:
+        return f"**{labels[0]}:** {format_value(rows[0][0])}"
+    if len(rows) == 1:
+        return "\n".join(f"- **{label}:** {format_value(value)}" for label, value in zip(labels, rows[0]))
+    return f"The query returned {len(rows)} rows:\n\n{render_table(columns, rows)}"
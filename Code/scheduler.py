@@ -0,0 +1,194 @@
+import asyncio
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import config as cfg
+import telemetry
+from embedding_cache import EmbedFunction
+
+log = telemetry.get_logger(__name__)
+
+# --- Scheduler --- #
+# Shares the single Ollama instance between concurrent questions. EmbeddingBatcher merges the
+# question embeddings of concurrent requests into one embed call, LLMGate admits generations
+# under a per-model limit and keeps one model (cfg.LLM_MAX_ACTIVE_MODELS) generating at a time,
+# so Ollama doesn't swap the SQL and answer models for every request.
+#
+# Metrics: scheduler.embed.batch_size, scheduler.embed.queue_depth, scheduler.embed.wait_seconds,
+# scheduler.llm.queue_depth, scheduler.llm.wait_seconds and the scheduler.llm.switches counter.
+
+
+class EmbeddingBatcher:
+    """An embed function (texts -> embeddings) sending the texts of concurrent callers as one batch.
+
+    Callers block while a worker thread collects requests for `window` seconds after the first
+    one (or until `max_batch` texts) and sends the distinct texts in a single call. Requests
+    arriving during a call are sent together in the next one.
+    """
+
+    def __init__(self, embed_function: EmbedFunction, window: float = cfg.EMBED_BATCH_WINDOW_SECONDS,
+                 max_batch: int = cfg.EMBED_BATCH_MAX_SIZE, timeout: float = cfg.EMBED_BATCH_TIMEOUT_SECONDS):
+        self.embed_function = embed_function
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: queue.Queue[tuple[list[str], Future, float]] = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        self._start()
+        future = Future()
+        self._queue.put((list(input), future, time.perf_counter()))
+        return future.result(timeout=self.timeout)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.monotonic(), 0)) if self.window else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._send(batch)
+
+    def _send(self, batch: list[tuple[list[str], Future, float]]) -> None:
+        # Identical questions asked at the same time are embedded once
+        texts = list(dict.fromkeys(text for request in batch for text in request[0]))
+        telemetry.metrics.observe("scheduler.embed.batch_size", len(texts))
+        telemetry.metrics.observe("scheduler.embed.queue_depth", self._queue.qsize())
+        try:
+            with telemetry.span("embed_batch", texts=len(texts), requests=len(batch)):
+                vectors = list(self.embed_function(texts))
+            if len(vectors) != len(texts):
+                raise ValueError(f"{len(vectors)} embeddings returned for {len(texts)} texts")
+            embeddings = dict(zip(texts, ([float(value) for value in vector] for vector in vectors)))
+            results = [[embeddings[text] for text in request_texts] for request_texts, _, _ in batch]
+        except Exception as e:
+            # The worker keeps running, the callers of this batch get the error
+            log.warning("Embedding batch of %d texts failed: %s", len(texts), e)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        now = time.perf_counter()
+        for (_, future, queued), result in zip(batch, results):
+            telemetry.metrics.observe("scheduler.embed.wait_seconds", now - queued)
+            future.set_result(result)
+
+
+class _Ticket:
+    """A request waiting for a generation slot (compared by identity)."""
+
+    __slots__ = ("model",)
+
+    def __init__(self, model: str):
+        self.model = model
+
+
+class _GateState:
+    """Admission state of one event loop."""
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.in_flight: dict[str, int] = {}
+        self.waiting: deque[_Ticket] = deque()  # in arrival order
+        self.last_model = None
+        self.overtakes = 0  # requests admitted ahead of the oldest one
+
+
+class LLMGate:
+    """Admission of generations: at most `max_in_flight` per model and `max_models` models
+    generating at the same time, first come first served. A request for another model waits for
+    the running ones to finish, and the requests behind it wait too, except that up to
+    `max_overtakes` requests for a model already generating join its run first, so runs are
+    batched by model without starving the other one."""
+
+    def __init__(self, max_in_flight: dict[str, int] = None, default: int = cfg.LLM_MAX_IN_FLIGHT_DEFAULT,
+                 max_models: int = cfg.LLM_MAX_ACTIVE_MODELS, max_overtakes: int = cfg.LLM_MAX_OVERTAKES):
+        self.max_in_flight = cfg.LLM_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.default = default
+        self.max_models = max_models
+        self.max_overtakes = max_overtakes
+        # asyncio primitives belong to one loop, the pipeline and the tests may use several
+        self._states: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def limit(self, model: str) -> int:
+        return self.max_in_flight.get(model, self.default)
+
+    def _state(self) -> _GateState:
+        state = self._states.get(asyncio.get_running_loop())
+        if state is None:
+            state = self._states[asyncio.get_running_loop()] = _GateState()
+        return state
+
+    def _admissible(self, state: _GateState, ticket: _Ticket) -> bool:
+        running = state.in_flight.get(ticket.model, 0)
+        if running >= self.limit(ticket.model):
+            return False
+        if running == 0 and sum(1 for count in state.in_flight.values() if count) >= self.max_models:
+            return False
+        oldest = state.waiting[0]
+        if ticket is oldest:
+            return True
+        # Joins the run of its model ahead of the oldest request, waiting for another model
+        return running > 0 and oldest.model != ticket.model and state.overtakes < self.max_overtakes
+
+    def snapshot(self) -> dict:
+        """Generations in flight and waiting per model, on the running loop."""
+        state = self._state()
+        waiting: dict[str, int] = {}
+        for ticket in state.waiting:
+            waiting[ticket.model] = waiting.get(ticket.model, 0) + 1
+        return {"in_flight": {model: count for model, count in state.in_flight.items() if count}, "waiting": waiting}
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[None]:
+        """Hold a generation slot of model."""
+        state = self._state()
+        ticket = _Ticket(model)
+        queued = time.perf_counter()
+        async with state.condition:
+            state.waiting.append(ticket)
+            telemetry.metrics.observe("scheduler.llm.queue_depth", len(state.waiting) - 1)
+            try:
+                await state.condition.wait_for(lambda: self._admissible(state, ticket))
+            except BaseException:
+                state.waiting.remove(ticket)
+                state.condition.notify_all()
+                raise
+            state.overtakes = 0 if ticket is state.waiting[0] else state.overtakes + 1
+            state.waiting.remove(ticket)
+            # The requests behind may be admitted as well
+            state.condition.notify_all()
+            if state.last_model is not None and state.last_model != model:
+                telemetry.metrics.increment("scheduler.llm.switches")
+            state.last_model = model
+            state.in_flight[model] = state.in_flight.get(model, 0) + 1
+        telemetry.metrics.observe("scheduler.llm.wait_seconds", time.perf_counter() - queued)
+        try:
+            yield
+        finally:
+            async with state.condition:
+                state.in_flight[model] -= 1
+                state.condition.notify_all()
+
+
+# Shared by every pipeline of the process
+gate = LLMGate()
+
@@ -0,0 +1,121 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Callable
+
+import config as cfg
+from embedding_cache import normalize_text
+
+# --- Question to SQL Cache --- #
+
+
+def schema_fingerprint(docs: list[str]) -> str:
+    """Fingerprint of the db_extract output, changes whenever the schema (or its samples) change."""
+    return hashlib.sha256("\n\n\n".join(docs).encode("utf-8")).hexdigest()
+
+
+def cosine_distance(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1 - dot / norm if norm else 1.0
+
+
+class SQLCache:
+    """Persistent cache of generated SQL.
+
+    Keys combine the normalized question, the retrieved table ids, the dialect, the model
+    name and the schema fingerprint. Entries from another fingerprint are purged on open,
+    so a schema change invalidates the cache automatically.
+    In semantic mode a miss falls back to the closest cached question with the same
+    tables/dialect/model when its embedding is within max_distance.
+    """
+
+    def __init__(self, fingerprint: str, path: str = cfg.SQL_CACHE_PATH, semantic: bool = cfg.SQL_CACHE_SEMANTIC,
+                 max_distance: float = cfg.SQL_CACHE_SEMANTIC_DISTANCE, embed_function: Callable[[str], list[float]] = None):
+        self.fingerprint = fingerprint
+        self.semantic = semantic and embed_function is not None
+        self.max_distance = max_distance
+        self.embed_function = embed_function
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            "key TEXT PRIMARY KEY, scope TEXT, fingerprint TEXT, question TEXT, query TEXT, embedding BLOB)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sql_cache_scope ON sql_cache (scope)")
+        self._conn.execute("DELETE FROM sql_cache WHERE fingerprint != ?", (fingerprint,))
+        self._conn.commit()
+
+    def _scope(self, table_ids: list[str], dialect: str, model: str) -> str:
+        parts = [",".join(sorted(table_ids)), dialect, model, self.fingerprint]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def _key(self, question: str, scope: str) -> str:
+        return hashlib.sha256(f"{normalize_text(question)}\x00{scope}".encode("utf-8")).hexdigest()
+
+    def get(self, question: str, table_ids: list[str], dialect: str, model: str) -> str | None:
+        """Return the cached SQL for a question, or None on a miss."""
+        scope = self._scope(table_ids, dialect, model)
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT query FROM sql_cache WHERE key = ?", (self._key(question, scope),)).fetchone()
+            if row is not None:
+                self.hits += 1
+                return row[0]
+            rows = []
+            if self.semantic:
+                rows = self._conn.execute("SELECT query, embedding FROM sql_cache WHERE scope = ? AND embedding IS NOT NULL", (scope,)).fetchall()
+
+        if rows:
+            # Embedded outside the lock, concurrent lookups don't wait for each other's embedding
+            embedding = self.embed_function(question)
+            distance, query = min((cosine_distance(embedding, array("f", blob).tolist()), query) for query, blob in rows)
+            if distance <= self.max_distance:
+                with self._lock:
+                    self.semantic_hits += 1
+                return query
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, question: str, table_ids: list[str], dialect: str, model: str, query: str) -> None:
+        """Store the SQL generated for a question."""
+        scope = self._scope(table_ids, dialect, model)
+        embedding = array("f", self.embed_function(question)).tobytes() if self.semantic else None
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_cache (key, scope, fingerprint, question, query, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(question, scope), scope, self.fingerprint, question, query, embedding)
+            )
+            self._conn.commit()
+
+    def discard(self, question: str, table_ids: list[str], dialect: str, model: str) -> None:
+        """Remove a cached entry, e.g. when its SQL failed to execute."""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM sql_cache WHERE key = ?", (self._key(question, self._scope(table_ids, dialect, model)),))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """Close the connection, a closed cache misses and stores nothing (questions still holding it)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
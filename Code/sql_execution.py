@@ -0,0 +1,218 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterator
+
+import config as cfg
+from telemetry import metrics
+
+# --- Streaming Query Execution --- #
+
+
+def _count(metric: str) -> None:
+    """Count executed, cancelled (time budget) and truncated (row budget) queries."""
+    metrics.increment(f"sql.{metric}")
+
+
+def _strip_statement(query: str) -> str:
+    return query.strip().rstrip(";").strip()
+
+
+class QueryCancelled(Exception):
+    """Raised when a query runs past its time budget."""
+
+
+class QueryBudget:
+    """Time and row budget shared by everything executed for one query."""
+
+    def __init__(self, timeout: float = cfg.QUERY_TIMEOUT_SECONDS, max_rows: int = cfg.MAX_RESULTS_QUERY):
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.start = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def remaining(self) -> float:
+        return max(self.timeout - self.elapsed(), 0.0)
+
+    def expired(self) -> bool:
+        return self.elapsed() >= self.timeout
+
+
+def cancelled_result(budget: QueryBudget) -> dict:
+    """Structured result handed to the answer stage when a query was cancelled."""
+    return {
+        "status": "query cancelled",
+        "reason": f"the query took longer than {budget.timeout:g} seconds and was stopped",
+        "elapsed_seconds": round(budget.elapsed(), 2),
+    }
+
+
+def _arm(db, connection, budget: QueryBudget) -> Callable[[], None]:
+    """Enforce the budget deadline on a DB-API connection, returns the function that disarms it."""
+    driver = connection.driver_connection
+    dialect = db._engine.dialect.name
+
+    if isinstance(driver, sqlite3.Connection):
+        # SQLite calls the handler every N virtual machine steps, a non-zero return interrupts the query
+        driver.set_progress_handler(lambda: int(budget.expired()), cfg.SQLITE_PROGRESS_STEPS)
+        return lambda: driver.set_progress_handler(None, 0)
+
+    milliseconds = max(int(budget.remaining() * 1000), 1)
+    if dialect == "postgresql":
+        cursor = connection.cursor()
+        cursor.execute(f"SET statement_timeout = {milliseconds}")
+        return lambda: cursor.execute("RESET statement_timeout")
+    if dialect == "mysql":
+        cursor = connection.cursor()
+        cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {milliseconds}")
+        return lambda: cursor.execute("SET SESSION MAX_EXECUTION_TIME = 0")
+
+    # Other backends: interrupt the connection from a timer thread if the driver supports it
+    interrupt = getattr(driver, "cancel", None) or getattr(driver, "interrupt", None)
+    if interrupt is None:
+        return lambda: None
+    timer = threading.Timer(budget.remaining(), interrupt)
+    timer.daemon = True
+    timer.start()
+    return timer.cancel
+
+
+class ResultStream:
+    """Typed rows of a query read lazily from a DB-API cursor with fetchmany.
+
+    Column names are available in `columns` as soon as the query runs. The first `keep`
+    rows are buffered, so `head` still works after the stream was iterated (e.g. by the UI
+    building a DataFrame). The stream itself can only be iterated once.
+    Reading stops when the budget runs out: `cancelled` is set when the time budget was
+    exceeded, `truncated` when the row budget was reached.
+    """
+
+    def __init__(self, db, query: str, budget: QueryBudget = None, batch_size: int = cfg.FETCH_BATCH_SIZE, keep: int = cfg.MAX_RESULTS_LLM + 1):
+        self.query = query
+        self.budget = budget or QueryBudget()
+        self.batch_size = batch_size
+        self.keep = keep
+        self.cancelled = False
+        self.truncated = False
+        self._fetched = 0
+        self._connection = db._engine.raw_connection()
+        try:
+            self._disarm = _arm(db, self._connection, self.budget)
+            self._cursor = self._connection.cursor()
+            self._cursor.execute(_strip_statement(query))
+        except Exception as e:
+            self.close()
+            if self.budget.expired():
+                _count("cancelled")
+                raise QueryCancelled(str(e)) from e
+            raise
+        _count("executed")
+        description = self._cursor.description or []
+        self.columns = [column[0] for column in description]
+        self._head: list[tuple] = []
+        self._rows = self._fetch()
+        self._iterated = False
+
+    def _fetch(self) -> Iterator[tuple]:
+        try:
+            if not self.columns:
+                return
+            while True:
+                size = min(self.batch_size, self.budget.max_rows - self._fetched)
+                if size <= 0:
+                    self.truncated = True
+                    _count("truncated")
+                    return
+                try:
+                    batch = self._cursor.fetchmany(size)
+                except Exception:
+                    if not self.budget.expired():
+                        raise
+                    self.cancelled = True
+                    _count("cancelled")
+                    return
+                if not batch:
+                    return
+                self._fetched += len(batch)
+                yield from (tuple(row) for row in batch)
+        finally:
+            self.close()
+
+    def head(self, n: int) -> list[tuple]:
+        """First n rows (n <= keep once the stream was iterated), without consuming the stream."""
+        while not self._iterated and len(self._head) < n:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._head.append(row)
+        return self._head[:n]
+
+    def __iter__(self) -> Iterator[tuple]:
+        if self._iterated:
+            raise RuntimeError("ResultStream can only be iterated once")
+        self._iterated = True
+        yield from self._head
+        for row in self._rows:
+            if len(self._head) < self.keep:
+                self._head.append(row)
+            yield row
+
+    def records(self) -> Iterator[dict]:
+        """Iterate rows as {column: value} dicts."""
+        for row in self:
+            yield dict(zip(self.columns, row))
+
+    def close(self) -> None:
+        """Release the cursor and return the connection to the pool."""
+        if self._connection is not None:
+            if hasattr(self, "_disarm"):
+                self._disarm()
+            if hasattr(self, "_cursor"):
+                self._cursor.close()
+            self._connection.close()
+            self._connection = None
+
+
+def execute_stream(db, query: str, budget: QueryBudget = None) -> ResultStream:
+    """Run a query and return its rows as a stream."""
+    return ResultStream(db, query, budget=budget)
+
+
+def _fetch_one(db, statement: str, budget: QueryBudget) -> tuple:
+    """Run a one-row statement under the budget."""
+    connection = db._engine.raw_connection()
+    disarm = lambda: None
+    try:
+        disarm = _arm(db, connection, budget)
+        cursor = connection.cursor()
+        cursor.execute(statement)
+        return tuple(cursor.fetchone())
+    except Exception as e:
+        if budget.expired():
+            _count("cancelled")
+            raise QueryCancelled(str(e)) from e
+        raise
+    finally:
+        disarm()
+        connection.close()
+
+
+def count_rows(db, query: str, budget: QueryBudget = None) -> int:
+    """Count the rows of a query in the database, without fetching them."""
+    return _fetch_one(db, f"SELECT COUNT(*) FROM ({_strip_statement(query)}) AS counted_rows", budget or QueryBudget())[0]
+
+
+def summarize_columns(db, query: str, columns: list[str], budget: QueryBudget = None) -> list[tuple]:
+    """(min, max, distinct) of every column of a query, computed in the database."""
+    quote = db._engine.dialect.identifier_preparer.quote
+    aggregates = ", ".join(f"MIN({name}), MAX({name}), COUNT(DISTINCT {name})" for name in map(quote, columns))
+    row = _fetch_one(db, f"SELECT {aggregates} FROM ({_strip_statement(query)}) AS summarized_rows", budget or QueryBudget())
+    return [row[i:i + 3] for i in range(0, len(row), 3)]
+
+
+def explain(db, query: str, budget: QueryBudget = None) -> None:
+    """Plan a query without running it, raises when the database rejects it."""
+    keyword = "EXPLAIN QUERY PLAN" if db._engine.dialect.name == "sqlite" else "EXPLAIN"
+    _fetch_one(db, f"{keyword} {_strip_statement(query)}", budget or QueryBudget())
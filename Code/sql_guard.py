@@ -0,0 +1,290 @@
+import re
+from typing import NamedTuple, TypedDict
+
+import config as cfg
+
+# --- SQL Guard --- #
+# Cheap checks of generated SQL before it reaches the database: read-only single statement,
+# known tables and columns, and a LIMIT no larger than cfg.MAX_RESULTS_QUERY.
+
+
+class SQLGuardError(ValueError):
+    """Raised when a generated query is rejected before execution."""
+
+
+class GuardedQuery(TypedDict):
+    query: str  # query to execute, with LIMIT injected or tightened
+    count_query: str  # original query, used to count the full result set
+    tables: list[str]
+
+
+class Token(NamedTuple):
+    kind: str  # word, quoted, string, number, op
+    value: str
+    start: int
+    end: int
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op>\|\||<=|>=|<>|!=|==|<<|>>|[^\s])
+""", re.VERBOSE | re.DOTALL)
+
+READ_ONLY_STARTS = {"select", "with"}
+
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "drop", "alter", "create", "replace", "attach", "detach",
+    "pragma", "vacuum", "reindex", "truncate", "grant", "revoke", "merge", "upsert", "analyze",
+}
+
+KEYWORDS = {
+    "select", "distinct", "all", "from", "where", "group", "by", "having", "order", "asc", "desc",
+    "limit", "offset", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on",
+    "using", "as", "and", "or", "not", "in", "is", "null", "like", "glob", "between", "exists",
+    "case", "when", "then", "else", "end", "union", "intersect", "except", "with", "recursive",
+    "true", "false", "escape", "collate", "nocase", "nulls", "first", "last", "filter", "over",
+    "partition", "rows", "range", "unbounded", "preceding", "following", "current", "row",
+    "current_date", "current_time", "current_timestamp", "cast", "integer", "int", "real", "text",
+    "numeric", "float", "varchar", "char", "date", "datetime", "timestamp", "decimal", "boolean",
+    "window", "materialized", "interval", "year", "month", "day", "ilike", "regexp", "match",
+}
+
+# Words after which a table name is expected
+TABLE_INTRODUCERS = {"from", "join"}
+
+
+def tokenize(query: str) -> list[Token]:
+    """Split SQL into tokens, dropping whitespace and comments."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        tokens.append(Token(kind, match.group(), match.start(), match.end()))
+    return tokens
+
+
+def _name(token: Token) -> str:
+    """Identifier name in lower case, without quotes."""
+    if token.kind == "quoted":
+        return token.value[1:-1].lower()
+    return token.value.lower()
+
+
+def _is_identifier(token: Token) -> bool:
+    return token.kind == "quoted" or (token.kind == "word" and token.value.lower() not in KEYWORDS)
+
+
+def schema_from_docs(docs: list[str]) -> dict[str, set[str]]:
+    """Table -> column names, parsed from the CREATE TABLE statements returned by db_extract."""
+    schema = {}
+    for doc in docs:
+        match = re.search(r'CREATE TABLE\s+(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|([^\s(]+))\s*\((.*?)\n\)', doc, re.DOTALL)
+        if not match:
+            continue
+        table = next(group for group in match.groups()[:4] if group).lower()
+        columns = set()
+        for line in match.group(5).split("\n"):
+            line = line.strip().rstrip(",").strip()
+            if not line or re.match(r"(PRIMARY|FOREIGN|UNIQUE|CHECK|CONSTRAINT)\b", line, re.IGNORECASE):
+                continue
+            column = re.match(r'"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|(\S+)', line)
+            columns.add(next(group for group in column.groups() if group).lower())
+        schema[table] = columns
+    return schema
+
+
+def _check_statement(tokens: list[Token]) -> None:
+    if not tokens:
+        raise SQLGuardError("Empty query")
+    for i, token in enumerate(tokens):
+        if token.value == ";" and i != len(tokens) - 1:
+            raise SQLGuardError("Only a single statement is allowed")
+    if tokens[0].kind != "word" or tokens[0].value.lower() not in READ_ONLY_STARTS:
+        raise SQLGuardError("Only read-only SELECT queries are allowed")
+    for i, token in enumerate(tokens):
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+        is_function = next_token is not None and next_token.value == "("
+        if token.kind == "word" and token.value.lower() in WRITE_KEYWORDS and not is_function:
+            raise SQLGuardError(f"Write statement '{token.value.upper()}' is not allowed")
+
+
+def _cte_names(tokens: list[Token]) -> tuple[set[str], set[str]]:
+    """Names of common table expressions and of their declared columns."""
+    names, columns = set(), set()
+    for i, token in enumerate(tokens[:-1]):
+        if not (token.value.lower() == "as" and tokens[i + 1].value == "("):
+            continue
+        j = i - 1
+        if j >= 0 and tokens[j].value == ")": # name(col1, col2) AS (...)
+            depth = 0
+            while j >= 0:
+                depth += tokens[j].value == ")"
+                depth -= tokens[j].value == "("
+                if depth == 0:
+                    break
+                if _is_identifier(tokens[j]):
+                    columns.add(_name(tokens[j]))
+                j -= 1
+            j -= 1
+        if j >= 0 and _is_identifier(tokens[j]):
+            names.add(_name(tokens[j]))
+    return names, columns
+
+
+def _table_references(tokens: list[Token], schema: dict[str, set[str]], ctes: set[str]) -> tuple[list[str], dict[str, str], set[str]]:
+    """Tables after FROM/JOIN, checked against the schema, subqueries in FROM/JOIN included.
+
+    Returns the referenced schema tables, alias -> table, and aliases of subqueries/CTEs.
+    """
+    tables, aliases, opaque = [], {}, set()
+    i = 0
+    while i < len(tokens):
+        if not (tokens[i].kind == "word" and tokens[i].value.lower() in TABLE_INTRODUCERS):
+            i += 1
+            continue
+        i += 1
+        while i < len(tokens):
+            token = tokens[i]
+            if token.value == "(": # derived table or parenthesized join, its own tables are registered too
+                start, depth = i + 1, 0
+                while i < len(tokens):
+                    depth += tokens[i].value == "("
+                    depth -= tokens[i].value == ")"
+                    i += 1
+                    if depth == 0:
+                        break
+                inner = tokens[start:i - 1]
+                if inner and inner[0].value.lower() not in READ_ONLY_STARTS: # (a JOIN b ...) lists tables as FROM does
+                    inner = [Token("word", "from", inner[0].start, inner[0].start)] + inner
+                inner_tables, inner_aliases, inner_opaque = _table_references(inner, schema, ctes)
+                tables += inner_tables
+                aliases.update(inner_aliases)
+                opaque |= inner_opaque
+                table = None
+            elif _is_identifier(token):
+                # schema.table -> table
+                while i + 2 < len(tokens) and tokens[i + 1].value == "." and _is_identifier(tokens[i + 2]):
+                    i += 2
+                table = _name(tokens[i])
+                i += 1
+                if i < len(tokens) and tokens[i].value == "(": # table-valued function
+                    continue
+                if table in ctes:
+                    opaque.add(table)
+                    table = None
+                elif table not in schema:
+                    raise SQLGuardError(f"Unknown table '{table}'")
+                else:
+                    tables.append(table)
+                    aliases[table] = table
+            else:
+                break
+
+            # Optional alias: [AS] name
+            if i < len(tokens) and tokens[i].value.lower() == "as":
+                i += 1
+            if i < len(tokens) and _is_identifier(tokens[i]):
+                alias = _name(tokens[i])
+                if table is None:
+                    opaque.add(alias)
+                else:
+                    aliases[alias] = table
+                i += 1
+
+            # FROM a, b
+            if i < len(tokens) and tokens[i].value == ",":
+                i += 1
+                continue
+            break
+    return tables, aliases, opaque
+
+
+def _check_columns(tokens: list[Token], schema: dict[str, set[str]], aliases: dict[str, str], opaque: set[str], ctes: set[str], cte_columns: set[str]) -> None:
+    referenced = {aliases[alias] for alias in aliases}
+    known_columns = set().union(*(schema[table] for table in referenced)) if referenced else set()
+
+    # Output aliases: AS name, or a bare name right after an expression
+    output_aliases = set(cte_columns)
+    for i, token in enumerate(tokens[1:], start=1):
+        previous = tokens[i - 1]
+        if not _is_identifier(token):
+            continue
+        if previous.value.lower() in ("as", "end") or previous.value == ")" \
+                or previous.kind in ("string", "number") or _is_identifier(previous):
+            output_aliases.add(_name(token))
+
+    for i, token in enumerate(tokens):
+        if not _is_identifier(token):
+            continue
+        previous = tokens[i - 1] if i > 0 else None
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+        if previous is not None and previous.value == ".":
+            continue # checked with its qualifier
+        if next_token is not None and next_token.value == "(":
+            continue # function call
+
+        if next_token is not None and next_token.value == "." and i + 2 < len(tokens):
+            qualifier, column = _name(token), tokens[i + 2]
+            if column.value == "*" or qualifier in opaque:
+                continue
+            if qualifier in aliases:
+                table = aliases[qualifier]
+                if _name(column) not in schema[table]:
+                    raise SQLGuardError(f"Unknown column '{column.value}' in table '{table}'")
+            elif qualifier not in schema and qualifier not in ctes:
+                raise SQLGuardError(f"Unknown table or alias '{token.value}'")
+            continue
+
+        name = _name(token)
+        if token.kind == "quoted" and token.value.startswith('"'):
+            continue # sqlite reads unknown "identifiers" as strings
+        if name in known_columns or name in aliases or name in opaque or name in ctes or name in output_aliases or name in schema:
+            continue
+        raise SQLGuardError(f"Unknown column '{token.value}'")
+
+
+def _limit(query: str, tokens: list[Token], max_rows: int) -> str:
+    """Inject LIMIT max_rows, or tighten the top-level LIMIT if it is larger."""
+    depth, limit_index = 0, None
+    for i, token in enumerate(tokens):
+        depth += token.value == "("
+        depth -= token.value == ")"
+        if depth == 0 and token.kind == "word" and token.value.lower() == "limit":
+            limit_index = i
+
+    body = query[:tokens[-1].start] if tokens[-1].value == ";" else query
+    body = body.rstrip()
+    if limit_index is None:
+        return f"{body}\nLIMIT {max_rows}"
+
+    rest = [t for t in tokens[limit_index + 1:] if t.value != ";"]
+    # LIMIT n | LIMIT n OFFSET m | LIMIT m, n
+    if len(rest) == 1 and rest[0].kind == "number":
+        count = rest[0]
+    elif len(rest) == 3 and rest[0].kind == "number" and rest[1].value.lower() == "offset" and rest[2].kind == "number":
+        count = rest[0]
+    elif len(rest) == 3 and rest[0].kind == "number" and rest[1].value == "," and rest[2].kind == "number":
+        count = rest[2]
+    else: # LIMIT with an expression, bound the whole query instead
+        return f"SELECT * FROM (\n{body}\n) AS limited_rows LIMIT {max_rows}"
+
+    if int(float(count.value)) <= max_rows:
+        return body
+    return f"{body[:count.start]}{max_rows}{body[count.end:]}"
+
+
+def check_query(query: str, schema: dict[str, set[str]], max_rows: int = cfg.MAX_RESULTS_QUERY) -> GuardedQuery:
+    """Validate a generated query and bound its result size, without touching the database."""
+    tokens = tokenize(query)
+    _check_statement(tokens)
+    ctes, cte_columns = _cte_names(tokens)
+    tables, aliases, opaque = _table_references(tokens, schema, ctes)
+    _check_columns(tokens, schema, aliases, opaque, ctes, cte_columns)
+    count_query = query.strip().rstrip(";").strip()
+    return {"query": _limit(query, tokens, max_rows), "count_query": count_query, "tables": list(dict.fromkeys(tables))}
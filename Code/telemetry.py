@@ -0,0 +1,191 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import config as cfg
+
+# --- Telemetry --- #
+# Timed spans around the pipeline stages, an in-process metrics registry and an optional
+# JSON lines export of every finished span.
+
+logger = logging.getLogger("rag_sql")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False  # Silent until enable_logging is called
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of a module, child of the silent "rag_sql" logger."""
+    return logger.getChild(name)
+
+
+def enable_logging(level: str | int = "INFO") -> None:
+    """Print the pipeline logs to stderr."""
+    if not any(type(handler) is logging.StreamHandler for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+if cfg.LOG_LEVEL:
+    enable_logging(cfg.LOG_LEVEL)
+
+
+# Metrics
+
+class MetricsRegistry:
+    """Thread-safe counters and value summaries (count, total, min, max) kept in process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._summaries: dict[str, dict] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "total": 0.0, "min": value, "max": value})
+            summary["count"] += 1
+            summary["total"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """Copy of the counters and summaries, with the mean of each summary."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {name: {**summary, "mean": summary["total"] / summary["count"]} for name, summary in self._summaries.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+metrics = MetricsRegistry()
+
+
+# Span export
+
+SpanExporter = Callable[[dict], None]
+_exporters: list[SpanExporter] = []
+
+
+class JSONLinesExporter:
+    """Append each finished span as one JSON line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __call__(self, record: dict) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+def add_exporter(exporter: SpanExporter) -> None:
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: SpanExporter) -> None:
+    _exporters.remove(exporter)
+
+
+if cfg.TRACE_PATH:
+    add_exporter(JSONLinesExporter(cfg.TRACE_PATH))
+
+
+# Spans
+
+class Span:
+    """One timed operation. Spans opened inside another one share its trace id."""
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": self.start, "duration": self.duration, "attributes": self.attributes,
+        }
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        metrics.observe(f"{self.name}.seconds", self.duration)
+        for key, value in self.attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics.observe(f"{self.name}.{key}", value)
+        if "error" in self.attributes:
+            metrics.increment(f"{self.name}.errors")
+
+        record = self.to_dict()
+        logger.debug("span %s", json.dumps(record, default=str))
+        for exporter in list(_exporters):
+            try:
+                exporter(record)
+            except Exception as e:
+                logger.warning("Span exporter failed: %s", e)
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time the enclosed block as a child of the current span."""
+    current = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set(error=repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def token_usage(response) -> dict:
+    """Prompt and completion token counts reported by a LangChain message or an OpenAI response."""
+    usage = getattr(response, "usage", None)  # OpenAI
+    if usage is not None:
+        return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    usage = getattr(response, "usage_metadata", None)  # LangChain
+    if usage:
+        return {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"]}
+    metadata = getattr(response, "response_metadata", None) or {}  # Ollama
+    if "prompt_eval_count" in metadata or "eval_count" in metadata:
+        return {"prompt_tokens": metadata.get("prompt_eval_count", 0), "completion_tokens": metadata.get("eval_count", 0)}
+    return {}
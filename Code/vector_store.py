@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+from typing import Protocol, Sequence
+
+import numpy as np
+
+# --- Vector Store Backends --- #
+# The pipeline talks to its vector collections through the small part of the
+# chromadb.Collection API below, so a Chroma collection and NumpyStore are interchangeable.
+
+
+class VectorStore(Protocol):
+    """Subset of chromadb.Collection used by the pipeline."""
+
+    def count(self) -> int: ...
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = None) -> dict: ...
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: dict = None, include: list[str] = None) -> dict: ...
+
+    def upsert(self, ids: list[str], embeddings: Sequence[Sequence[float]], documents: list[str] = None, metadatas: list[dict] = None) -> None: ...
+
+    def delete(self, ids: list[str]) -> None: ...
+
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """Chroma-style metadata filter: {"key": value}, {"key": {"$in": [...]}} or {"$and": [...]}."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$in" in condition and metadata.get(key) not in condition["$in"]:
+                return False
+            if "$eq" in condition and metadata.get(key) != condition["$eq"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyStore:
+    """Exact cosine search over normalized float32 embeddings in a memory-mapped .npy file.
+
+    Ids, documents and metadatas live in a JSON sidecar next to the matrix. Opening the store
+    maps the file without reading it, a query is one matrix-vector product plus a partial sort.
+    Writes rewrite both files atomically, which is fine for schemas of a few thousand tables.
+    """
+
+    MATRIX_FILE = "embeddings.npy"
+    SIDECAR_FILE = "sidecar.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        matrix_path = os.path.join(self.path, self.MATRIX_FILE)
+        sidecar_path = os.path.join(self.path, self.SIDECAR_FILE)
+        if os.path.exists(matrix_path) and os.path.exists(sidecar_path):
+            self._matrix = np.load(matrix_path, mmap_mode="r")
+            with open(sidecar_path, encoding="utf-8") as file:
+                sidecar = json.load(file)
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            sidecar = {"ids": [], "documents": [], "metadatas": []}
+        self._ids: list[str] = sidecar["ids"]
+        self._documents: list[str] = sidecar["documents"]
+        self._metadatas: list[dict] = sidecar["metadatas"]
+        self._positions = {id: i for i, id in enumerate(self._ids)}
+
+    def _save(self, matrix: np.ndarray) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        matrix_path = os.path.join(self.path, self.MATRIX_FILE)
+        sidecar_path = os.path.join(self.path, self.SIDECAR_FILE)
+        with open(matrix_path + ".tmp", "wb") as file:
+            np.save(file, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(sidecar_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, file)
+        self._matrix = None  # release the mapping before replacing the file
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(sidecar_path + ".tmp", sidecar_path)
+        self._load()
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _result(self, positions: list[int], include: list[str]) -> dict:
+        result = {"ids": [self._ids[i] for i in positions]}
+        if "documents" in include:
+            result["documents"] = [self._documents[i] for i in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[i] for i in positions]
+        if "embeddings" in include:
+            result["embeddings"] = [np.array(self._matrix[i]) for i in positions]
+        return result
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = None) -> dict:
+        include = include if include is not None else ["documents", "metadatas"]
+        positions = [self._positions[id] for id in ids if id in self._positions] if ids is not None else range(len(self._ids))
+        if where:
+            positions = [i for i in positions if _matches(self._metadatas[i], where)]
+        return self._result(list(positions), include)
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10, where: dict = None, include: list[str] = None) -> dict:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "distances") if key in include]
+        results = {key: [] for key in keys}
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+
+        candidates = None
+        if where:
+            candidates = np.array([i for i, metadata in enumerate(self._metadatas) if _matches(metadata, where)], dtype=np.int64)
+        for query in queries:
+            if candidates is None:
+                similarities = self._matrix @ query if self.count() else np.zeros(0, dtype=np.float32)
+                positions = np.arange(len(similarities))
+            else:
+                similarities = self._matrix[candidates] @ query if len(candidates) else np.zeros(0, dtype=np.float32)
+                positions = candidates
+            k = min(n_results, len(similarities))
+            if k == 0:
+                best = np.zeros(0, dtype=np.int64)
+            else:
+                best = np.argpartition(-similarities, k - 1)[:k]
+                best = best[np.argsort(-similarities[best])]
+            found = self._result([int(positions[i]) for i in best], include)
+            if "distances" in include:
+                found["distances"] = [float(1.0 - similarities[i]) for i in best]  # cosine distance, as Chroma
+            for key in keys:
+                results[key].append(found[key])
+        return results
+
+    def upsert(self, ids: list[str], embeddings: Sequence[Sequence[float]], documents: list[str] = None, metadatas: list[dict] = None) -> None:
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        documents = documents if documents is not None else [""] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{}] * len(ids)
+        with self._lock:
+            matrix = np.array(self._matrix) if self.count() else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            new_rows = []
+            for id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                if id in self._positions:
+                    position = self._positions[id]
+                    matrix[position] = vector
+                    self._documents[position] = document
+                    self._metadatas[position] = metadata
+                else:
+                    self._positions[id] = len(self._ids)
+                    self._ids.append(id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                    new_rows.append(vector)
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self._save(matrix)
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            removed = {self._positions[id] for id in ids if id in self._positions}
+            if not removed:
+                return
+            keep = [i for i in range(len(self._ids)) if i not in removed]
+            matrix = np.array(self._matrix[keep]) if keep else np.zeros((0, self._matrix.shape[1]), dtype=np.float32)
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._save(matrix)
@@ -10,13 +10,21 @@ from langchain_community.utilities import SQLDatabase
 
 if __name__ == "__main__":
     db = SQLDatabase.from_uri(f"sqlite:///{DB_PATH}")
+    atexit.register(fn.close_vector_collections)
     if RUN_LOCALLY:
         atexit.register(terminate_ollama_processes)
         if not is_ollama_running():
             start_ollama()
 
     docs = fn.db_extract(db)
-    if fn.add_to_vector_collection(docs):
-        print("✅ Document successfully added!")
+    report = fn.add_to_vector_collection(docs)
+    graph = fn.build_join_graph(db)
+    fn.build_lexical_index(docs)
+    print(f"Join graph: {len(graph.edges)} foreign keys between {len(graph.tables)} tables")
+    for action in ("added", "updated", "deleted", "failed"):
+        if report[action]:
+            print(f"{action.capitalize()}: {', '.join(report[action])}")
+    if report["failed"]:
+        print("❌ Some tables could not be embedded, run again to retry them.")
     else:
-        print("❌ Document processing failed.")
+        print(f"✅ Index up to date ({len(report['skipped'])} unchanged tables skipped)")
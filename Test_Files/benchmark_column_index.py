@@ -0,0 +1,59 @@
+import atexit
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+
+from langchain_community.utilities import SQLDatabase
+from local_ollama_management import start_ollama, is_ollama_running, terminate_ollama_processes
+import functions as fn
+import config as cfg
+
+# --- Benchmark: prompt size with whole tables vs retrieved columns only --- #
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "../DB/Documentation/bechmark questions.txt")
+PRUNE_MIN_COLUMNS = 0 # prune every table, sakila has no really wide table
+
+
+def run(columns: bool, questions: list[str]) -> dict:
+    """Size of the tables info put in the SQL prompt (~4 characters per token) and retrieval latency."""
+    cfg.COLUMN_INDEX_ENABLED = columns
+    tokens, timings = [], []
+    for question in questions:
+        start = time.perf_counter()
+        tables = fn.query_collection(question) or {"documents": []}
+        timings.append((time.perf_counter() - start) * 1000)
+        tokens.append(len("\n---\n".join(tables["documents"])) / 4)
+    return {"tokens": tokens, "timings": timings}
+
+
+def report(label: str, result: dict) -> None:
+    print(f"{label}: {statistics.mean(result['tokens']):.0f} prompt tokens for the tables, "
+          f"retrieval {statistics.mean(result['timings']):.1f} ms")
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    if cfg.RUN_LOCALLY:
+        atexit.register(terminate_ollama_processes)
+        if not is_ollama_running():
+            start_ollama()
+    atexit.register(fn.close_vector_collections)
+
+    db = SQLDatabase.from_uri(f"sqlite:///{cfg.DB_PATH}")
+    fn.add_to_column_collection(fn.db_extract(db))
+    cfg.COLUMN_PRUNE_MIN_COLUMNS = PRUNE_MIN_COLUMNS
+
+    with open(QUESTIONS_PATH, encoding="utf-8") as file:
+        questions = [line.strip() for line in file if line.strip()]
+
+    tables = run(columns=False, questions=questions)
+    columns = run(columns=True, questions=questions)
+
+    report("Whole tables     ", tables)
+    report("Retrieved columns", columns)
+    print(f"Prompt reduction: {1 - statistics.mean(columns['tokens']) / statistics.mean(tables['tokens']):.0%}")
@@ -0,0 +1,90 @@
+import atexit
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+
+from local_ollama_management import start_ollama, is_ollama_running, terminate_ollama_processes
+import functions as fn
+import config as cfg
+
+# --- Benchmark: vector-only vs hybrid (lexical + vector) table retrieval --- #
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "../DB/Documentation/bechmark questions.txt")
+
+# Tables needed to answer each benchmark question on sakila
+EXPECTED_TABLES = {
+    "How many actors are there in the database?": {"actor"},
+    "What is the name of the actor with ID 1?": {"actor"},
+    "List all movies released in 2006.": {"film"},
+    "What is the average rental rate for movies?": {"film"},
+    "How many customers are there in the database?": {"customer"},
+    "Who are the top 5 actors with the most movies?": {"actor", "film_actor"},
+    "How the table 'actor' is related to the table 'film'?": {"actor", "film_actor", "film"},
+    "Qual a relação entre a tabela customer e a tabela rental?": {"customer", "rental"},
+    "List all customers.": {"customer"},
+    "What are the top 5 films by rental rate?": {"film"},
+    "Which store is Mike responsible for?": {"store", "staff"},
+    "List all films in the 'Action' category.": {"film", "film_category", "category"},
+    "What is the total revenue generated by rentals?": {"payment"},
+    "Show the rental history of customer MARGARET MOORE": {"customer", "rental"},
+    "Which films are currently available for rent?": {"film", "inventory", "rental"},
+    "List all cities where the stores are located.": {"store", "address", "city"},
+}
+
+
+def embed_without_cache(prompt: str) -> list[float]:
+    # Both runs pay for the embedding call, whatever the other one cached
+    return fn.get_embedding_function()([prompt])[0]
+
+
+def run(hybrid: bool, questions: list[str]) -> dict:
+    """Time query_collection over the questions and measure the recall of the expected tables."""
+    cfg.LEXICAL_INDEX_ENABLED = hybrid
+    fn.get_lexical_index.cache_clear()
+    timings, recalls, sizes = [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        tables = fn.query_collection(question) or {"ids": []}
+        timings.append((time.perf_counter() - start) * 1000)
+        expected = EXPECTED_TABLES.get(question)
+        if expected:
+            recalls.append(len(expected & set(tables["ids"])) / len(expected))
+        sizes.append(len(tables["ids"]))
+    return {"timings": timings, "recalls": recalls, "sizes": sizes}
+
+
+def report(label: str, result: dict) -> None:
+    timings = result["timings"]
+    print(f"{label}: mean {statistics.mean(timings):.1f} ms, median {statistics.median(timings):.1f} ms, "
+          f"recall {statistics.mean(result['recalls']):.2f}, {statistics.mean(result['sizes']):.1f} tables per prompt")
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    if cfg.RUN_LOCALLY:
+        atexit.register(terminate_ollama_processes)
+        if not is_ollama_running():
+            start_ollama()
+    atexit.register(fn.close_vector_collections)
+
+    if fn.get_lexical_index() is None:
+        sys.exit("Run vectorize_database.py first to build the lexical index")
+
+    with open(QUESTIONS_PATH, encoding="utf-8") as file:
+        questions = [line.strip() for line in file if line.strip()]
+
+    fn.embed_query = embed_without_cache
+    fn.query_collection(questions[0]) # warm up Ollama and the collection
+
+    vector = run(hybrid=False, questions=questions)
+    hybrid = run(hybrid=True, questions=questions)
+
+    report("Vector only", vector)
+    report("Hybrid     ", hybrid)
+    skipped = sum(1 for question in questions if len(fn.get_lexical_index().mentions(question)) >= cfg.LEXICAL_DECISIVE_MENTIONS)
+    print(f"Embedding call skipped for {skipped}/{len(questions)} questions")
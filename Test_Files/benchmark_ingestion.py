@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+import hashlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+import chromadb
+from chromadb.utils.embedding_functions import EmbeddingFunction
+
+from ingestion import ingest
+
+# --- Ingestion benchmark with a local stub embedding function (no Ollama needed) --- #
+
+TABLES = 2000
+DIMENSIONS = 768
+LATENCY_PER_CALL = 0.05  # seconds, fixed cost of one embedding request
+LATENCY_PER_DOC = 0.002  # seconds, per document inside a request
+
+
+class StubEmbeddingFunction(EmbeddingFunction):
+    """Deterministic embeddings with a simulated request latency."""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        time.sleep(LATENCY_PER_CALL + LATENCY_PER_DOC * len(input))
+        vectors = []
+        for doc in input:
+            seed = hashlib.sha256(doc.encode("utf-8")).digest()
+            vectors.append([seed[i % len(seed)] / 255 for i in range(DIMENSIONS)])
+        return vectors
+
+
+def make_documents(n: int) -> list[str]:
+    return [f"\nCREATE TABLE table_{i} (\n\tid INTEGER, \n\tname TEXT, \n\tvalue_{i} NUMERIC, \n\tPRIMARY KEY (id)\n)" for i in range(n)]
+
+
+def run(batch_size: int, max_workers: int) -> dict:
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection(name=f"bench-{batch_size}-{max_workers}", metadata={"hnsw:space": "cosine"})
+    documents = make_documents(TABLES)
+    ids = [f"table_{i}" for i in range(TABLES)]
+    metadatas = [{"table": id} for id in ids]
+    stats = ingest(collection, ids, documents, metadatas, StubEmbeddingFunction(), batch_size=batch_size, max_workers=max_workers)
+    client.delete_collection(collection.name)
+    return stats
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    results = []
+    for batch_size, max_workers in [(TABLES, 1), (32, 1), (32, 4), (64, 8)]:
+        stats = run(batch_size, max_workers)
+        results.append((batch_size, max_workers, stats))
+
+    print(f"\n{TABLES} documents, stub latency {LATENCY_PER_CALL * 1000:.0f} ms/request + {LATENCY_PER_DOC * 1000:.0f} ms/doc")
+    for batch_size, max_workers, stats in results:
+        print(f"batch={batch_size:5d} workers={max_workers}: {stats['seconds']:.2f} s, {stats['docs_per_second']:.0f} docs/s")
@@ -0,0 +1,44 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+
+from langchain_community.utilities import SQLDatabase
+from prompt_builder import estimator
+import functions as fn
+import config as cfg
+
+# --- Benchmark: answer prompt result tokens, str(list of dicts) vs compact serialization --- #
+
+QUERIES = [
+    "SELECT COUNT(*) FROM actor",
+    "SELECT first_name, last_name FROM actor LIMIT 5",
+    "SELECT * FROM film",
+    "SELECT * FROM payment",
+    "SELECT c.first_name, c.last_name, SUM(p.amount) AS total FROM customer c JOIN payment p ON p.customer_id = c.customer_id GROUP BY c.customer_id ORDER BY total DESC",
+]
+
+
+def python_repr(results, max_results: int = cfg.MAX_RESULTS_LLM) -> str:
+    """The result text before the serializer: the first rows as a Python list of dicts."""
+    records = [dict(zip(results.columns, row)) for row in results.head(max_results + 1)]
+    if len(records) > max_results:
+        return f"Showing only the first {max_results}:\n{str(records[:max_results])}"
+    return str(records)
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    db = SQLDatabase.from_uri(f"sqlite:///{cfg.DB_PATH}")
+    before_total = after_total = 0
+    for query in QUERIES:
+        results, total_count = fn.create_view(query, db)
+        before = estimator.count(python_repr(results), cfg.ANSWER_LLM_MODEL)
+        after = estimator.count(fn.reduce_rows(results, db=db), cfg.ANSWER_LLM_MODEL)
+        results.close()
+        before_total += before
+        after_total += after
+        print(f"{before:6d} -> {after:5d} tokens ({total_count} rows) {query[:70]}")
+    print(f"Total: {before_total} -> {after_total} tokens, {before_total / after_total:.1f}x smaller")
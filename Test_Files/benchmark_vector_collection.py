@@ -0,0 +1,58 @@
+import atexit
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+
+from local_ollama_management import start_ollama, is_ollama_running, terminate_ollama_processes
+from functions import query_collection, close_vector_collections
+from config import RUN_LOCALLY
+
+# --- Micro-benchmark: per-query latency with a cold vs a warm vector collection --- #
+
+ROUNDS = 20
+
+questions = [
+    "How many actors are there in the database?",
+    "List all movies released in 2006.",
+    "What is the average rental rate for movies?",
+    "Who are the top 5 actors with the most movies?",
+]
+
+
+def run(cold: bool) -> list[float]:
+    """Time query_collection, closing the registry before every call when cold."""
+    timings = []
+    for i in range(ROUNDS):
+        if cold:
+            close_vector_collections() # forces a new client + embedding function, like before the registry
+        start = time.perf_counter()
+        query_collection(questions[i % len(questions)])
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    print(f"{label}: mean {statistics.mean(timings):.1f} ms, median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms")
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    if RUN_LOCALLY:
+        atexit.register(terminate_ollama_processes)
+        if not is_ollama_running():
+            start_ollama()
+
+    query_collection(questions[0]) # warm up Ollama so both runs pay the same embedding cost
+
+    cold = run(cold=True)
+    warm = run(cold=False)
+    close_vector_collections()
+
+    report("Cold collection (open per query)", cold)
+    report("Warm collection (registry)      ", warm)
+    print(f"Speedup: {statistics.mean(cold) / statistics.mean(warm):.2f}x")
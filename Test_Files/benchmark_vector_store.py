@@ -0,0 +1,76 @@
+import sys
+import os
+import time
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../Code')))
+
+import numpy as np
+import chromadb
+from chromadb.api.client import SharedSystemClient
+
+from vector_store import NumpyStore
+
+# --- Benchmark: Chroma (PersistentClient + HNSW) vs memory-mapped NumPy store, no Ollama needed --- #
+
+TABLES = 2000
+DIMENSIONS = 768  # nomic-embed-text
+QUERIES = 200
+TOP_K = 10
+
+
+def make_data() -> tuple[list[str], list[str], np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    ids = [f"table_{i}" for i in range(TABLES)]
+    documents = [f"CREATE TABLE table_{i} (id INTEGER)" for i in range(TABLES)]
+    return ids, documents, rng.normal(size=(TABLES, DIMENSIONS)).astype(np.float32), rng.normal(size=(QUERIES, DIMENSIONS)).astype(np.float32)
+
+
+def build(path: str, ids: list[str], documents: list[str], embeddings: np.ndarray) -> None:
+    client = chromadb.PersistentClient(path=os.path.join(path, "chroma"))
+    collection = client.get_or_create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, TABLES, 500):
+        collection.upsert(ids=ids[start:start + 500], documents=documents[start:start + 500], embeddings=list(embeddings[start:start + 500]))
+    SharedSystemClient.clear_system_cache()
+    NumpyStore(os.path.join(path, "numpy")).upsert(ids=ids, embeddings=embeddings, documents=documents)
+
+
+def open_chroma(path: str):
+    return chromadb.PersistentClient(path=os.path.join(path, "chroma")).get_collection(name="bench")
+
+
+def open_numpy(path: str) -> NumpyStore:
+    return NumpyStore(os.path.join(path, "numpy"))
+
+
+def run(label: str, open_store, path: str, queries: np.ndarray) -> list[str]:
+    start = time.perf_counter()
+    store = open_store(path)
+    store.query(query_embeddings=[queries[0]], n_results=TOP_K) # first query loads the index
+    startup = (time.perf_counter() - start) * 1000
+
+    timings, top_ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = store.query(query_embeddings=[query], n_results=TOP_K)
+        timings.append((time.perf_counter() - start) * 1000)
+        top_ids.append(results["ids"][0])
+    print(f"{label}: startup + first query {startup:.1f} ms, query mean {statistics.mean(timings):.3f} ms, "
+          f"median {statistics.median(timings):.3f} ms")
+    return top_ids
+
+
+# --- Script --- #
+
+if __name__ == "__main__":
+    ids, documents, embeddings, queries = make_data()
+    with tempfile.TemporaryDirectory() as path:
+        build(path, ids, documents, embeddings)
+        chroma = run("Chroma", open_chroma, path, queries)
+        SharedSystemClient.clear_system_cache()
+        numpy = run("NumPy ", open_numpy, path, queries)
+
+    # HNSW is approximate, the NumPy search is exact
+    recall = statistics.mean(len(set(a) & set(b)) / TOP_K for a, b in zip(chroma, numpy))
+    print(f"Chroma recall@{TOP_K} against exact search: {recall:.2f}")
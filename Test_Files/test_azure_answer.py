@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+from Code.functions import agenerate_answer
+from Code.llm_providers import AzureProvider
+
+STATE = {"question": "How many actors?", "tables_info": "CREATE TABLE actor (actor_id INTEGER)",
+         "query": "SELECT COUNT(*) FROM actor", "total_count": 1, "result": "| COUNT(*) |\n| 200 |"}
+
+
+def chunk(content: str | None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+
+CHUNKS = [SimpleNamespace(choices=[], usage=None), chunk("There are "), chunk(None), chunk("200 actors.")]
+
+
+class Stream:
+    """Streamed chat completion stub, usable with `async with`."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        for item in CHUNKS:
+            yield item
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+
+class Client:
+    """AsyncAzureOpenAI stub recording its chat completion requests."""
+
+    def __init__(self):
+        self.requests = []
+        self.stream = Stream()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        self.requests.append(request)
+        return self.stream
+
+
+def test_azure_answer_is_streamed_with_one_formatted_prompt():
+    client = Client()
+    provider = AzureProvider(client, "gpt-4.1", temperature=0.1, max_tokens=100)
+
+    async def collect():
+        return [text async for text in agenerate_answer(STATE, provider)]
+
+    assert asyncio.run(collect()) == ["There are ", "200 actors."]
+    assert client.stream.closed
+
+    (request,) = client.requests
+    assert request["stream"] is True and request["model"] == "gpt-4.1"
+    (message,) = request["messages"]
+    assert message["role"] == "user"
+    assert "How many actors?" in message["content"] and "{question}" not in message["content"]
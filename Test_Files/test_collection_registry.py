@@ -0,0 +1,24 @@
+from Code.collection_registry import CollectionRegistry
+
+
+def test_refreshing_one_collection_keeps_the_others(tmp_path):
+    registry = CollectionRegistry()
+    opened = []
+
+    def factory(name):
+        def build(path):
+            opened.append(name)
+            return object()
+        return build
+
+    tables = registry.open_store("tables", factory("tables"), str(tmp_path))
+    columns = registry.open_store("columns", factory("columns"), str(tmp_path))
+
+    registry.refresh("tables")
+
+    assert registry.open_store("columns", factory("columns"), str(tmp_path)) is columns
+    assert registry.open_store("tables", factory("tables"), str(tmp_path)) is not tables
+    assert opened == ["tables", "columns", "tables"]
+
+    registry.refresh()
+    assert sorted(opened[3:]) == ["columns", "tables"]
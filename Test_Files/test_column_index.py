@@ -0,0 +1,36 @@
+from Code.column_index import column_documents, parse_table, prune_table
+
+FILM = (
+    "\nCREATE TABLE film (\n\tfilm_id INTEGER, \n\ttitle TEXT, \n\tdescription TEXT, \n\tlanguage_id INTEGER, "
+    "\n\trental_rate NUMERIC, \n\tPRIMARY KEY (film_id), \n\tFOREIGN KEY(language_id) REFERENCES language (language_id)\n)"
+    "\n\n/*\n2 rows from film table:\nfilm_id\ttitle\tdescription\tlanguage_id\trental_rate\n"
+    "1\tACADEMY DINOSAUR\tA Epic Drama\t1\t0.99\n2\tACE GOLDFINGER\tA Astounding Epistle\t1\t4.99\n*/"
+)
+
+
+def test_parse_table_finds_keys_and_samples():
+    parsed = parse_table(FILM)
+
+    assert [name for name, _ in parsed["columns"]] == ["film_id", "title", "description", "language_id", "rental_rate"]
+    assert parsed["keys"] == {"film_id", "language_id"}
+    assert parsed["references"] == {"language_id": "language (language_id)"}
+    assert len(parsed["samples"]) == 3
+
+
+def test_column_documents():
+    docs = column_documents(FILM)
+
+    assert list(docs) == ["film.film_id", "film.title", "film.description", "film.language_id", "film.rental_rate"]
+    assert docs["film.title"] == "Column film.title: TEXT, examples: ACADEMY DINOSAUR, ACE GOLDFINGER"
+    assert docs["film.language_id"].startswith("Column film.language_id: INTEGER, foreign key to language (language_id)")
+
+
+def test_prune_table_keeps_retrieved_columns_and_keys():
+    pruned = prune_table(FILM, {"title"})
+
+    assert pruned == (
+        "\nCREATE TABLE film (\n\tfilm_id INTEGER, \n\ttitle TEXT, \n\tlanguage_id INTEGER, "
+        "\n\tPRIMARY KEY (film_id), \n\tFOREIGN KEY(language_id) REFERENCES language (language_id)\n)"
+        "\n\n/*\n2 rows from film table:\nfilm_id\ttitle\tlanguage_id\n1\tACADEMY DINOSAUR\t1\n2\tACE GOLDFINGER\t1\n*/"
+    )
+    assert prune_table("not a table", {"title"}) == "not a table"
@@ -0,0 +1,58 @@
+import Code.functions as fn
+from Code.embedding_cache import EmbeddingCache, normalize_text
+
+
+def test_normalize_text_folds_case_spacing_and_punctuation():
+    assert normalize_text("  How many  ACTORS are there?? ") == "how many actors are there"
+    assert normalize_text("Straße\tlist!") == "strasse list"
+
+
+def test_lru_eviction_falls_back_to_disk(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), max_size=2, model="m")
+    for i, text in enumerate(["a", "b", "c"]):
+        cache.put(text, [float(i)])
+
+    assert list(cache._lru) == [cache._key("b"), cache._key("c")]  # "a" evicted from memory
+    assert cache.get("a") == [0.0]  # still on disk, back in memory
+    assert cache._key("b") not in cache._lru
+    assert cache.get("unknown") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_persist_across_instances_and_are_keyed_per_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    first = EmbeddingCache(path=path, model="model-a")
+    first.put("How many actors?", [0.5, 0.25])
+    first.close()
+
+    assert EmbeddingCache(path=path, model="model-a").get("how many actors") == [0.5, 0.25]
+    assert EmbeddingCache(path=path, model="model-b").get("How many actors?") is None
+
+
+def test_query_collection_uses_the_cached_embedding(tmp_path, monkeypatch):
+    cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), model="m")
+    cache.put("Which films?", [0.1, 0.9])
+
+    class Collection:
+        queries = []
+
+        def count(self):
+            return 1
+
+        def query(self, **kwargs):
+            self.queries.append(kwargs)
+            return {"ids": [["film"]], "documents": [["CREATE TABLE film (...)"]], "distances": [[0.1]]}
+
+    def embedder(texts):
+        raise AssertionError("the embedding model was called on a cache hit")
+
+    monkeypatch.setattr(fn, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(fn, "get_embedding_function", lambda: embedder)
+    monkeypatch.setattr(fn, "get_embedding_batcher", lambda: embedder)
+    monkeypatch.setattr(fn, "get_vector_collection", Collection)
+    monkeypatch.setattr(fn, "get_join_graph", lambda: None)
+    monkeypatch.setattr(fn, "get_lexical_index", lambda: None)
+    monkeypatch.setattr(fn.cfg, "COLUMN_INDEX_ENABLED", False)
+
+    assert fn.query_collection("which films", top_k=3)["ids"] == ["film"]
+    assert Collection.queries == [{"query_embeddings": [[0.1, 0.9]], "n_results": 3}]
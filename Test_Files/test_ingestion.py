@@ -0,0 +1,63 @@
+import pytest
+
+import Code.functions as fn
+import Code.ingestion as ingestion
+from Code.vector_store import NumpyStore
+
+
+class StubEmbedder:
+    """Embedding backend recording the embedded documents, failing its first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.embedded: list[str] = []
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("embedding model is down")
+        self.embedded.extend(input)
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def test_only_new_or_changed_tables_are_embedded_and_dropped_ones_deleted(tmp_path, monkeypatch):
+    embedder = StubEmbedder()
+    monkeypatch.setattr(fn, "get_embedding_function", lambda: embedder)
+    store = NumpyStore(str(tmp_path / "tables"))
+    docs = {"actor": "CREATE TABLE actor (actor_id INTEGER)", "film": "CREATE TABLE film (film_id INTEGER)"}
+
+    def index(docs: dict) -> dict:
+        return fn._index_documents(store, docs, {name: {"table": name} for name in docs})
+
+    assert index(docs)["added"] == ["actor", "film"]
+
+    embedder.embedded.clear()
+    report = index({"actor": docs["actor"], "film": "CREATE TABLE film (film_id INTEGER, title TEXT)"})
+    assert (report["skipped"], report["updated"]) == (["actor"], ["film"])
+    assert embedder.embedded == ["CREATE TABLE film (film_id INTEGER, title TEXT)"]
+
+    embedder.embedded.clear()
+    report = index({"actor": docs["actor"]})
+    assert (report["skipped"], report["deleted"]) == (["actor"], ["film"])
+    assert embedder.embedded == []
+    assert store.get()["ids"] == ["actor"]
+
+
+def test_failing_batch_is_retried_then_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion.cfg, "INGEST_RETRY_BACKOFF", 0)
+    store = NumpyStore(str(tmp_path / "tables"))
+
+    flaky = StubEmbedder(failures=2)
+    stats = ingestion.ingest(store, ["a"], ["doc a"], [{}], flaky, batch_size=1, max_workers=1, retries=2)
+    assert flaky.calls == 3 and stats["ingested"] == ["a"]
+
+    down = StubEmbedder(failures=10)
+    with pytest.raises(ConnectionError):
+        ingestion._embed_with_retry(down, ["doc b"], retries=2)
+    assert down.calls == 3
+
+    down = StubEmbedder(failures=10)
+    stats = ingestion.ingest(store, ["b", "c"], ["doc b", "doc c"], [{}, {}], down, batch_size=1, max_workers=1, retries=1)
+    assert sorted(stats["failed"]) == ["b", "c"] and stats["ingested"] == [] and down.calls == 4
+    assert store.get()["ids"] == ["a"]
@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+
+from langchain_community.utilities import SQLDatabase
+from langchain_core.language_models import FakeListChatModel
+
+import Code.pipeline as pipeline
+from Code.intent_router import DATA, OFF_TOPIC, SCHEMA, describe_join, route
+from Code.join_graph import JoinGraph
+
+GRAPH = JoinGraph(
+    ["actor", "film", "film_actor", "customer", "store"],
+    [
+        {"table": "film_actor", "columns": ["actor_id"], "ref_table": "actor", "ref_columns": ["actor_id"]},
+        {"table": "film_actor", "columns": ["film_id"], "ref_table": "film", "ref_columns": ["film_id"]},
+        {"table": "customer", "columns": ["store_id"], "ref_table": "store", "ref_columns": ["store_id"]},
+    ],
+)
+TABLES = {"ids": ["actor"], "documents": ["CREATE TABLE actor (...)"], "distances": [0.2]}
+
+
+def test_relationship_questions_are_answered_from_the_join_graph():
+    result = route("How the table 'actor' is related to the table 'film'?", TABLES, ["actor", "film"], GRAPH)
+
+    assert result["intent"] == SCHEMA
+    assert result["answer"] == (
+        "**actor** and **film** are related through **film_actor**:\n"
+        "- film_actor.actor_id → actor.actor_id\n- film_actor.film_id → film.film_id"
+    )
+    assert route("Qual a relação entre a tabela customer e a tabela rental?", TABLES, ["customer", "rental"], GRAPH)["intent"] == SCHEMA
+    assert describe_join(GRAPH, "actor", "store") is None
+
+
+def test_structure_data_and_off_topic_questions():
+    assert route("What columns does the film table have?", TABLES, ["film"])["intent"] == SCHEMA
+    assert route("How many tables are in the database?", {"ids": []}, [])["intent"] == SCHEMA
+    assert route("How many actors are there in the database?", TABLES, ["actor"])["intent"] == DATA
+    assert route("List customers related to store 1", TABLES, ["customer", "store"], GRAPH)["intent"] == DATA
+
+    off_topic = route("What's the weather like today?", {"ids": []}, [])
+    assert off_topic["intent"] == OFF_TOPIC and off_topic["answer"]
+    assert route("hello!", TABLES, [])["intent"] == OFF_TOPIC
+
+
+def test_keys_types_and_describe_need_a_schema_noun():
+    assert route("What is the primary key of the rental table?", TABLES, ["rental"])["intent"] == SCHEMA
+    assert route("Describe the film table", TABLES, ["film"])["intent"] == SCHEMA
+    assert route("Quais são as chaves estrangeiras da tabela payment?", TABLES, ["payment"])["intent"] == SCHEMA
+
+    assert route("Describe the most rented film", TABLES, ["film"])["intent"] == DATA
+    assert route("List the films with their primary key and title", TABLES, ["film"])["intent"] == DATA
+    assert route("What is the data type distribution of payments?", TABLES, ["payment"], matched=True)["intent"] == DATA
+
+
+def test_questions_matching_nothing_in_the_database_are_off_topic():
+    # Retrieval still returned its nearest table
+    weather = route("What is the weather today?", TABLES, [], matched=False)
+    assert weather["intent"] == OFF_TOPIC and weather["answer"]
+
+    assert route("What is the weather today?", TABLES, [], matched=True)["intent"] == DATA
+    assert route("How many rows were added today?", TABLES, [], matched=False)["intent"] == DATA
+
+
+def test_answer_model_is_warmed_only_for_data_questions(tmp_path, monkeypatch):
+    path = tmp_path / "actors.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE actor (id INTEGER PRIMARY KEY, name TEXT)")
+    llm = FakeListChatModel(responses=['{"query": "SELECT name FROM actor"}'])
+    monkeypatch.setattr(pipeline.fn, "get_sql_cache", lambda db: None)
+    runner = pipeline.Pipeline(SQLDatabase.from_uri(f"sqlite:///{path}"), llm, llm)
+    runner._retrieve = lambda question: TABLES
+    warmed = []
+
+    async def warm(provider):
+        warmed.append(provider)
+
+    runner._warm_answer_model = warm
+
+    def ask(intent: str, answer: str = None) -> list[str]:
+        runner._route = lambda question, tables: {"intent": intent, "reason": "test", "answer": answer}
+        warmed.clear()
+
+        async def events():
+            return [event async for event in runner.answer_question("question", fast_answer=True)]
+        asyncio.run(events())
+        return warmed
+
+    assert ask(OFF_TOPIC, "off topic") == []
+    assert ask(SCHEMA, "**actor** and **film** are joined directly") == []
+    assert ask(DATA) == ["ollama"]
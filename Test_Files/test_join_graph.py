@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+from langchain_community.utilities import SQLDatabase
+from Code.join_graph import JoinGraph
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "films.db"
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE actor (actor_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE film (film_id INTEGER PRIMARY KEY, title TEXT);
+        CREATE TABLE category (category_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE film_actor (actor_id INTEGER REFERENCES actor (actor_id), film_id INTEGER REFERENCES film (film_id));
+        CREATE TABLE film_category (film_id INTEGER REFERENCES film (film_id), category_id INTEGER REFERENCES category (category_id));
+        CREATE TABLE language (language_id INTEGER PRIMARY KEY);
+    """)
+    connection.close()
+    return SQLDatabase.from_uri(f"sqlite:///{path}")
+
+
+def test_bridge_tables_are_added_between_hits(db, tmp_path):
+    path = str(tmp_path / "join_graph.json")
+    JoinGraph.from_db(db).save(path)
+    graph = JoinGraph.load(path)
+
+    assert len(graph.edges) == 4
+    assert graph.shortest_path("actor", "category", max_hops=4) == ["actor", "film_actor", "film", "film_category", "category"]
+    assert graph.expand(["actor", "film"]) == ["film_actor"]
+    assert graph.expand(["actor", "category"], max_hops=4) == ["film_actor", "film", "film_category"]
+
+
+def test_unreachable_or_distant_tables_add_nothing(db):
+    graph = JoinGraph.from_db(db)
+
+    assert graph.expand(["actor", "language"]) == []
+    assert graph.expand(["actor", "category"], max_hops=3) == []
+    assert graph.expand(["film"]) == []
+    assert JoinGraph.load("missing/join_graph.json") is None
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from Code.functions import parse_query, write_query
+from Code.json_stream import JSONStreamParser, first_object
+
+
+def test_braces_inside_strings_and_chatter():
+    content = 'Here is the "query":\n```json\n{"query": "SELECT \'{a}\' || name FROM t WHERE x = \\"}\\"", "notes": {"n": 1}}\n```\nHope it helps {'
+
+    assert first_object(content, required="query") == {"query": "SELECT '{a}' || name FROM t WHERE x = \"}\"", "notes": {"n": 1}}
+    assert first_object('{"other": 1} then {"query": "SELECT 1"}', required="query") == {"query": "SELECT 1"}
+    assert first_object("{not json} {\"query\": \"SELECT 2\"}", required="query") == {"query": "SELECT 2"}
+    assert first_object('{"query": "SELECT') is None
+
+
+def test_parser_completes_across_chunks():
+    parser = JSONStreamParser(required="query")
+    chunks = ['Sure! {"qu', 'ery": "SELECT * FROM film WHERE title = \'}\'', '"}', " and more text"]
+
+    assert [parser.feed(chunk) for chunk in chunks[:3]] == [None, None, {"query": "SELECT * FROM film WHERE title = '}'"}]
+
+
+class StreamingLLM:
+    """Chat model stub yielding its response in chunks and recording how many were read."""
+
+    model = "stub"
+
+    def __init__(self, chunks: list[str]):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def stream(self, prompt, **kwargs):
+        try:
+            for chunk in self.chunks:
+                self.read += 1
+                yield SimpleNamespace(content=chunk)
+        finally:
+            self.closed = True
+
+
+def test_write_query_stops_generation_when_the_object_is_complete():
+    llm = StreamingLLM(['{"query": ', '"SELECT COUNT(*) FROM actor;"', "}", "\n\nThis query counts", " the actors..."])
+
+    assert write_query("How many actors?", llm, "CREATE TABLE actor (actor_id INTEGER)") == {"query": "SELECT COUNT(*) FROM actor;"}
+    assert llm.read == 3 and llm.closed
+
+    assert parse_query("I’m sorry, I don’t understand.") == {"query": "Error generating query"}
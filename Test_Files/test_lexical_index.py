@@ -0,0 +1,39 @@
+from Code.lexical_index import LexicalIndex
+
+DOCS = {
+    "actor": "\nCREATE TABLE actor (\n\tactor_id INTEGER, \n\tfirst_name TEXT, \n\tlast_name TEXT\n)\n\n/*\n3 rows from actor table:\nactor_id\tfirst_name\tlast_name\n1\tPENELOPE\tGUINESS\n*/",
+    "film": "\nCREATE TABLE film (\n\tfilm_id INTEGER, \n\ttitle TEXT, \n\trental_rate NUMERIC\n)\n\n/*\n3 rows from film table:\nfilm_id\ttitle\trental_rate\n1\tACADEMY DINOSAUR\t0.99\n*/",
+    "film_actor": "\nCREATE TABLE film_actor (\n\tactor_id INTEGER, \n\tfilm_id INTEGER\n)",
+    "customer": "\nCREATE TABLE customer (\n\tcustomer_id INTEGER, \n\tfirst_name TEXT, \n\tlast_name TEXT\n)\n\n/*\n3 rows from customer table:\ncustomer_id\tfirst_name\tlast_name\n1\tMARGARET\tMOORE\n*/",
+    "rental": "\nCREATE TABLE rental (\n\trental_id INTEGER, \n\tcustomer_id INTEGER\n)",
+    "city": "\nCREATE TABLE city (\n\tcity_id INTEGER, \n\tcity TEXT\n)",
+}
+
+
+def test_mentions_match_plurals_and_skip_column_phrases():
+    index = LexicalIndex(DOCS)
+
+    assert index.mentions("Qual a relação entre a tabela customer e a tabela rental?") == ["customer", "rental"]
+    assert index.mentions("List all cities") == ["city"]
+    assert index.mentions("What are the top 5 films by rental rate?") == ["film"]
+    assert index.mentions("Rows of the film_actor table") == ["film_actor"]
+
+
+def test_scores_rank_sample_values_and_columns():
+    index = LexicalIndex(DOCS)
+
+    scores = index.scores("Show the history of MARGARET MOORE")
+    assert max(scores, key=scores.get) == "customer"
+    assert scores["customer"] == 1.0
+    assert index.scores("nothing matches here") == {}
+
+
+def test_fuse_shrinks_distances_and_adds_lexical_hits(tmp_path):
+    path = str(tmp_path / "lexical_index.json")
+    LexicalIndex(DOCS).save(path)
+    index = LexicalIndex.load(path)
+
+    ids, documents, distances = index.fuse("films of PENELOPE GUINESS", ["film"], [DOCS["film"]], [0.4])
+    assert ids[0] == "film" and distances[0] < 0.4
+    assert "actor" in ids
+    assert documents[ids.index("actor")] == DOCS["actor"]
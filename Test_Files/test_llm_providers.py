@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import Code.llm_providers as llm_providers
+from Code.llm_providers import GatedProvider, HedgedProvider, ResilientProvider
+
+metrics = llm_providers.telemetry.metrics
+
+
+class StubProvider:
+    """Local provider sending `chunks` after `delay` seconds, or failing its first `failures` calls."""
+
+    def __init__(self, name: str, chunks: list[str], delay: float = 0.0, failures: int = 0):
+        self.name = name
+        self.model = f"{name}-model"
+        self.chunks = chunks
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self.cancelled = False
+
+    async def astream(self, prompt, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError(f"{self.name} is down")
+        try:
+            await asyncio.sleep(self.delay)
+            for chunk in self.chunks:
+                yield SimpleNamespace(content=chunk)
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def collect(provider) -> str:
+    async def run():
+        return "".join([chunk.content async for chunk in provider.astream("prompt")])
+    return asyncio.run(run())
+
+
+def test_fast_primary_is_not_hedged():
+    metrics.reset()
+    primary, secondary = StubProvider("ollama", ["fast ", "answer"]), StubProvider("azure", ["other"])
+
+    assert collect(HedgedProvider(primary, secondary, delay=0.2)) == "fast answer"
+    assert secondary.calls == 0
+    assert metrics.counter("llm.wins.ollama") == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    metrics.reset()
+    primary, secondary = StubProvider("ollama", ["late"], delay=1.0), StubProvider("azure", ["hedged ", "answer"])
+
+    assert collect(HedgedProvider(primary, secondary, delay=0.05)) == "hedged answer"
+    assert primary.cancelled
+    assert metrics.counter("llm.hedged") == 1 and metrics.counter("llm.wins.azure") == 1
+
+
+def test_failover_and_retries():
+    metrics.reset()
+    down, backup = StubProvider("ollama", ["never"], failures=5), StubProvider("azure", ["from ", "azure"])
+    assert collect(HedgedProvider(down, backup, delay=10)) == "from azure"
+    assert metrics.counter("llm.failover") == 1
+
+    flaky = StubProvider("ollama", ["second ", "try"], failures=1)
+    assert collect(ResilientProvider(flaky, timeout=1, retries=1, backoff=0)) == "second try"
+    assert flaky.calls == 2
+
+    with pytest.raises(TimeoutError):
+        collect(ResilientProvider(StubProvider("ollama", ["slow"], delay=1.0), timeout=0.05, retries=0))
+
+    with pytest.raises(ConnectionError):
+        collect(llm_providers.with_policies(StubProvider("ollama", [], failures=5)))
+
+
+def test_waiting_for_a_slot_does_not_count_toward_the_timeout(monkeypatch):
+    monkeypatch.setattr(llm_providers.cfg, "LLM_HEDGE_ENABLED", True)
+    gate = llm_providers.scheduler.LLMGate(default=1)
+    gated = GatedProvider(ResilientProvider(StubProvider("ollama", ["after ", "the wait"]), timeout=0.1, retries=0), gate)
+
+    async def scenario() -> str:
+        async with gate.slot("ollama-model"):
+            answer = asyncio.create_task(_join(gated))
+            await asyncio.sleep(0.3)  # longer than the timeout
+        return await answer
+
+    assert asyncio.run(scenario()) == "after the wait"
+
+    # Only the gated leg waits for a slot, the hedge stays outside the gate
+    policies = llm_providers.with_policies(StubProvider("ollama", []), StubProvider("azure", []), gated=("ollama",))
+    assert isinstance(policies, HedgedProvider)
+    primary, secondary = policies.providers
+    assert isinstance(primary, GatedProvider) and isinstance(primary.provider, ResilientProvider)
+    assert isinstance(secondary, ResilientProvider)
+
+
+def test_saturated_gate_is_hedged_and_released(monkeypatch):
+    monkeypatch.setattr(llm_providers.cfg, "LLM_HEDGE_ENABLED", True)
+    gate = llm_providers.scheduler.LLMGate(default=1)
+    monkeypatch.setattr(llm_providers.scheduler, "gate", gate)
+    policies = llm_providers.with_policies(StubProvider("ollama", ["queued"]), StubProvider("azure", ["from ", "azure"]), gated=("ollama",))
+    policies.delay = 0.05
+
+    async def scenario() -> tuple[str, dict, dict]:
+        async with gate.slot("ollama-model"):
+            answer = await _join(policies)
+            queued = gate.snapshot()
+        return answer, queued, gate.snapshot()
+
+    answer, queued, after = asyncio.run(scenario())
+    assert answer == "from azure"
+    assert queued == {"in_flight": {"ollama-model": 1}, "waiting": {}}  # the cancelled Ollama call left the queue
+    assert after == {"in_flight": {}, "waiting": {}}
+
+
+async def _join(provider) -> str:
+    return "".join([chunk.content async for chunk in provider.astream("prompt")])
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from Code.local_ollama_management import is_ollama_healthy, preload_models, wait_until_ready
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    """Ollama API stub: healthy `ready_after` seconds after it started, models take 0.1 s to load."""
+
+    started = 0.0
+    ready_after = 0.0
+    loaded: set = set()
+    calls: list = []
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if time.monotonic() - self.started < self.ready_after:
+            return self._send(503, {"error": "starting"})
+        if self.path == "/api/version":
+            return self._send(200, {"version": "0.0.0"})
+        if self.path == "/api/ps":
+            return self._send(200, {"models": [{"name": name} for name in sorted(self.loaded)]})
+        self._send(404, {})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.calls.append((self.path, payload))
+        if payload["model"] not in self.loaded:
+            time.sleep(0.1)
+            self.loaded.add(payload["model"])
+        self._send(200, {"model": payload["model"], "done": True})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_ollama():
+    StubOllama.started, StubOllama.ready_after = time.monotonic(), 0.3
+    StubOllama.loaded, StubOllama.calls = {"sql-model"}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_waits_for_readiness(stub_ollama):
+    assert not is_ollama_healthy(stub_ollama)
+    with pytest.raises(TimeoutError):
+        wait_until_ready(stub_ollama, timeout=0.1, poll=0.02)
+
+    assert 0.1 <= wait_until_ready(stub_ollama, timeout=2, poll=0.02) < 1
+    assert is_ollama_healthy(stub_ollama)
+
+
+def test_preload_reports_cold_and_warm_latency(stub_ollama, capsys):
+    wait_until_ready(stub_ollama, timeout=2, poll=0.02)
+
+    report = preload_models(stub_ollama, "5m", models=["sql-model", "answer-model", "sql-model"], embedding_models=["embed-model"])
+
+    assert list(report) == ["sql-model", "answer-model", "embed-model"]
+    assert report["sql-model"]["was_loaded"] and report["sql-model"]["cold_seconds"] < 0.1
+    assert not report["answer-model"]["was_loaded"]
+    assert report["answer-model"]["cold_seconds"] >= 0.1 > report["answer-model"]["warm_seconds"]
+    assert all(payload["keep_alive"] == "5m" for _, payload in StubOllama.calls)
+    assert ("/api/embed", {"model": "embed-model", "keep_alive": "5m", "input": "warm up"}) in StubOllama.calls
+    assert capsys.readouterr().out == ""  # reported to the caller, not printed
+
+
+def test_unreachable_server_is_not_healthy():
+    with pytest.raises(TimeoutError):
+        wait_until_ready("http://127.0.0.1:9", timeout=0.1, poll=0.02)
@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from langchain_community.utilities import SQLDatabase
+
+import Code.pipeline_server as pipeline_server
+from Code.pipeline_client import PipelineClient, ServerBusy
+from Code.pipeline_server import PipelineServer
+from Code.sql_execution import execute_stream
+
+
+class StubPipeline:
+    """Pipeline answering with a real result stream, holding each question until `release` is set."""
+
+    def __init__(self, db):
+        self.db = db
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    async def answer_question(self, question: str, provider: str = "ollama", fast_answer: bool = None):
+        self.started.set()
+        yield {"type": "status", "message": f"{provider}: {question}"}
+        await asyncio.to_thread(self.release.wait, 5)
+        results = execute_stream(self.db, "SELECT id, name FROM actor ORDER BY id")
+        yield {"type": "result", "results": results, "total_count": 2, "preview": "2 actors"}
+        yield {"type": "answer", "chunk": "Two actors."}
+        yield {"type": "done", "state": {"question": question, "results": results, "answer": "Two actors."}}
+
+
+@pytest.fixture
+def served(tmp_path):
+    path = tmp_path / "actors.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE actor (id INTEGER PRIMARY KEY, name TEXT)")
+        connection.executemany("INSERT INTO actor VALUES (?, ?)", [(1, "Ada"), (2, "Grace")])
+    pipeline_server.telemetry.metrics.reset()
+    pipeline = StubPipeline(SQLDatabase.from_uri(f"sqlite:///{path}"))
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(PipelineServer(pipeline, concurrency=1, queue_size=0).start("127.0.0.1", 0), loop).result()
+    port = server.sockets[0].getsockname()[1]
+    yield pipeline, PipelineClient(f"http://127.0.0.1:{port}", timeout=5)
+
+    pipeline.release.set()
+    server.close()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def test_events_are_streamed_as_json_lines(served):
+    pipeline, client = served
+    pipeline.release.set()
+
+    events = list(client.run("How many actors?", provider="azure"))
+
+    assert [event["type"] for event in events] == ["status", "result", "answer", "done"]
+    assert events[0]["message"] == "azure: How many actors?"
+    assert events[1]["columns"] == ["id", "name"] and events[1]["rows"] == [[1, "Ada"], [2, "Grace"]]
+    assert events[3]["state"] == {"question": "How many actors?", "answer": "Two actors."}
+    assert client.health()["active"] == 0
+
+
+def test_full_queue_is_refused(served):
+    pipeline, client = served
+    first = client.run("First question")
+    assert next(first)["type"] == "status"
+    assert pipeline.started.wait(5)
+
+    with pytest.raises(ServerBusy):
+        next(client.run("Second question"))
+    assert client.metrics()["counters"]["server.rejected"] == 1
+
+    pipeline.release.set()
+    assert [event["type"] for event in first] == ["result", "answer", "done"]
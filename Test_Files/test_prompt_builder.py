@@ -0,0 +1,55 @@
+from Code.prompt_builder import TokenEstimator, drop_samples, fit_tables, fit_text, shorten_columns
+
+FILM = (
+    "\nCREATE TABLE film (\n\tfilm_id INTEGER, \n\ttitle TEXT, \n\tdescription TEXT, \n\tlanguage_id INTEGER, "
+    "\n\trental_rate NUMERIC, \n\tPRIMARY KEY (film_id), \n\tFOREIGN KEY(language_id) REFERENCES language (language_id)\n)"
+    "\n\n/*\n2 rows from film table:\nfilm_id\ttitle\tdescription\tlanguage_id\trental_rate\n"
+    "1\tACADEMY DINOSAUR\tA Epic Drama\t1\t0.99\n2\tACE GOLDFINGER\tA Astounding Epistle\t1\t4.99\n*/"
+)
+ACTOR = (
+    "\nCREATE TABLE actor (\n\tactor_id INTEGER, \n\tfirst_name TEXT, \n\tlast_name TEXT, \n\tPRIMARY KEY (actor_id)\n)"
+    "\n\n/*\n1 rows from actor table:\nactor_id\tfirst_name\tlast_name\n1\tPENELOPE\tGUINESS\n*/"
+)
+
+
+def test_drop_samples_and_shorten_columns():
+    assert drop_samples(FILM) == FILM[:FILM.index("\n\n/*")]
+    assert drop_samples("not a table") == "not a table"
+
+    shortened = shorten_columns(FILM, max_columns=1)
+    assert "\ttitle TEXT" in shortened and "description" not in shortened
+    assert "language_id INTEGER" in shortened  # keys stay
+    assert shortened.endswith("-- 2 more columns not shown")
+    assert shorten_columns(FILM, max_columns=3) == FILM
+
+
+def test_fit_tables_trims_lowest_ranked_first():
+    docs = [FILM, ACTOR]
+    size = TokenEstimator().count
+    assert fit_tables(docs, 10_000) == (docs, {"samples_dropped": 0, "columns_shortened": 0, "tables_dropped": 0})
+
+    # Room for everything but the actor samples
+    budget = size(FILM + "\n---\n" + drop_samples(ACTOR))
+    assert fit_tables(docs, budget) == ([FILM, drop_samples(ACTOR)], {"samples_dropped": 1, "columns_shortened": 0, "tables_dropped": 0})
+
+    # The best table is kept even over the budget
+    trimmed, report = fit_tables(docs, 1)
+    assert trimmed == [drop_samples(FILM)]
+    assert report["tables_dropped"] == 1
+
+
+def test_estimator_calibration_and_fit_text():
+    estimator = TokenEstimator(chars_per_token=4.0, weight=0.5)
+    assert estimator.count("x" * 40, "model") == 10
+
+    estimator.calibrate("model", chars=300, tokens=100)  # first report replaces the default
+    estimator.calibrate("model", chars=200, tokens=100)
+    estimator.calibrate("model", chars=5000, tokens=10)  # cached prefix, ignored
+    assert estimator.ratio("model") == 2.5
+    assert estimator.ratio("other") == 4.0
+
+    text = "\n".join(f"row {i}" for i in range(100))
+    cut = fit_text(text, 20)
+    assert cut.endswith("\n... (truncated)") and cut.startswith("row 0\nrow 1")
+    assert len(cut) < len(text)
+    assert fit_text("short", 20) == "short"
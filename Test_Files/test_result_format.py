@@ -0,0 +1,58 @@
+from Code.result_format import column_stats, format_value, render_table, sample_indexes, serialize, template_answer
+
+
+def test_format_value():
+    assert format_value(None) == "NULL"
+    assert format_value(12.34567) == "12.346"
+    assert format_value(0.000123456) == "0.000123"
+    assert format_value("a | b\nc") == "a / b c"
+    assert format_value("x" * 100, max_chars=10) == "x" * 9 + "…"
+    assert format_value(b"\x00\x01") == "<2 bytes>"
+
+
+def test_small_result_is_a_table():
+    text = serialize(["name", "rate"], [("ACADEMY", 0.99), ("ACE", 4.99)])
+
+    assert text == "| name | rate |\n|---|---|\n| ACADEMY | 0.99 |\n| ACE | 4.99 |"
+
+
+def test_large_result_is_sampled_with_stats():
+    rows = [(i, f"title {i}", 1.5) for i in range(1, 101)]
+    text = serialize(["id", "title", "rate"], rows, max_rows=6, max_tokens=10_000)
+
+    assert text.startswith("Sample of 6 rows")
+    lines = text.splitlines()
+    assert [line.split(" | ")[0] for line in lines[3:9]] == ["| 1", "| 2", "| 3", "| 36", "| 68", "| 100"]
+    assert "- id: min 1, max 100, 100 distinct" in lines
+    assert "- rate: always 1.5, 1 distinct" in lines
+
+    # The token budget shrinks the sample, never below one row
+    assert len(serialize(["id", "title", "rate"], rows, max_rows=6, max_tokens=1).splitlines()) == len(lines) - 5
+
+
+def test_sample_indexes_and_stats():
+    assert sample_indexes(5, 10) == [0, 1, 2, 3, 4]
+    assert sample_indexes(10, 4) == [0, 1, 6, 9]
+    assert column_stats(["a", "b"], [(1, None), (3, None), (1, None)]) == [(1, 3, 2), (None, None, 0)]
+    assert render_table(["a"], []) == "| a |\n|---|"
+
+
+def test_template_answer_for_small_results():
+    assert template_answer(["total_actors"], [(200,)], 1) == "**Total actors:** 200"
+    assert template_answer(["first_name", "last_name"], [("NICK", "DAVIS")], 1) == "- **First name:** NICK\n- **Last name:** DAVIS"
+    assert template_answer(["name"], [("A",), ("B",)], 2) == "The query returned 2 rows:\n\n| name |\n|---|\n| A |\n| B |"
+
+    # Aggregates read as words
+    assert template_answer(["COUNT(*)"], [(200,)], 1) == "**Count:** 200"
+    assert template_answer(["SUM(amount)"], [(47993.01,)], 1) == "**Sum of amount:** 47993.01"
+    assert template_answer(["count(DISTINCT r.customer_id)", "AVG(amount)"], [(599, 4.2)], 1) == \
+        "- **Count of distinct customer id:** 599\n- **Average of amount:** 4.2"
+
+    # Left to the answer model: unreadable labels, empty, truncated, long or wide results
+    assert template_answer(["n"], [(200,)], 1) is None
+    assert template_answer(["ROUND(AVG(amount), 2)"], [(4.2,)], 1) is None
+    assert template_answer(["name", "c"], [("A", 1), ("B", 2)], 2) is None
+    assert template_answer(["name"], [], 0) is None
+    assert template_answer(["name"], [("A",), ("B",)], 500) is None
+    assert template_answer(["id"], [(i,) for i in range(11)], 11, max_rows=10) is None
+    assert template_answer([f"c{i}" for i in range(7)], [tuple(range(7))], 1, max_columns=6) is None
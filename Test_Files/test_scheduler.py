@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import Code.scheduler as scheduler
+from Code.llm_providers import GatedProvider
+from Code.scheduler import EmbeddingBatcher, LLMGate
+
+metrics = scheduler.telemetry.metrics
+
+
+class StubEmbedder:
+    """Embedding backend taking 20 ms per call, whatever the batch size."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.batches.append(list(input))
+        time.sleep(0.02)
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in input]
+
+
+def test_concurrent_embeddings_are_batched():
+    metrics.reset()
+    backend = StubEmbedder()
+    batcher = EmbeddingBatcher(backend, window=0.005, max_batch=16)
+    questions = [f"question {i // 2}" for i in range(60)]  # every question asked twice at once
+
+    with ThreadPoolExecutor(max_workers=60) as pool:
+        embeddings = list(pool.map(lambda question: batcher([question])[0], questions))
+
+    assert embeddings == [[float(len(question)), float(sum(map(ord, question)))] for question in questions]
+    assert all(len(set(batch)) == len(batch) for batch in backend.batches)
+    assert sum(len(batch) for batch in backend.batches) < 60  # duplicates in a batch embedded once
+    assert len(backend.batches) <= 10 and max(len(batch) for batch in backend.batches) <= 16
+    assert metrics.snapshot()["summaries"]["scheduler.embed.batch_size"]["count"] == len(backend.batches)
+
+
+def test_short_embedding_batch_fails_its_callers_and_the_worker_survives():
+    calls = []
+
+    def backend(input: list[str]) -> list[list[float]]:
+        calls.append(list(input))
+        return [[1.0]] if len(calls) == 1 else [[float(len(text))] for text in input]  # first call drops a vector
+
+    batcher = EmbeddingBatcher(backend, window=0, timeout=2)
+    with pytest.raises(ValueError, match="1 embeddings returned for 2 texts"):
+        batcher(["a", "bb"])
+
+    assert batcher(["ccc"]) == [[3.0]]
+
+
+class StubModel:
+    """Local model backend recording the generations running at the same time."""
+
+    name = "ollama"
+
+    def __init__(self, model: str, running: dict, peaks: dict, order: list):
+        self.model = model
+        self.running = running
+        self.peaks = peaks
+        self.order = order
+
+    async def astream(self, prompt, **kwargs):
+        self.running[self.model] = self.running.get(self.model, 0) + 1
+        self.peaks["models"] = max(self.peaks.get("models", 0), sum(1 for count in self.running.values() if count))
+        self.peaks[self.model] = max(self.peaks.get(self.model, 0), self.running[self.model])
+        self.order.append(self.model)
+        try:
+            for token in ("SELECT", " 1"):
+                await asyncio.sleep(0.005)
+                yield token
+        finally:
+            self.running[self.model] -= 1
+
+
+def test_generations_are_gated_per_model_and_batched_by_model():
+    metrics.reset()
+    running, peaks, order = {}, {}, []
+    gate = LLMGate(max_in_flight={"sql": 3}, default=2, max_models=1, max_overtakes=8)
+    providers = {model: GatedProvider(StubModel(model, running, peaks, order), gate) for model in ("sql", "answer")}
+
+    async def generate(model: str) -> str:
+        return "".join([token async for token in providers[model].astream("prompt")])
+
+    async def load() -> list[str]:
+        # 40 requests alternating between the two models, as concurrent questions would
+        return await asyncio.gather(*(generate("sql" if i % 2 == 0 else "answer") for i in range(40)))
+
+    assert asyncio.run(load()) == ["SELECT 1"] * 40
+    assert peaks["models"] == 1 and peaks["sql"] <= 3 and peaks["answer"] <= 2
+    switches = sum(1 for previous, model in zip(order, order[1:]) if previous != model)
+    assert switches == metrics.counter("scheduler.llm.switches") <= 15  # 39 without batching by model
+
+
+def test_cancelled_request_leaves_the_queue():
+    gate = LLMGate(default=1)
+
+    async def scenario() -> dict:
+        async with gate.slot("sql"):
+            waiting = asyncio.create_task(gate.slot("answer").__aenter__())
+            await asyncio.sleep(0.01)
+            assert gate.snapshot() == {"in_flight": {"sql": 1}, "waiting": {"answer": 1}}
+            waiting.cancel()
+            await asyncio.sleep(0.01)
+        async with gate.slot("answer"):
+            return gate.snapshot()
+
+    assert asyncio.run(scenario()) == {"in_flight": {"answer": 1}, "waiting": {}}
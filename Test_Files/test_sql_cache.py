@@ -0,0 +1,111 @@
+import asyncio
+import sqlite3
+
+from langchain_community.utilities import SQLDatabase
+from langchain_core.language_models import FakeListChatModel
+
+import Code.pipeline as pipeline
+from Code.sql_cache import SQLCache, schema_fingerprint
+
+
+def test_exact_hit_uses_normalized_question(tmp_path):
+    cache = SQLCache(fingerprint="v1", path=str(tmp_path / "sql_cache.sqlite3"))
+    cache.put("How many actors are in the database?", ["actor"], "sqlite", "llama3.1:8b", "SELECT COUNT(*) FROM actor;")
+
+    assert cache.get("how many actors are in the   database", ["actor"], "sqlite", "llama3.1:8b") == "SELECT COUNT(*) FROM actor;"
+    assert cache.get("How many actors are in the database?", ["actor", "film"], "sqlite", "llama3.1:8b") is None
+    assert cache.get("How many actors are in the database?", ["actor"], "sqlite", "gpt-4.1") is None
+    assert cache.stats() == {"hits": 1, "semantic_hits": 0, "misses": 2}
+
+
+def test_schema_change_invalidates_entries(tmp_path):
+    path = str(tmp_path / "sql_cache.sqlite3")
+    old = SQLCache(fingerprint=schema_fingerprint(["CREATE TABLE actor (actor_id INTEGER)"]), path=path)
+    old.put("List actors", ["actor"], "sqlite", "m", "SELECT * FROM actor;")
+    old.close()
+
+    new = SQLCache(fingerprint=schema_fingerprint(["CREATE TABLE actor (actor_id INTEGER, name TEXT)"]), path=path)
+    assert new.get("List actors", ["actor"], "sqlite", "m") is None
+
+
+def test_semantic_mode_reuses_close_questions(tmp_path):
+    embeddings = {
+        "How many actors are there?": [1.0, 0.0],
+        "Count the actors": [0.99, 0.05],
+        "List all films": [0.0, 1.0],
+    }
+    cache = SQLCache(fingerprint="v1", path=str(tmp_path / "sql_cache.sqlite3"), semantic=True,
+                     max_distance=0.05, embed_function=embeddings.__getitem__)
+    cache.put("How many actors are there?", ["actor"], "sqlite", "m", "SELECT COUNT(*) FROM actor;")
+
+    assert cache.get("Count the actors", ["actor"], "sqlite", "m") == "SELECT COUNT(*) FROM actor;"
+    assert cache.get("List all films", ["actor"], "sqlite", "m") is None
+    assert cache.stats() == {"hits": 0, "semantic_hits": 1, "misses": 1}
+
+
+def test_semantic_lookup_embeds_outside_the_lock(tmp_path):
+    locked = []
+
+    def embed(question):
+        locked.append(cache._lock.locked())
+        return [1.0, 0.0]
+
+    cache = SQLCache(fingerprint="v1", path=str(tmp_path / "sql_cache.sqlite3"), semantic=True, embed_function=embed)
+    cache.put("How many actors are there?", ["actor"], "sqlite", "m", "SELECT COUNT(*) FROM actor;")
+
+    assert cache.get("Count the actors", ["actor"], "sqlite", "m") == "SELECT COUNT(*) FROM actor;"
+    assert locked == [False, False]
+
+
+def test_pipeline_caches_only_sql_that_ran(tmp_path, monkeypatch):
+    path = tmp_path / "actors.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE actor (id INTEGER PRIMARY KEY, name TEXT)")
+        connection.execute("INSERT INTO actor VALUES (1, 'Ada')")
+    cache = SQLCache(fingerprint="v1", path=str(tmp_path / "sql_cache.sqlite3"))
+    monkeypatch.setattr(pipeline.fn, "get_sql_cache", lambda db: cache)
+    monkeypatch.setattr(pipeline.cfg, "INTENT_ROUTER_ENABLED", False)
+    monkeypatch.setattr(pipeline.cfg, "SQL_CANDIDATES", 1)
+
+    sql_llm = FakeListChatModel(responses=['{"query": "SELECT name FROM missing_table"}', '{"query": "SELECT name FROM actor"}'])
+    runner = pipeline.Pipeline(SQLDatabase.from_uri(f"sqlite:///{path}"), sql_llm, FakeListChatModel(responses=["No answer."]))
+    runner._retrieve = lambda question: {"ids": ["actor"], "documents": ["CREATE TABLE actor (id INTEGER, name TEXT)"], "distances": [0.1]}
+    key = ("Actor names?", ["actor"], "sqlite", runner._sql_model("ollama"))
+
+    def ask() -> dict:
+        async def events():
+            return [event async for event in runner.answer_question("Actor names?", fast_answer=True)]
+        return asyncio.run(events())[-1]["state"]
+
+    assert ask()["result"].startswith("Error: query rejected")
+    assert cache.get(*key) is None  # rejected by the guard, not cached
+
+    assert ask()["query"] == "SELECT name FROM actor"
+    assert cache.get(*key) == "SELECT name FROM actor"
+
+    # A cached query failing later (e.g. after a schema change) is discarded
+    cache.put(*key, "SELECT name FROM dropped_table")
+    assert ask()["query"] == "SELECT name FROM dropped_table"
+    assert cache.get(*key) is None
+
+
+def test_schema_refresh_closes_the_previous_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cfg.SQL_CACHE_PATH is relative
+    monkeypatch.setattr(pipeline.fn.cfg, "SQL_CACHE_ENABLED", True)
+    path = tmp_path / "actors.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE actor (id INTEGER PRIMARY KEY, name TEXT)")
+    db = SQLDatabase.from_uri(f"sqlite:///{path}")
+
+    try:
+        first = pipeline.fn.get_sql_cache(db)
+        assert pipeline.fn.get_sql_cache(db) is first
+        pipeline.fn.refresh_schema()
+        second = pipeline.fn.get_sql_cache(db)
+
+        assert second is not first and first._conn is None
+        # A question still holding the closed cache misses and stores nothing
+        first.put("Actor names?", ["actor"], "sqlite", "m", "SELECT name FROM actor")
+        assert first.get("Actor names?", ["actor"], "sqlite", "m") is None
+    finally:
+        pipeline.fn.refresh_schema()
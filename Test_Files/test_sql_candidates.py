@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from langchain_community.utilities import SQLDatabase
+
+import Code.pipeline as pipeline
+
+# Candidate slot temperature -> (delay in seconds, generated SQL)
+RESPONSES = {
+    0.2: (0.01, "SELECT name FROM missing_table"),  # first back, rejected by the guard
+    0.6: (0.05, "SELECT name FROM actor"),  # valid
+    0.9: (1.0, "SELECT name, id FROM actor"),  # still generating when the race is won
+}
+
+
+class CandidateLLM:
+    """SQL model stub answering after a delay that depends on its temperature."""
+
+    model = "stub"
+
+    def __init__(self, temperature: float = 0.2, started: list = None):
+        self.temperature = temperature
+        self.started = started if started is not None else []
+
+    def model_copy(self, update: dict) -> "CandidateLLM":
+        return CandidateLLM(update["temperature"], self.started)
+
+    async def astream(self, prompt, **kwargs):
+        self.started.append(self.temperature)
+        delay, query = RESPONSES[self.temperature]
+        await asyncio.sleep(delay)
+        yield SimpleNamespace(content=f'{{"query": "{query}"}}')
+
+
+def test_first_valid_candidate_wins(tmp_path, monkeypatch):
+    path = tmp_path / "actors.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE actor (id INTEGER PRIMARY KEY, name TEXT)")
+    db = SQLDatabase.from_uri(f"sqlite:///{path}")
+
+    monkeypatch.setattr(pipeline.cfg, "SQL_CANDIDATES", 3)
+    monkeypatch.setattr(pipeline.cfg, "SQL_CANDIDATE_TEMPERATURES", [0.2, 0.6, 0.9])
+    monkeypatch.setattr(pipeline.cfg, "SQL_CANDIDATE_OTHER_PROVIDER", False)
+    pipeline.telemetry.metrics.reset()
+
+    llm = CandidateLLM()
+    state = {"question": "Actor names?", "tables_info": "", "tables": {"ids": ["actor"]}}
+    runner = pipeline.Pipeline(db, llm, llm)
+
+    result = asyncio.run(asyncio.wait_for(runner._race_candidates(state, "ollama", cache=None), timeout=0.5))
+
+    assert result == {"query": "SELECT name FROM actor"}
+    assert sorted(llm.started) == [0.2, 0.6, 0.9]
+    assert pipeline.candidate_wins() == {"1-ollama@0.6": 1}
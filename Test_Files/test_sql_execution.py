@@ -0,0 +1,44 @@
+from langchain_community.utilities import SQLDatabase
+
+import Code.functions as fn
+
+COUNTING = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT 100000) SELECT i FROM n"
+
+
+def test_count_timeout_keeps_the_rows_read(monkeypatch):
+    def slow_count(db, query, budget=None):
+        raise fn.QueryCancelled("interrupted")
+
+    monkeypatch.setattr(fn, "count_rows", slow_count)
+    results, total_count = fn.create_view(COUNTING, SQLDatabase.from_uri("sqlite://"))
+
+    assert total_count is None
+    assert results.head(3) == [(1,), (2,), (3,)]
+    state = fn.State(question="q", query=COUNTING, result="", total_count=total_count, answer="", tables_info="")
+    assert "unknown" in fn.answer_prompt(state)
+
+
+def test_row_budget_is_reported_to_the_answer_stage():
+    results = fn.execute_stream(SQLDatabase.from_uri("sqlite://"), COUNTING, budget=fn.QueryBudget(max_rows=50))
+
+    text = fn.reduce_rows(results)
+
+    assert results.truncated and not results.cancelled
+    assert "only its first 50 rows were read" in text
+    assert "Sample of" in text  # not rendered as the whole result
+
+
+def test_column_stats_share_the_query_budget(monkeypatch):
+    db = SQLDatabase.from_uri("sqlite://")
+    budgets = []
+    monkeypatch.setattr(fn, "summarize_columns", lambda db, query, columns, budget=None: budgets.append(budget) or [(1, 100000, 100000)])
+
+    results = fn.execute_stream(db, COUNTING, budget=fn.QueryBudget(timeout=60))
+    fn.reduce_rows(results, db=db)
+    assert budgets == [results.budget]
+
+    spent = fn.execute_stream(db, COUNTING, budget=fn.QueryBudget(timeout=60))
+    spent.head(fn.cfg.RESULT_SAMPLE_WINDOW)
+    spent.budget.timeout = 0
+    fn.reduce_rows(spent, db=db)
+    assert budgets == [results.budget]  # no second query once the budget is spent
@@ -0,0 +1,59 @@
+import pytest
+from Code.sql_guard import SQLGuardError, check_query, schema_from_docs
+
+DOCS = [
+    "\nCREATE TABLE actor (\n\tactor_id INTEGER, \n\tfirst_name TEXT NOT NULL, \n\tlast_name TEXT NOT NULL, \n\tPRIMARY KEY (actor_id)\n)",
+    "\nCREATE TABLE film (\n\tfilm_id INTEGER, \n\ttitle TEXT, \n\trental_rate NUMERIC, \n\tPRIMARY KEY (film_id)\n)",
+    "\nCREATE TABLE film_actor (\n\tactor_id INTEGER NOT NULL, \n\tfilm_id INTEGER NOT NULL, \n\tFOREIGN KEY(film_id) REFERENCES film (film_id)\n)",
+]
+SCHEMA = schema_from_docs(DOCS)
+
+
+def test_schema_from_docs():
+    assert SCHEMA == {
+        "actor": {"actor_id", "first_name", "last_name"},
+        "film": {"film_id", "title", "rental_rate"},
+        "film_actor": {"actor_id", "film_id"},
+    }
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT COUNT(*) AS total_actors FROM actor;",
+    "SELECT a.first_name, COUNT(*) films FROM actor a JOIN film_actor fa ON fa.actor_id = a.actor_id GROUP BY a.actor_id ORDER BY films DESC",
+    "SELECT title FROM film WHERE film_id IN (SELECT film_id FROM film_actor WHERE actor_id = 1)",
+    "WITH top(film_id, n) AS (SELECT film_id, COUNT(*) FROM film_actor GROUP BY film_id) SELECT f.title, t.n FROM top t JOIN film f USING(film_id)",
+    "SELECT replace(title, 'A', 'B') FROM film WHERE title LIKE '%; DROP TABLE film%'",
+    # Derived tables and JOIN subqueries
+    "SELECT COUNT(*) FROM (SELECT DISTINCT actor_id FROM film_actor)",
+    "SELECT total FROM (SELECT SUM(rental_rate) AS total FROM film)",
+    "SELECT a.first_name, c.films FROM actor a JOIN (SELECT actor_id, COUNT(*) AS films FROM film_actor GROUP BY actor_id) c ON c.actor_id = a.actor_id",
+    "SELECT f.title FROM (SELECT * FROM film) AS f JOIN (film_actor fa JOIN actor a ON a.actor_id = fa.actor_id) ON fa.film_id = f.film_id",
+])
+def test_valid_queries_pass(query):
+    assert check_query(query, SCHEMA)["count_query"] == query.rstrip(";")
+
+
+@pytest.mark.parametrize("query, message", [
+    ("DELETE FROM actor", "read-only"),
+    ("SELECT * FROM actor; DROP TABLE actor", "single statement"),
+    ("SELECT * FROM actors", "Unknown table 'actors'"),
+    ("SELECT title FROM actor", "Unknown column 'title'"),
+    ("SELECT a.title FROM actor a", "Unknown column 'title' in table 'actor'"),
+    ("SELECT COUNT(*) FROM (SELECT DISTINCT customer_id FROM film_actor)", "Unknown column 'customer_id'"),
+    ("SELECT n FROM (SELECT COUNT(*) AS n FROM actors)", "Unknown table 'actors'"),
+    ("SELECT c.films FROM actor a JOIN (SELECT fa.title FROM film_actor fa) c ON 1", "Unknown column 'title' in table 'film_actor'"),
+])
+def test_invalid_queries_are_rejected(query, message):
+    with pytest.raises(SQLGuardError, match=message):
+        check_query(query, SCHEMA)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM film;", "SELECT * FROM film\nLIMIT 100"),
+    ("SELECT * FROM film LIMIT 5", "SELECT * FROM film LIMIT 5"),
+    ("SELECT * FROM film LIMIT 500 OFFSET 10", "SELECT * FROM film LIMIT 100 OFFSET 10"),
+    ("SELECT * FROM film LIMIT 10, 500", "SELECT * FROM film LIMIT 10, 100"),
+    ("SELECT * FROM film WHERE film_id IN (SELECT film_id FROM film_actor LIMIT 500)", "SELECT * FROM film WHERE film_id IN (SELECT film_id FROM film_actor LIMIT 500)\nLIMIT 100"),
+])
+def test_limit_is_injected_or_tightened(query, expected):
+    assert check_query(query, SCHEMA, max_rows=100)["query"] == expected
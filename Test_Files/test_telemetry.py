@@ -0,0 +1,47 @@
+import json
+
+import pytest
+from Code.telemetry import JSONLinesExporter, MetricsRegistry, add_exporter, metrics, remove_exporter, span
+
+
+def test_nested_spans_share_trace_and_are_exported(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JSONLinesExporter(str(path))
+    add_exporter(exporter)
+    try:
+        with span("pipeline", provider="ollama"):
+            with span("create_view") as child:
+                child.set(rows=42)
+    finally:
+        remove_exporter(exporter)
+
+    child_record, root_record = [json.loads(line) for line in path.read_text().splitlines()]
+    assert (child_record["name"], root_record["name"]) == ("create_view", "pipeline")
+    assert child_record["trace_id"] == root_record["trace_id"]
+    assert child_record["parent_id"] == root_record["span_id"]
+    assert child_record["attributes"] == {"rows": 42}
+    assert root_record["duration"] >= child_record["duration"]
+
+
+def test_span_records_errors_and_metrics():
+    metrics.reset()
+    with pytest.raises(RuntimeError):
+        with span("write_query", prompt_chars=100):
+            raise RuntimeError("LLM down")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"write_query.errors": 1}
+    assert snapshot["summaries"]["write_query.prompt_chars"]["total"] == 100
+    assert snapshot["summaries"]["write_query.seconds"]["count"] == 1
+
+
+def test_metrics_registry_summaries():
+    registry = MetricsRegistry()
+    for value in (1, 2, 6):
+        registry.observe("rows", value)
+    registry.increment("sql.executed")
+
+    assert registry.snapshot() == {
+        "counters": {"sql.executed": 1},
+        "summaries": {"rows": {"count": 3, "total": 9.0, "min": 1, "max": 6, "mean": 3.0}},
+    }
@@ -0,0 +1,35 @@
+import numpy as np
+from Code.vector_store import NumpyStore
+
+
+def test_query_returns_chroma_shaped_cosine_results(tmp_path):
+    store = NumpyStore(str(tmp_path / "tables"))
+    store.upsert(
+        ids=["actor", "film", "rental"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [1.0, 1.0, 0.0]],
+        documents=["CREATE TABLE actor", "CREATE TABLE film", "CREATE TABLE rental"],
+        metadatas=[{"table": "actor"}, {"table": "film"}, {"table": "rental"}],
+    )
+
+    results = store.query(query_embeddings=[[1.0, 0.1, 0.0]], n_results=2)
+    assert results["ids"] == [["actor", "rental"]]
+    assert results["documents"] == [["CREATE TABLE actor", "CREATE TABLE rental"]]
+    assert np.allclose(results["distances"][0], [1 - 1 / np.sqrt(1.01), 1 - 1.1 / np.sqrt(2.02)], atol=1e-6)
+
+    filtered = store.query(query_embeddings=[[1.0, 0.1, 0.0]], n_results=5, where={"table": {"$in": ["film"]}})
+    assert filtered["ids"] == [["film"]]
+
+
+def test_upsert_delete_and_reopen(tmp_path):
+    path = str(tmp_path / "tables")
+    store = NumpyStore(path)
+    store.upsert(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["A", "B"], metadatas=[{"content_hash": "1"}, {"content_hash": "2"}])
+    store.upsert(ids=["b", "c"], embeddings=[[1.0, 1.0], [-1.0, 0.0]], documents=["B2", "C"], metadatas=[{"content_hash": "3"}, {"content_hash": "4"}])
+    store.delete(ids=["a"])
+
+    reopened = NumpyStore(path)
+    assert reopened.count() == 2
+    assert reopened.get(include=["metadatas"]) == {"ids": ["b", "c"], "metadatas": [{"content_hash": "3"}, {"content_hash": "4"}]}
+    assert reopened.get(ids=["c", "missing"])["documents"] == ["C"]
+    assert reopened.query(query_embeddings=[[-1.0, 0.0]], n_results=1)["ids"] == [["c"]]
+    assert NumpyStore(str(tmp_path / "empty")).query(query_embeddings=[[1.0, 0.0]], n_results=3)["ids"] == [[]]